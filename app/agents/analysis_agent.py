@@ -5,126 +5,142 @@ from the ingested city data. Second stage of the agent pipeline.
 
 from datetime import datetime, timezone
 
+import numpy as np
+
 from app.models.schemas import (
     AnalysisInsight,
     AnalysisResult,
     CityDataPacket,
     RiskLevel,
 )
-from app.services import ml_service
-
-
-def _generate_weather_insights(data: CityDataPacket) -> list[AnalysisInsight]:
-    """Generate insights from weather data."""
-    insights = []
-    w = data.weather
-
-    # Temperature insight
-    if w.temperature_c > 40:
-        insights.append(
-            AnalysisInsight(
-                category="weather",
-                title="Extreme Heat Warning",
-                description=f"Temperature is {w.temperature_c}°C — dangerous heat levels. Stay hydrated and avoid outdoor exposure.",
-                severity=RiskLevel.CRITICAL,
-            )
-        )
-    elif w.temperature_c > 35:
-        insights.append(
-            AnalysisInsight(
-                category="weather",
-                title="High Temperature Alert",
-                description=f"Temperature is {w.temperature_c}°C — above comfortable levels. Take precautions for heat-related issues.",
-                severity=RiskLevel.HIGH,
-            )
-        )
-    elif w.temperature_c < -10:
-        insights.append(
-            AnalysisInsight(
-                category="weather",
-                title="Extreme Cold Warning",
-                description=f"Temperature is {w.temperature_c}°C — risk of frostbite and hypothermia.",
-                severity=RiskLevel.CRITICAL,
-            )
-        )
-    elif w.temperature_c < 0:
-        insights.append(
-            AnalysisInsight(
-                category="weather",
-                title="Freezing Conditions",
-                description=f"Temperature is {w.temperature_c}°C — below freezing. Watch for ice and slippery conditions.",
-                severity=RiskLevel.MODERATE,
-            )
-        )
+from app.services import ml_service, timing
+
+# ── Insight rules ────────────────────────────────────────
+# Each table is an if/elif chain: the first rule whose condition holds for a city
+# produces that city's insight. Conditions are evaluated over arrays for the whole
+# batch; templates are formatted with the city's weather (w) and air quality (aq).
+
+_TEMPERATURE_INSIGHTS = (
+    (
+        "Extreme Heat Warning",
+        "Temperature is {w.temperature_c}°C — dangerous heat levels. Stay hydrated and avoid outdoor exposure.",
+        RiskLevel.CRITICAL,
+    ),
+    (
+        "High Temperature Alert",
+        "Temperature is {w.temperature_c}°C — above comfortable levels. Take precautions for heat-related issues.",
+        RiskLevel.HIGH,
+    ),
+    (
+        "Extreme Cold Warning",
+        "Temperature is {w.temperature_c}°C — risk of frostbite and hypothermia.",
+        RiskLevel.CRITICAL,
+    ),
+    (
+        "Freezing Conditions",
+        "Temperature is {w.temperature_c}°C — below freezing. Watch for ice and slippery conditions.",
+        RiskLevel.MODERATE,
+    ),
+)
 
-    # Wind insight
-    if w.wind_speed_kmh > 60:
-        insights.append(
-            AnalysisInsight(
-                category="weather",
-                title="Strong Wind Advisory",
-                description=f"Winds at {w.wind_speed_kmh} km/h. Secure loose objects and avoid high-profile vehicles.",
-                severity=RiskLevel.HIGH,
-            )
-        )
+_WIND_INSIGHTS = (
+    (
+        "Strong Wind Advisory",
+        "Winds at {w.wind_speed_kmh} km/h. Secure loose objects and avoid high-profile vehicles.",
+        RiskLevel.HIGH,
+    ),
+)
 
-    # Rain insight
-    if w.rain_mm > 10:
-        insights.append(
-            AnalysisInsight(
-                category="weather",
-                title="Heavy Rainfall",
-                description=f"Current rainfall: {w.rain_mm}mm. Risk of localized flooding.",
-                severity=RiskLevel.MODERATE,
-            )
-        )
+_RAIN_INSIGHTS = (
+    (
+        "Heavy Rainfall",
+        "Current rainfall: {w.rain_mm}mm. Risk of localized flooding.",
+        RiskLevel.MODERATE,
+    ),
+)
 
-    return insights
+_AQ_INSIGHTS = (
+    (
+        "Severe Air Pollution",
+        "AQI is {aq.aqi} ({aq.category.value}). Everyone should avoid outdoor activities. "
+        "Dominant pollutant: {aq.dominant_pollutant}.",
+        RiskLevel.CRITICAL,
+    ),
+    (
+        "Elevated Air Pollution",
+        "AQI is {aq.aqi} ({aq.category.value}). Sensitive groups should limit outdoor exposure. "
+        "Dominant: {aq.dominant_pollutant}.",
+        RiskLevel.HIGH,
+    ),
+    (
+        "Moderate Air Quality",
+        "AQI is {aq.aqi} ({aq.category.value}). Acceptable for most, but unusually sensitive people may experience issues.",
+        RiskLevel.MODERATE,
+    ),
+    (
+        "Good Air Quality",
+        "AQI is {aq.aqi} — air quality is satisfactory with minimal health risk.",
+        RiskLevel.LOW,
+    ),
+)
 
 
-def _generate_aq_insights(data: CityDataPacket) -> list[AnalysisInsight]:
-    """Generate insights from air quality data."""
-    insights = []
-    aq = data.air_quality
+def _first_match(conditions: list[np.ndarray]) -> np.ndarray:
+    """Index of the first true condition per row (an if/elif chain over arrays), -1 when none hold."""
+    return np.select(conditions, list(range(len(conditions))), default=-1)
+
+
+def _insight(category: str, rule: tuple, data: CityDataPacket) -> AnalysisInsight:
+    title, template, severity = rule
+    return AnalysisInsight(
+        category=category,
+        title=title,
+        description=template.format(w=data.weather, aq=data.air_quality),
+        severity=severity,
+    )
 
-    if aq.aqi > 200:
-        insights.append(
-            AnalysisInsight(
-                category="air_quality",
-                title="Severe Air Pollution",
-                description=f"AQI is {aq.aqi} ({aq.category.value}). Everyone should avoid outdoor activities. Dominant pollutant: {aq.dominant_pollutant}.",
-                severity=RiskLevel.CRITICAL,
-            )
-        )
-    elif aq.aqi > 100:
-        insights.append(
-            AnalysisInsight(
-                category="air_quality",
-                title="Elevated Air Pollution",
-                description=f"AQI is {aq.aqi} ({aq.category.value}). Sensitive groups should limit outdoor exposure. Dominant: {aq.dominant_pollutant}.",
-                severity=RiskLevel.HIGH,
-            )
-        )
-    elif aq.aqi > 50:
-        insights.append(
-            AnalysisInsight(
-                category="air_quality",
-                title="Moderate Air Quality",
-                description=f"AQI is {aq.aqi} ({aq.category.value}). Acceptable for most, but unusually sensitive people may experience issues.",
-                severity=RiskLevel.MODERATE,
-            )
-        )
-    else:
-        insights.append(
-            AnalysisInsight(
-                category="air_quality",
-                title="Good Air Quality",
-                description=f"AQI is {aq.aqi} — air quality is satisfactory with minimal health risk.",
-                severity=RiskLevel.LOW,
-            )
-        )
 
-    return insights
+def _generate_insights(packets: list[CityDataPacket], predicted_pm25: np.ndarray) -> list[list[AnalysisInsight]]:
+    """Weather, air quality and anomaly insights for every city in the batch."""
+    temperature = np.array([p.weather.temperature_c for p in packets])
+    wind = np.array([p.weather.wind_speed_kmh for p in packets])
+    rain = np.array([p.weather.rain_mm for p in packets])
+    aqi = np.array([p.air_quality.aqi for p in packets])
+    pm25 = np.array([p.air_quality.pm2_5 for p in packets])
+
+    chains = [
+        (
+            "weather",
+            _TEMPERATURE_INSIGHTS,
+            _first_match([temperature > 40, temperature > 35, temperature < -10, temperature < 0]),
+        ),
+        ("weather", _WIND_INSIGHTS, _first_match([wind > 60])),
+        ("weather", _RAIN_INSIGHTS, _first_match([rain > 10])),
+        (
+            "air_quality",
+            _AQ_INSIGHTS,
+            _first_match([aqi > 200, aqi > 100, aqi > 50, np.ones(len(packets), dtype=bool)]),
+        ),
+    ]
+    # Prediction vs actual comparison
+    anomalies = np.abs(predicted_pm25 - pm25) > 20
+
+    results = []
+    for i, data in enumerate(packets):
+        insights = [_insight(category, rules[match[i]], data) for category, rules, match in chains if match[i] >= 0]
+        if anomalies[i]:
+            actual, predicted = data.air_quality.pm2_5, float(predicted_pm25[i])
+            insights.append(
+                AnalysisInsight(
+                    category="anomaly",
+                    title="PM2.5 Anomaly Detected",
+                    description=f"Actual PM2.5 ({actual}) differs significantly from model prediction ({predicted}). Unusual conditions may be present.",
+                    severity=RiskLevel.MODERATE,
+                    data={"actual": actual, "predicted": predicted},
+                )
+            )
+        results.append(insights)
+    return results
 
 
 def analyze_city_data(data: CityDataPacket) -> AnalysisResult:
@@ -135,60 +151,62 @@ def analyze_city_data(data: CityDataPacket) -> AnalysisResult:
     - Cluster assignment
     - Insight generation
     """
-    w = data.weather
-    aq = data.air_quality
-    now = datetime.now(timezone.utc)
+    return analyze_city_data_batch([data])[0]
 
-    # Run ML predictions
-    aqi_pred = ml_service.predict_aqi_risk(
-        temperature=w.temperature_c,
-        humidity=w.humidity_pct,
-        rain=w.rain_mm,
-        pressure=w.pressure_hpa or 1013.25,
-        wind_speed=w.wind_speed_kmh,
-        month=now.month,
-        hour=now.hour,
-    )
 
-    pollution_pred = ml_service.predict_pollution(
-        temperature=w.temperature_c,
-        humidity=w.humidity_pct,
-        rain=w.rain_mm,
-        pressure=w.pressure_hpa or 1013.25,
-        wind_speed=w.wind_speed_kmh,
-        month=now.month,
-        hour=now.hour,
-    )
+def analyze_city_data_batch(packets: list[CityDataPacket]) -> list[AnalysisResult]:
+    """
+    Analyze many cities at once: one feature matrix, one call per model and
+    vectorized insight rules. Produces the same results as analyze_city_data per city.
+    """
+    if not packets:
+        return []
+    now = datetime.now(timezone.utc)
 
-    cluster = ml_service.predict_cluster(
-        temperature=w.temperature_c,
-        humidity=w.humidity_pct,
-        rain=w.rain_mm,
-        pm2_5=aq.pm2_5,
-    )
+    model_rows = [
+        {
+            "temperature": p.weather.temperature_c,
+            "humidity": p.weather.humidity_pct,
+            "rain": p.weather.rain_mm,
+            "pressure": p.weather.pressure_hpa or 1013.25,
+            "wind_speed": p.weather.wind_speed_kmh,
+            "month": now.month,
+            "hour": now.hour,
+        }
+        for p in packets
+    ]
+    cluster_rows = [
+        {
+            "temperature": p.weather.temperature_c,
+            "humidity": p.weather.humidity_pct,
+            "rain": p.weather.rain_mm,
+            "pm2_5": p.air_quality.pm2_5,
+        }
+        for p in packets
+    ]
 
-    # Generate insights
-    insights = []
-    insights.extend(_generate_weather_insights(data))
-    insights.extend(_generate_aq_insights(data))
+    # Run ML predictions
+    with timing.span("risk_classifier"):
+        aqi_preds = ml_service.predict_aqi_risk_batch(model_rows)
+    with timing.span("pollution_regressor"):
+        pollution_preds = ml_service.predict_pollution_batch(model_rows)
+    with timing.span("kmeans"):
+        clusters = ml_service.predict_cluster_batch(cluster_rows)
 
-    # Prediction vs actual comparison
-    if abs(pollution_pred.predicted_pm25 - aq.pm2_5) > 20:
-        insights.append(
-            AnalysisInsight(
-                category="anomaly",
-                title="PM2.5 Anomaly Detected",
-                description=f"Actual PM2.5 ({aq.pm2_5}) differs significantly from model prediction ({pollution_pred.predicted_pm25}). Unusual conditions may be present.",
-                severity=RiskLevel.MODERATE,
-                data={"actual": aq.pm2_5, "predicted": pollution_pred.predicted_pm25},
-            )
+    # Generate insights
+    with timing.span("insights"):
+        insights = _generate_insights(packets, np.array([p.predicted_pm25 for p in pollution_preds]))
+
+    return [
+        AnalysisResult(
+            city=data.city.name,
+            aqi_prediction=aqi_pred,
+            pollution_prediction=pollution_pred,
+            cluster=cluster,
+            insights=city_insights,
+            analyzed_at=now,
         )
-
-    return AnalysisResult(
-        city=data.city.name,
-        aqi_prediction=aqi_pred,
-        pollution_prediction=pollution_pred,
-        cluster=cluster,
-        insights=insights,
-        analyzed_at=now,
-    )
+        for data, aqi_pred, pollution_pred, cluster, city_insights in zip(
+            packets, aqi_preds, pollution_preds, clusters, insights
+        )
+    ]
@@ -0,0 +1,38 @@
+"""
+Request deadlines: an absolute latency budget created at the endpoint and passed
+down through the agent pipeline, so each stage knows how much time it has left.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """Absolute deadline on the monotonic clock."""
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self._expires_at = time.monotonic() + budget_ms / 1000
+
+    @classmethod
+    def from_budget(cls, budget_ms: float) -> "Deadline | None":
+        """A deadline for this budget, or None (no deadline) when the budget is 0 or negative."""
+        return cls(budget_ms) if budget_ms > 0 else None
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)."""
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def stage_timeout(self, reserve_ms: float = 0) -> float:
+        """Seconds a stage may use while leaving reserve_ms for the stages after it."""
+        return max(0.0, self.remaining() - reserve_ms / 1000)
+
+
+async def within(awaitable: Awaitable[T], timeout: float | None) -> T:
+    """Await with a timeout in seconds (None = unbounded); raises TimeoutError when it runs out."""
+    if timeout is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout)
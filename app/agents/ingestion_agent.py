@@ -1,36 +1,157 @@
 """
 Ingestion Agent: Fetches and normalizes multi-source environmental data
 for a given city. First stage of the agent pipeline.
+When an upstream fetch fails or runs out of its deadline, the packet falls back
+to stale cached data (or a model estimate for air quality) and records the
+affected fields in `degraded` instead of failing the whole pipeline.
 """
 
 import asyncio
+import time
 from datetime import datetime, timezone
 
-from app.models.schemas import CityDataPacket
-from app.services import air_quality_service, geocoding_service, weather_service
+from app.agents.deadline import Deadline, within
+from app.config import get_settings
+from app.models.schemas import AirQualityCurrent, CityDataPacket, CityInfo, WeatherCurrent
+from app.services import air_quality_service, geocoding_service, ml_service, timing, weather_service
 
+settings = get_settings()
 
-async def ingest_city_data(city_name: str) -> CityDataPacket:
+# Upstream (httpx) timeout. A request deadline is enforced by cancelling the fetch instead:
+# a timeout raised by a caller's short budget would count as upstream overload (AIMD
+# back-off, circuit breaker failure) and be retried, though Open-Meteo is healthy.
+DEFAULT_FETCH_TIMEOUT = 15.0
+
+
+async def ingest_city_data(city_name: str, deadline: Deadline | None = None) -> CityDataPacket:
     """
     Fetch weather + air quality data for a city in parallel.
     Returns a normalized CityDataPacket for downstream agents.
     """
     # Step 1: Resolve city to coordinates
-    city_info = await geocoding_service.geocode_city(city_name)
+    city_info = await resolve_city(city_name, deadline)
+
+    # Step 2: Fetch weather and AQ data in parallel
+    return await ingest_resolved_city(city_info, deadline)
+
+
+async def resolve_city(city_name: str, deadline: Deadline | None = None) -> CityInfo:
+    """Resolve a city name to its coordinates, raising ValueError when unknown."""
+    timeout = deadline.remaining() if deadline else None
+    city_info = await within(timing.timed("geocode", geocoding_service.geocode_city, city_name), timeout)
     if not city_info:
         raise ValueError(f"Could not geocode city: {city_name}")
+    return city_info
 
-    # Step 2: Fetch weather and AQ data in parallel
-    weather_task = weather_service.get_current_weather(
-        city=city_info.name, lat=city_info.lat, lon=city_info.lon, country=city_info.country
+
+def _failure_reason(error: BaseException) -> str:
+    return "deadline exceeded" if isinstance(error, TimeoutError) else f"upstream error: {type(error).__name__}"
+
+
+def _cached_fallback(entries: tuple, error: BaseException) -> tuple[object, str | None] | None:
+    """Fresh cache entry (not degraded) or stale one (degraded, with its age) for a failed fetch."""
+    fresh, stale = entries
+    if fresh:
+        return fresh[1], None
+    if stale:
+        return stale[1], f"stale: fetched {int(time.time() - stale[0])}s ago ({_failure_reason(error)})"
+    return None
+
+
+def _stale_served(value, ttl: int) -> str | None:
+    """Reason string when a service served a cached value past its nominal TTL (upstream unavailable or saving quota)."""
+    age = (datetime.now(timezone.utc) - value.timestamp).total_seconds()
+    return f"stale: fetched {int(age)}s ago (upstream unavailable or saving quota)" if age > ttl else None
+
+
+def _estimated_air_quality(city_info: CityInfo, weather: WeatherCurrent) -> AirQualityCurrent:
+    """Air quality from the PM2.5 regressor when no reading is available."""
+    now = datetime.now(timezone.utc)
+    prediction = ml_service.predict_pollution(
+        temperature=weather.temperature_c,
+        humidity=weather.humidity_pct,
+        rain=weather.rain_mm,
+        pressure=weather.pressure_hpa or 1013.25,
+        wind_speed=weather.wind_speed_kmh,
+        month=now.month,
+        hour=now.hour,
+    )
+    return air_quality_service.estimate_current_air_quality(
+        city_info.name, city_info.lat, city_info.lon, prediction.predicted_pm25
+    )
+
+
+async def ingest_resolved_city(city_info: CityInfo, deadline: Deadline | None = None) -> CityDataPacket:
+    """
+    Fetch weather + air quality for an already-resolved city in parallel.
+    With a deadline, both fetches share the ingestion stage's budget (the remaining
+    time minus the reserve for analysis); failures degrade instead of raising.
+    """
+    timeout = deadline.stage_timeout(settings.ANALYSIS_STAGE_RESERVE_MS) if deadline else None
+    weather_task = timing.timed(
+        "weather",
+        weather_service.get_current_weather,
+        city=city_info.name,
+        lat=city_info.lat,
+        lon=city_info.lon,
+        country=city_info.country,
+        timeout=DEFAULT_FETCH_TIMEOUT,
+    )
+    aq_task = timing.timed(
+        "air_quality",
+        air_quality_service.get_current_air_quality,
+        city=city_info.name,
+        lat=city_info.lat,
+        lon=city_info.lon,
+        timeout=DEFAULT_FETCH_TIMEOUT,
+    )
+
+    weather_data, aq_data = await asyncio.gather(
+        within(weather_task, timeout), within(aq_task, timeout), return_exceptions=True
     )
-    aq_task = air_quality_service.get_current_air_quality(city=city_info.name, lat=city_info.lat, lon=city_info.lon)
 
-    weather_data, aq_data = await asyncio.gather(weather_task, aq_task)
+    degraded = {}
+    if not isinstance(weather_data, BaseException) and (
+        reason := _stale_served(weather_data, settings.WEATHER_CACHE_TTL)
+    ):
+        degraded["weather"] = reason
+    if not isinstance(aq_data, BaseException) and (reason := _stale_served(aq_data, settings.AQ_CACHE_TTL)):
+        degraded["air_quality"] = reason
+
+    if isinstance(weather_data, BaseException):
+        fallback = _cached_fallback(
+            (
+                weather_service.peek_current_weather(city_info.lat, city_info.lon),
+                weather_service.peek_stale_current_weather(city_info.lat, city_info.lon),
+            ),
+            weather_data,
+        )
+        if fallback is None:
+            raise weather_data  # Nothing to degrade to: analysis needs weather
+        weather_data, reason = fallback
+        if reason:
+            degraded["weather"] = reason
+
+    if isinstance(aq_data, BaseException):
+        fallback = _cached_fallback(
+            (
+                air_quality_service.peek_current_air_quality(city_info.lat, city_info.lon),
+                air_quality_service.peek_stale_current_air_quality(city_info.lat, city_info.lon),
+            ),
+            aq_data,
+        )
+        if fallback is None:
+            degraded["air_quality"] = f"model estimate ({_failure_reason(aq_data)})"
+            aq_data = _estimated_air_quality(city_info, weather_data)
+        else:
+            aq_data, reason = fallback
+            if reason:
+                degraded["air_quality"] = reason
 
     return CityDataPacket(
         city=city_info,
         weather=weather_data,
         air_quality=aq_data,
         ingested_at=datetime.now(timezone.utc),
+        degraded=degraded,
     )
@@ -0,0 +1,158 @@
+"""
+Livability Leaderboard: ranks catalog cities by the recommendation agent's
+overall score. Maintained incrementally — whenever a city's current weather or
+AQ entry is refreshed, only that city is rescored and repositioned, so top-N and
+rank lookups are served without any upstream calls.
+Scores are 0–100 at 0.1 resolution, so positions are kept per score bucket in a
+Fenwick tree (cities per bucket): rescoring and rank lookups are O(log n).
+"""
+
+import bisect
+from datetime import datetime, timezone
+
+from app.agents import recommendation_agent
+from app.models.schemas import (
+    AirQualityCurrent,
+    CityDataPacket,
+    CityInfo,
+    Leaderboard,
+    LeaderboardEntry,
+    WeatherCurrent,
+)
+from app.services import air_quality_service, geocoding_service, memory, weather_service
+
+_BUCKETS = 1001  # Score buckets, best first: bucket 0 holds 100.0, bucket 1000 holds 0.0
+
+_catalog: dict[str, CityInfo] | None = None  # "lat_lon" → catalog city
+_entries: dict[str, dict] = {}  # "name|country" (lower-case) → latest score and inputs
+_by_name: dict[str, set[str]] = {}  # Lower-case city name → its entry keys (names repeat across countries)
+_counts: list[int] = [0] * (_BUCKETS + 1)  # Fenwick tree over the buckets (1-based)
+_ties: dict[int, list[str]] = {}  # Bucket → sorted entry keys with that score
+
+
+def _location_key(lat: float, lon: float) -> str:
+    return f"{lat:.2f}_{lon:.2f}"
+
+
+def _city_key(name: str, country: str) -> str:
+    return f"{name.lower().strip()}|{country.lower().strip()}"
+
+
+def _bucket(score: float) -> int:
+    return _BUCKETS - 1 - int(round(score * 10))
+
+
+def _add_count(bucket: int, delta: int):
+    i = bucket + 1
+    while i <= _BUCKETS:
+        _counts[i] += delta
+        i += i & -i
+
+
+def _ranked_before(bucket: int) -> int:
+    """Cities in better buckets than this one."""
+    total, i = 0, bucket
+    while i > 0:
+        total += _counts[i]
+        i -= i & -i
+    return total
+
+
+def _catalog_by_location() -> dict[str, CityInfo]:
+    global _catalog
+    if _catalog is None:
+        _catalog = {_location_key(c.lat, c.lon): c for c in geocoding_service.get_all_cities()}
+    return _catalog
+
+
+def update_city(city: CityInfo, weather: WeatherCurrent, air_quality: AirQualityCurrent):
+    """Rescore one city and move it to its new position (O(log n), plus the cities tied on its score)."""
+    now = datetime.now(timezone.utc)
+    packet = CityDataPacket(city=city, weather=weather, air_quality=air_quality, ingested_at=now)
+    score = round(float(recommendation_agent.livability_scores([packet])[0]), 1)
+
+    key = _city_key(city.name, city.country)
+    previous = _entries.get(key)
+    if previous:
+        old = _bucket(previous["score"])
+        tied = _ties[old]
+        del tied[bisect.bisect_left(tied, key)]
+        if not tied:
+            del _ties[old]
+        _add_count(old, -1)
+    bucket = _bucket(score)
+    bisect.insort(_ties.setdefault(bucket, []), key)
+    _add_count(bucket, 1)
+    _by_name.setdefault(city.name.lower().strip(), set()).add(key)
+    _entries[key] = {
+        "city": city,
+        "score": score,
+        "aqi": air_quality.aqi,
+        "temperature_c": weather.temperature_c,
+        "updated_at": now,
+    }
+
+
+def _on_refresh(lat: float, lon: float):
+    """Cache refresh hook: rescore the catalog city at this location once both inputs are known."""
+    city = _catalog_by_location().get(_location_key(lat, lon))
+    if city is None:
+        return  # Not a catalog city
+    weather = weather_service.peek_stale_current_weather(lat, lon)
+    air_quality = air_quality_service.peek_stale_current_air_quality(lat, lon)
+    if weather and air_quality:
+        update_city(city, weather[1], air_quality[1])
+
+
+def _rank(key: str) -> int:
+    bucket = _bucket(_entries[key]["score"])
+    return _ranked_before(bucket) + bisect.bisect_left(_ties[bucket], key) + 1
+
+
+def _entry(rank: int, key: str) -> LeaderboardEntry:
+    entry = _entries[key]
+    return LeaderboardEntry(
+        rank=rank,
+        city=entry["city"].name,
+        country=entry["city"].country,
+        overall_score=entry["score"],
+        aqi=entry["aqi"],
+        temperature_c=entry["temperature_c"],
+        updated_at=entry["updated_at"],
+    )
+
+
+def get_top(n: int = 10) -> Leaderboard:
+    """The n best-scoring cities."""
+    keys = []
+    for bucket in sorted(_ties):
+        keys.extend(_ties[bucket][: n - len(keys)])
+        if len(keys) == n:
+            break
+    return Leaderboard(
+        entries=[_entry(i + 1, key) for i, key in enumerate(keys)],
+        ranked=len(_entries),
+        catalog_size=len(_catalog_by_location()),
+        generated_at=datetime.now(timezone.utc),
+    )
+
+
+def get_rank(city_name: str, country: str | None = None) -> LeaderboardEntry | None:
+    """
+    Rank and score of one city, or None if it has not been scored yet. Without a
+    country, the best-ranked of the catalog cities with that name is returned.
+    """
+    keys = _by_name.get(city_name.lower().strip(), set())
+    if country is not None:
+        keys = keys & {_city_key(city_name, country)}
+    if not keys:
+        return None
+    return _entry(*min((_rank(key), key) for key in keys))
+
+
+weather_service.add_refresh_listener(_on_refresh)
+air_quality_service.add_refresh_listener(_on_refresh)
+# _catalog shares its CityInfo objects with the geocoding catalog, which accounts for them
+memory.register(
+    "leaderboard", lambda: {"bytes": memory.deep_sizeof((_entries, _by_name, _counts, _ties)), "entries": len(_entries)}
+)
@@ -4,28 +4,113 @@ Handles errors gracefully — if one agent fails, the pipeline degrades but does
 """
 
 import asyncio
+import time
+from collections.abc import AsyncIterator
 from datetime import datetime, timezone
 
 from app.agents import analysis_agent, ingestion_agent, recommendation_agent
-from app.models.schemas import CityComparison, IntelligenceReport
+from app.agents.deadline import Deadline
+from app.config import get_settings
+from app.models.schemas import (
+    AnalysisResult,
+    CityComparison,
+    CityDataPacket,
+    CityInfo,
+    ComparisonSummary,
+    IntelligenceReport,
+    RecommendationReport,
+)
+from app.services import air_quality_service, memory, metrics, ml_service, timing, upstream, weather_service
 
+settings = get_settings()
 
-async def run_city_analysis(city_name: str) -> IntelligenceReport:
-    """
-    Execute the full agent pipeline for a single city:
-    1. Ingestion Agent → fetch data
-    2. Analysis Agent → run ML + generate insights
-    3. Recommendation Agent → produce actionable recommendations
-    """
-    # Stage 1: Ingest
-    data_packet = await ingestion_agent.ingest_city_data(city_name)
+# ── Report Cache ─────────────────────────────────────────
+# Resolved city → (expires_at, weather, air quality, report). A report is served only
+# while the exact weather and AQ objects it was built from are still the services'
+# fresh cache entries, so it expires with the earliest input TTL and is dropped as
+# soon as either input is refreshed.
+_report_cache: dict[str, tuple[float, object, object, IntelligenceReport]] = {}
+_report_cache_hits = 0
+_report_cache_misses = 0
+_report_cache_evictions = 0
 
-    # Stage 2: Analyze
-    analysis = analysis_agent.analyze_city_data(data_packet)
 
-    # Stage 3: Recommend
-    recommendations = recommendation_agent.generate_recommendations(data_packet, analysis)
+def _report_key(city: CityInfo) -> str:
+    return f"{city.name}_{city.lat:.2f}_{city.lon:.2f}"
+
+
+def _current_inputs(city: CityInfo) -> tuple[tuple | None, tuple | None]:
+    return (
+        weather_service.peek_current_weather(city.lat, city.lon),
+        air_quality_service.peek_current_air_quality(city.lat, city.lon),
+    )
+
+
+def _get_cached_report(city: CityInfo) -> IntelligenceReport | None:
+    global _report_cache_hits, _report_cache_misses, _report_cache_evictions
+    key = _report_key(city)
+    entry = _report_cache.get(key)
+    if entry:
+        expires_at, weather, air_quality, report = entry
+        current_weather, current_aq = _current_inputs(city)
+        if (
+            time.time() < expires_at
+            and current_weather
+            and current_aq
+            and current_weather[1] is weather
+            and current_aq[1] is air_quality
+        ):
+            _report_cache_hits += 1
+            return report
+        del _report_cache[key]
+        _report_cache_evictions += 1
+    _report_cache_misses += 1
+    return None
+
+
+def _cache_report(data_packet: CityDataPacket, report: IntelligenceReport):
+    if not ml_service.is_loaded():
+        return  # Built by the fallback models during warm-up; the trained models will score differently
+    current_weather, current_aq = _current_inputs(data_packet.city)
+    if not (
+        current_weather
+        and current_aq
+        and current_weather[1] is data_packet.weather
+        and current_aq[1] is data_packet.air_quality
+    ):
+        return  # An input was refreshed (or never cached) while the pipeline ran
+    # The services' TTLs, stretched while an upstream is saving quota
+    expires_at = min(
+        current_weather[0] + upstream.cache_ttl(settings.OPEN_METEO_WEATHER_URL, settings.WEATHER_CACHE_TTL),
+        current_aq[0] + upstream.cache_ttl(settings.OPEN_METEO_AQ_URL, settings.AQ_CACHE_TTL),
+    )
+    now = time.time()
+    global _report_cache_evictions
+    for key in [k for k, v in _report_cache.items() if v[0] <= now]:
+        del _report_cache[key]
+        _report_cache_evictions += 1
+    _report_cache[_report_key(data_packet.city)] = (expires_at, data_packet.weather, data_packet.air_quality, report)
 
+
+def get_report_cache_stats() -> dict:
+    """Hit/miss counters and occupancy of the intelligence report cache."""
+    total = _report_cache_hits + _report_cache_misses
+    return {
+        "entries": len(_report_cache),
+        "hits": _report_cache_hits,
+        "misses": _report_cache_misses,
+        "evictions": _report_cache_evictions,
+        "hit_rate": round(_report_cache_hits / total, 4) if total else 0.0,
+    }
+
+
+metrics.register_cache("reports", get_report_cache_stats)
+memory.register("report_cache", lambda: {"bytes": memory.deep_sizeof(_report_cache), "entries": len(_report_cache)})
+
+
+def _assemble_report(
+    data_packet: CityDataPacket, analysis: AnalysisResult, recommendations: RecommendationReport
+) -> IntelligenceReport:
     return IntelligenceReport(
         city=data_packet.city.name,
         country=data_packet.city.country,
@@ -35,25 +120,75 @@ async def run_city_analysis(city_name: str) -> IntelligenceReport:
         air_quality=data_packet.air_quality,
         analysis=analysis,
         recommendations=recommendations,
+        degraded=data_packet.degraded,
         generated_at=datetime.now(timezone.utc),
     )
 
 
-async def compare_cities(city_names: list[str]) -> CityComparison:
+async def run_city_analysis(city_name: str, deadline: Deadline | None = None) -> IntelligenceReport:
     """
-    Run the agent pipeline for multiple cities in parallel and compare.
+    Execute the full agent pipeline for a single city:
+    1. Ingestion Agent → fetch data
+    2. Analysis Agent → run ML + generate insights
+    3. Recommendation Agent → produce actionable recommendations
+    Reports are cached per resolved city while their weather and AQ inputs stay cached.
+    With a deadline, slow inputs degrade to fallbacks listed in the report's `degraded`.
     """
-    tasks = [run_city_analysis(name) for name in city_names]
-    reports = await asyncio.gather(*tasks, return_exceptions=True)
+    city_info = await ingestion_agent.resolve_city(city_name, deadline)
+    with timing.span("report_cache"):
+        cached = _get_cached_report(city_info)
+    timing.mark_cache("report_cache", cached is not None)
+    if cached:
+        return cached
 
-    successful = [r for r in reports if isinstance(r, IntelligenceReport)]
-    failed = [city_names[i] for i, r in enumerate(reports) if isinstance(r, Exception)]
+    # Stage 1: Ingest
+    data_packet = await ingestion_agent.ingest_resolved_city(city_info, deadline)
 
-    if not successful:
-        raise ValueError(f"All city analyses failed. Failed cities: {failed}")
+    # Stage 2: Analyze
+    with timing.span("analysis"):
+        analysis = analysis_agent.analyze_city_data(data_packet)
+
+    # Stage 3: Recommend
+    with timing.span("recommendations"):
+        recommendations = recommendation_agent.generate_recommendations(data_packet, analysis)
 
+    report = _assemble_report(data_packet, analysis, recommendations)
+    _cache_report(data_packet, report)
+    return report
+
+
+async def run_batch_analysis(
+    city_names: list[str], deadline: Deadline | None = None
+) -> list[IntelligenceReport | Exception]:
+    """
+    Execute the agent pipeline for many cities as one batch:
+    cities are resolved and, unless their report is cached, ingested concurrently,
+    then analysis and recommendations run once over all ingested cities (one call
+    per model, vectorized rules). Reports match run_city_analysis city-for-city;
+    a city whose ingestion failed gets its exception.
+    """
+
+    async def _cached_or_ingest(city_name: str) -> IntelligenceReport | CityDataPacket:
+        city_info = await ingestion_agent.resolve_city(city_name, deadline)
+        return _get_cached_report(city_info) or await ingestion_agent.ingest_resolved_city(city_info, deadline)
+
+    packets = await asyncio.gather(*(_cached_or_ingest(name) for name in city_names), return_exceptions=True)
+    ingested = [p for p in packets if isinstance(p, CityDataPacket)]
+
+    analyses = analysis_agent.analyze_city_data_batch(ingested)
+    recommendations = recommendation_agent.generate_recommendations_batch(ingested, analyses)
+    reports = [_assemble_report(*parts) for parts in zip(ingested, analyses, recommendations)]
+    for data_packet, report in zip(ingested, reports):
+        _cache_report(data_packet, report)
+
+    built = iter(reports)
+    return [next(built) if isinstance(p, CityDataPacket) else p for p in packets]  # Cached reports and errors as-is
+
+
+def _summarize(successful: list[IntelligenceReport], failed: list[str]) -> ComparisonSummary:
+    """Summary line and best city for a comparison (best_overall is None when nothing succeeded)."""
     # Find best overall city
-    best = max(successful, key=lambda r: r.recommendations.overall_score)
+    best = max(successful, key=lambda r: r.recommendations.overall_score) if successful else None
 
     summary_parts = []
     for report in successful:
@@ -64,9 +199,66 @@ async def compare_cities(city_names: list[str]) -> CityComparison:
     if failed:
         summary += f" Failed to analyze: {', '.join(failed)}."
 
-    return CityComparison(
-        cities=successful,
+    return ComparisonSummary(
         summary=summary,
-        best_overall=best.city,
+        best_overall=best.city if best else None,
+        failed=failed,
         generated_at=datetime.now(timezone.utc),
     )
+
+
+async def compare_cities(city_names: list[str], deadline: Deadline | None = None) -> CityComparison:
+    """
+    Run the batched agent pipeline for multiple cities and compare.
+    """
+    reports = await run_batch_analysis(city_names, deadline)
+
+    successful = [r for r in reports if isinstance(r, IntelligenceReport)]
+    failed = [city_names[i] for i, r in enumerate(reports) if isinstance(r, Exception)]
+
+    if not successful:
+        raise ValueError(f"All city analyses failed. Failed cities: {failed}")
+
+    summary = _summarize(successful, failed)
+    return CityComparison(
+        cities=successful,
+        summary=summary.summary,
+        best_overall=summary.best_overall,
+        generated_at=summary.generated_at,
+    )
+
+
+async def stream_comparison(
+    city_names: list[str], deadline: Deadline | None = None
+) -> AsyncIterator[tuple[str, object]]:
+    """
+    Run the per-city pipeline for every city concurrently and yield each outcome as
+    soon as that city finishes: ("report", IntelligenceReport) or ("error", {city, detail}).
+    Ends with ("summary", ComparisonSummary) listing cities in request order.
+    """
+
+    async def _analyze(i: int, name: str) -> tuple[int, IntelligenceReport | Exception]:
+        try:
+            return i, await run_city_analysis(name, deadline)
+        except Exception as e:
+            return i, e
+
+    tasks = [asyncio.create_task(_analyze(i, name)) for i, name in enumerate(city_names)]
+    results: dict[int, IntelligenceReport | Exception] = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            i, result = await next_done
+            results[i] = result
+            if isinstance(result, IntelligenceReport):
+                yield "report", result
+            else:
+                yield "error", {"city": city_names[i], "detail": str(result)}
+    finally:
+        # Client went away mid-stream: don't leave upstream fetches running
+        for task in tasks:
+            task.cancel()
+
+    ordered = [results[i] for i in range(len(city_names))]
+    successful = [r for r in ordered if isinstance(r, IntelligenceReport)]
+    failed = [city_names[i] for i, r in enumerate(ordered) if isinstance(r, Exception)]
+    yield "summary", _summarize(successful, failed)
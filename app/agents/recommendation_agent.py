@@ -5,6 +5,8 @@ from the analysis results. Final stage of the agent pipeline.
 
 from datetime import datetime, timezone
 
+import numpy as np
+
 from app.models.schemas import (
     AnalysisResult,
     CityDataPacket,
@@ -14,45 +16,40 @@ from app.models.schemas import (
 )
 
 
-def _calculate_livability_score(data: CityDataPacket, analysis: AnalysisResult) -> float:
-    """Calculate a 0-100 livability score based on current conditions."""
-    score = 100.0
-    aq = data.air_quality
-    w = data.weather
+def livability_scores(packets: list[CityDataPacket]) -> np.ndarray:
+    """Calculate 0-100 livability scores for a batch of cities from current conditions."""
+    aqi = np.array([p.air_quality.aqi for p in packets])
+    temperature = np.array([p.weather.temperature_c for p in packets])
+    rain = np.array([p.weather.rain_mm for p in packets])
+    wind = np.array([p.weather.wind_speed_kmh for p in packets])
 
     # AQI penalty (biggest factor)
-    if aq.aqi > 300:
-        score -= 50
-    elif aq.aqi > 200:
-        score -= 40
-    elif aq.aqi > 150:
-        score -= 30
-    elif aq.aqi > 100:
-        score -= 20
-    elif aq.aqi > 50:
-        score -= 10
+    aqi_penalty = np.select([aqi > 300, aqi > 200, aqi > 150, aqi > 100, aqi > 50], [50, 40, 30, 20, 10], 0)
 
     # Temperature comfort penalty
-    if w.temperature_c > 40 or w.temperature_c < -15:
-        score -= 20
-    elif w.temperature_c > 35 or w.temperature_c < -5:
-        score -= 10
-    elif w.temperature_c > 30 or w.temperature_c < 5:
-        score -= 5
+    temperature_penalty = np.select(
+        [
+            (temperature > 40) | (temperature < -15),
+            (temperature > 35) | (temperature < -5),
+            (temperature > 30) | (temperature < 5),
+        ],
+        [20, 10, 5],
+        0,
+    )
 
     # Rain penalty
-    if w.rain_mm > 10:
-        score -= 10
-    elif w.rain_mm > 2:
-        score -= 5
+    rain_penalty = np.select([rain > 10, rain > 2], [10, 5], 0)
 
     # Wind penalty
-    if w.wind_speed_kmh > 50:
-        score -= 10
-    elif w.wind_speed_kmh > 30:
-        score -= 5
+    wind_penalty = np.select([wind > 50, wind > 30], [10, 5], 0)
 
-    return max(0, min(100, score))
+    score = 100.0 - aqi_penalty - temperature_penalty - rain_penalty - wind_penalty
+    return np.clip(score, 0, 100)
+
+
+def _calculate_livability_score(data: CityDataPacket, analysis: AnalysisResult) -> float:
+    """Calculate a 0-100 livability score based on current conditions."""
+    return float(livability_scores([data])[0])
 
 
 def _generate_health_advisory(data: CityDataPacket) -> str:
@@ -101,6 +98,20 @@ def _generate_best_time(data: CityDataPacket) -> str:
 
 def generate_recommendations(data: CityDataPacket, analysis: AnalysisResult) -> RecommendationReport:
     """Generate the full recommendation report."""
+    return _build_report(data, analysis, _calculate_livability_score(data, analysis))
+
+
+def generate_recommendations_batch(
+    packets: list[CityDataPacket], analyses: list[AnalysisResult]
+) -> list[RecommendationReport]:
+    """Generate reports for many cities, scoring them all in one vectorized pass."""
+    if not packets:
+        return []
+    scores = livability_scores(packets)
+    return [_build_report(data, analysis, float(score)) for data, analysis, score in zip(packets, analyses, scores)]
+
+
+def _build_report(data: CityDataPacket, analysis: AnalysisResult, score: float) -> RecommendationReport:
     recs = []
     aq = data.air_quality
     w = data.weather
@@ -193,9 +204,6 @@ def generate_recommendations(data: CityDataPacket, analysis: AnalysisResult) ->
         )
     )
 
-    # Calculate score and comparison
-    score = _calculate_livability_score(data, analysis)
-
     # Generate comparison text based on AQI
     if aq.aqi <= 50:
         comparison = "Better air quality than approximately 75% of major global cities."
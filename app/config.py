@@ -36,6 +36,8 @@ class Settings(BaseSettings):
     FORECAST_CACHE_TTL: int = 3600  # 1 hour for forecasts
     GEOCODING_CACHE_TTL: int = 86400  # 24 hours for geocoding
     AQ_CACHE_TTL: int = 600  # 10 minutes for air quality
+    RESPONSE_CACHE_MAX_ENTRIES: int = 5000  # Per service (weather, air quality); least recently used go first
+    STALE_CACHE_MAX_AGE_S: int = 86400  # Oldest cached response served while the upstream is down
 
     # External APIs (all free, no keys required)
     OPEN_METEO_WEATHER_URL: str = "https://api.open-meteo.com/v1/forecast"
@@ -43,12 +45,65 @@ class Settings(BaseSettings):
     OPEN_METEO_GEOCODING_URL: str = "https://geocoding-api.open-meteo.com/v1/search"
     OPEN_METEO_ARCHIVE_URL: str = "https://archive-api.open-meteo.com/v1/archive"
 
+    # Outbound request scheduler (per upstream host)
+    UPSTREAM_RATE_PER_SEC: float = 8.0  # Token refill rate (Open-Meteo free tier ≈ 600 calls/min)
+    UPSTREAM_BURST: int = 20
+    UPSTREAM_INTERACTIVE_RESERVE: float = 0.25  # Share of the burst background traffic may not use
+    UPSTREAM_MAX_RETRIES: int = 3  # For 429 / 5xx / transport errors
+    UPSTREAM_BACKOFF_BASE_MS: int = 200
+    UPSTREAM_BACKOFF_MAX_MS: int = 5000
+    UPSTREAM_BREAKER_THRESHOLD: int = 5  # Consecutive failures before the circuit opens
+    UPSTREAM_BREAKER_COOLDOWN_S: float = 30.0
+    UPSTREAM_CONCURRENCY_INITIAL: int = 8  # Adaptive (AIMD) in-flight cap, starting value
+    UPSTREAM_CONCURRENCY_MIN: int = 1
+    UPSTREAM_CONCURRENCY_MAX: int = 64
+    UPSTREAM_CONCURRENCY_BACKOFF: float = 0.5  # Multiplicative decrease on errors or latency spikes
+    UPSTREAM_LATENCY_TOLERANCE: float = 2.0  # Latency above baseline × this counts as overload
+    UPSTREAM_DAILY_BUDGET: int = 10000  # Calls per upstream per UTC day (Open-Meteo free tier); 0 = unlimited
+    UPSTREAM_QUOTA_SAVING_AT: float = 0.8  # Budget share after which background calls pause and TTLs stretch
+    UPSTREAM_QUOTA_TTL_FACTOR: float = 4.0  # Cache TTL multiplier while saving quota
+
     # ML Models
     MODELS_DIR: str = "app/ml/pretrained"
 
     # Vector DB
     VECTOR_MODEL_NAME: str = "all-MiniLM-L6-v2"
     FAISS_INDEX_PATH: str = "app/ml/pretrained/faiss_index"
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024  # LRU entries of normalized query → embedding
+    VECTOR_INDEX_TYPE: str = "flat"  # flat | ivf_flat | ivf_pq | hnsw
+    VECTOR_QUANTIZATION: str = "none"  # none (float32) | sq8 (int8 scalar) | pq (product quantization)
+    VECTOR_IVF_NLIST: int = 0  # 0 = auto (≈4·√n, capped so every centroid gets enough training points)
+    VECTOR_IVF_NPROBE: int = 8  # Inverted lists visited per query (recall ↔ latency)
+    VECTOR_PQ_M: int = 16  # PQ sub-quantizers (must divide the embedding dim; adjusted down if not)
+    VECTOR_HNSW_M: int = 32  # Graph neighbours per node
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 80
+    VECTOR_HNSW_EF_SEARCH: int = 64  # Candidate list size per query (recall ↔ latency)
+
+    # Request latency budgets (ms, 0 = no deadline); slow upstream inputs degrade to fallbacks
+    ANALYZE_DEADLINE_MS: int = 4000
+    COMPARE_DEADLINE_MS: int = 6000
+    ANALYSIS_STAGE_RESERVE_MS: int = 250  # Kept back from ingestion for analysis + recommendations
+
+    # Background analysis jobs
+    JOB_WORKERS: int = 4  # Concurrent city analyses across all jobs
+    JOB_QUEUE_SIZE: int = 1000  # Max queued city analyses; submissions beyond this are rejected
+    JOB_HISTORY_SIZE: int = 50  # Finished jobs (with their reports) kept for polling/download
+
+    # Startup
+    WARMUP_IN_BACKGROUND: bool = True  # Serve while models and the vector index load; False = load before serving
+
+    # Event-loop monitor (stack logging of stalls needs DEBUG)
+    LOOP_MONITOR_INTERVAL_MS: int = 100  # Lag sampling period; 0 = disabled
+    LOOP_BLOCK_THRESHOLD_MS: int = 100  # Lag counted as a stall (and logged with its stack in debug mode)
+
+    # On-demand profiling (send X-Profile: <token>; profiles at /api/v1/profiles)
+    PROFILING_TOKEN: str = ""  # Shared secret that enables profiling; empty = off
+    PROFILING_INTERVAL_MS: float = 2.0  # Stack sampling period
+    PROFILING_HISTORY_SIZE: int = 20  # Profiles kept in memory
+
+    # Memory diagnostics (GET /api/v1/diagnostics/memory)
+    MEMORY_SAMPLE_INTERVAL_S: float = 10.0  # RSS sampling period for the peak/history; 0 = off
+    MEMORY_HISTORY_SIZE: int = 360  # RSS samples kept (an hour at the default period)
 
     # Data
     CITIES_DB_PATH: str = "data/cities.json"
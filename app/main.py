@@ -3,16 +3,15 @@ Cloud Intelligence Platform v2 — Main FastAPI Application
 Agentic cloud intelligence with real-time weather, air quality, and ML-powered insights.
 """
 
-import json
 from contextlib import asynccontextmanager
-from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
-from app.routers import agents, air_quality, cities, health, predictions, weather
-from app.services import ml_service, vector_service
+from app.middleware import MetricsMiddleware, ProfilingMiddleware
+from app.routers import agents, air_quality, cities, health, predictions, profiling, weather
+from app.services import job_service, loop_monitor, memory, upstream, warmup
 
 settings = get_settings()
 
@@ -23,23 +22,25 @@ async def lifespan(app: FastAPI):
     # ── Startup ──
     print(f"🚀 Starting {settings.APP_NAME} v{settings.APP_VERSION}")
 
-    # Load ML models
-    ml_service.load_all_models()
+    # Load ML models, the city catalog and the vector index (in the background unless disabled)
+    await warmup.start()
 
-    # Build vector index from cities database
-    cities_path = Path(settings.CITIES_DB_PATH)
-    if cities_path.exists():
-        with open(cities_path, "r", encoding="utf-8") as f:
-            cities_data = json.load(f)
-        try:
-            vector_service.build_index(cities_data)
-        except Exception as e:
-            print(f"Warning: Vector index build failed: {e}")
-
-    print("✅ Platform ready")
+    loop_monitor.start()
+    memory.start()
+    print("✅ Platform serving (GET /ready reports when warm-up has finished)")
     yield
     # ── Shutdown ──
     print("👋 Shutting down")
+    await warmup.stop()
+    await loop_monitor.stop()
+    await memory.stop()
+    await job_service.shutdown()
+
+
+async def attribute_upstream_calls(request: Request):
+    """Count the upstream calls made while serving a request against its route (for quota accounting)."""
+    route = request.scope.get("route")
+    upstream.set_caller(f"route:{route.path}" if route else "route")
 
 
 app = FastAPI(
@@ -47,6 +48,7 @@ app = FastAPI(
     description=settings.APP_DESCRIPTION,
     version=settings.APP_VERSION,
     lifespan=lifespan,
+    dependencies=[Depends(attribute_upstream_calls)],
     docs_url="/docs",
     redoc_url="/redoc",
     contact={"name": "Abdul Ahad Ali Khan", "url": "https://github.com/abdulahadalikhan12"},
@@ -62,6 +64,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ── Request Metrics ──
+app.add_middleware(MetricsMiddleware)
+
+# ── On-demand Profiling (inert unless PROFILING_TOKEN is set) ──
+app.add_middleware(ProfilingMiddleware)
+
 # ── Register Routers ──
 app.include_router(health.router)
 app.include_router(cities.router)
@@ -69,6 +77,7 @@ app.include_router(weather.router)
 app.include_router(air_quality.router)
 app.include_router(predictions.router)
 app.include_router(agents.router)
+app.include_router(profiling.router)
 
 
 @app.get("/", tags=["Root"])
@@ -0,0 +1,74 @@
+"""ASGI middleware: per-route request metrics and on-demand profiling."""
+
+import threading
+import time
+
+from app.services import metrics, profiler
+
+
+class MetricsMiddleware:
+    """Records latency per route template and the number of requests in flight."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")  # Set by the router once the request is matched
+            metrics.REQUEST_LATENCY.observe(
+                time.perf_counter() - start, scope["method"], route.path if route else "unmatched", str(status)
+            )
+
+
+class ProfilingMiddleware:
+    """
+    Samples the handling of a request when it carries the profiling token in the X-Profile
+    header (never the query string, which ends up in logs) or falls under a running
+    aggregation session. The profile id is returned in the X-Profile-Id header; fetch it
+    from /api/v1/profiles/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.settings.PROFILING_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        token = dict(scope["headers"]).get(b"x-profile", b"").decode() or None
+        requested = profiler.authorized(token)
+        if not requested and not profiler.aggregating(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.Profile(f"{scope['method']} {scope['path']}") if requested else None
+
+        async def send_with_profile_id(message):
+            if profile is not None and message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        sampler = profiler.begin(threading.get_ident())
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.finish(sampler, scope["path"], (time.perf_counter() - start) * 1000, profile)
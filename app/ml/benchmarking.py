@@ -0,0 +1,154 @@
+"""
+Model latency/accuracy benchmarking for the trainer.
+Fits several candidate configurations per task, measures what inference costs
+on the serving path (single-row p50/p99, batch throughput, artifact size, memory)
+and selects the most accurate model that fits a latency budget.
+"""
+
+import io
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+from sklearn.ensemble import (
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor,
+    RandomForestClassifier,
+    RandomForestRegressor,
+)
+from sklearn.metrics import accuracy_score, mean_squared_error
+
+SINGLE_ROW_REPEATS = 200
+BATCH_ROWS = 10_000
+INPUT_DTYPES = ("float64", "float32")
+_REPORTED_PARAMS = {"n_estimators", "max_depth", "max_iter", "learning_rate"}
+
+
+def classifier_candidates() -> dict[str, object]:
+    """Candidate classifiers: forest size/depth trade-offs and gradient boosting."""
+    return {
+        "rf_100": RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1),
+        "rf_50_d16": RandomForestClassifier(n_estimators=50, max_depth=16, random_state=42, n_jobs=-1),
+        "rf_25_d12": RandomForestClassifier(n_estimators=25, max_depth=12, random_state=42, n_jobs=-1),
+        "rf_10_d8": RandomForestClassifier(n_estimators=10, max_depth=8, random_state=42, n_jobs=-1),
+        "hgb_100": HistGradientBoostingClassifier(max_iter=100, random_state=42),
+        "hgb_50_d6": HistGradientBoostingClassifier(max_iter=50, max_depth=6, random_state=42),
+    }
+
+
+def regressor_candidates() -> dict[str, object]:
+    """Candidate regressors mirroring classifier_candidates."""
+    return {
+        "rf_100": RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1),
+        "rf_50_d16": RandomForestRegressor(n_estimators=50, max_depth=16, random_state=42, n_jobs=-1),
+        "rf_25_d12": RandomForestRegressor(n_estimators=25, max_depth=12, random_state=42, n_jobs=-1),
+        "rf_10_d8": RandomForestRegressor(n_estimators=10, max_depth=8, random_state=42, n_jobs=-1),
+        "hgb_100": HistGradientBoostingRegressor(max_iter=100, random_state=42),
+        "hgb_50_d6": HistGradientBoostingRegressor(max_iter=50, max_depth=6, random_state=42),
+    }
+
+
+def _serving_call(model, task: str):
+    """Return the callable ml_service runs per request for this task."""
+    if task == "classification":
+        # ml_service calls both predict and predict_proba on every request
+        return lambda X: (model.predict(X), model.predict_proba(X))
+    return model.predict
+
+
+def _single_row_latency_ms(call, row: np.ndarray) -> tuple[float, float]:
+    call(row)  # Warm-up
+    samples = []
+    for _ in range(SINGLE_ROW_REPEATS):
+        t0 = time.perf_counter()
+        call(row)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 99))
+
+
+def _batch_throughput(call, X: np.ndarray) -> float:
+    reps = int(np.ceil(BATCH_ROWS / len(X)))
+    batch = np.tile(X, (reps, 1))[:BATCH_ROWS]
+    t0 = time.perf_counter()
+    call(batch)
+    return len(batch) / (time.perf_counter() - t0)
+
+
+def _artifact_footprint(model) -> tuple[int, int]:
+    """Serialized size and memory allocated when the artifact is loaded."""
+    buf = io.BytesIO()
+    joblib.dump(model, buf)
+    size = buf.tell()
+    buf.seek(0)
+    tracemalloc.start()
+    joblib.load(buf)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak
+
+
+def benchmark_candidates(
+    task: str,
+    candidates: dict[str, object],
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+) -> tuple[list[dict], dict[str, object]]:
+    """
+    Fit and measure every candidate. Each model is measured with float64 and float32
+    inputs; tree models compare against float32 thresholds, so float32 input skips a
+    per-call conversion. Returns (report rows, fitted models by name).
+    """
+    rows = []
+    fitted = {}
+    for name, model in candidates.items():
+        print(f"  Benchmarking {name}...")
+        model.fit(X_train, y_train)
+        if "n_jobs" in model.get_params():
+            # Thread fan-out only pays off for large batches; single-row serving is faster inline
+            model.set_params(n_jobs=1)
+        fitted[name] = model
+
+        preds = model.predict(X_test)
+        if task == "classification":
+            quality = {"accuracy": float(accuracy_score(y_test, preds))}
+        else:
+            quality = {"rmse": float(np.sqrt(mean_squared_error(y_test, preds)))}
+
+        size, memory = _artifact_footprint(model)
+        call = _serving_call(model, task)
+        for dtype in INPUT_DTYPES:
+            X = X_test.astype(dtype)
+            p50, p99 = _single_row_latency_ms(call, X[:1])
+            rows.append(
+                {
+                    "task": task,
+                    "name": name,
+                    "params": {k: v for k, v in model.get_params().items() if k in _REPORTED_PARAMS},
+                    "input_dtype": dtype,
+                    **quality,
+                    "p50_ms": round(p50, 4),
+                    "p99_ms": round(p99, 4),
+                    "batch_rows_per_s": round(_batch_throughput(call, X), 1),
+                    "artifact_bytes": size,
+                    "load_memory_bytes": memory,
+                }
+            )
+    return rows, fitted
+
+
+def select_best(rows: list[dict], latency_budget_ms: float) -> dict:
+    """
+    Pick the most accurate candidate whose p99 meets the budget (ties → lower p99).
+    Falls back to the fastest candidate when nothing meets the budget.
+    """
+    task = rows[0]["task"]
+    within = [r for r in rows if r["p99_ms"] <= latency_budget_ms]
+    if not within:
+        print(f"  Warning: no {task} candidate meets {latency_budget_ms}ms p99; choosing the fastest")
+        return min(rows, key=lambda r: r["p99_ms"])
+    if task == "classification":
+        return max(within, key=lambda r: (r["accuracy"], -r["p99_ms"]))
+    return min(within, key=lambda r: (r["rmse"], r["p99_ms"]))
@@ -0,0 +1,140 @@
+"""
+Vector index benchmark harness.
+Builds each index type and vector codec (float32, int8 SQ, PQ) from
+vector_service's factory over a synthetic corpus and reports recall@k against
+exact flat search, build time, single-query p50/p99 latency, batch throughput
+and serialized index size. Search-time knobs (nprobe / efSearch) are swept so
+the recall ↔ latency curve is visible, and each quantized row reports the
+memory saved and recall change against its float32 counterpart.
+
+Usage: python -m app.ml.index_benchmark --n 100000 --dim 384 [--output report.json]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.services import vector_service
+
+NPROBE_SWEEP = (1, 4, 8, 16, 32)
+EF_SEARCH_SWEEP = (16, 32, 64, 128)
+
+
+def synthetic_corpus(n: int, dim: int, n_queries: int, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    """Clustered, L2-normalized vectors (topic-like structure) plus perturbed held-out queries."""
+    import faiss
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 500), dim)).astype("float32")
+    assignment = rng.integers(0, len(centers), n + n_queries)
+    data = centers[assignment] + 0.5 * rng.standard_normal((n + n_queries, dim)).astype("float32")
+    faiss.normalize_L2(data)
+    return data[:n], data[n:]
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / truth.size
+
+
+def _measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies = []
+    for q in queries[:200]:
+        t0 = time.perf_counter()
+        index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    _, found = index.search(queries, k)
+    batch_s = time.perf_counter() - t0
+
+    return {
+        f"recall@{k}": round(recall_at_k(truth, found), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "batch_qps": round(len(queries) / batch_s, 1),
+    }
+
+
+def _family(index_type: str) -> str:
+    return "ivf" if index_type.startswith("ivf") else index_type
+
+
+def _add_compression_deltas(rows: list[dict], k: int):
+    """Memory saved and recall change of each quantized row vs. the float32 row with the same tuning."""
+    baseline = {(_family(r["index"]), r["nprobe"], r["ef_search"]): r for r in rows if r["quantization"] == "none"}
+    for row in rows:
+        ref = baseline.get((_family(row["index"]), row["nprobe"], row["ef_search"]))
+        if ref is None or row["quantization"] == "none":
+            continue
+        row["memory_saved_pct"] = round(100 * (1 - row["index_bytes"] / ref["index_bytes"]), 1)
+        row["recall_delta"] = round(row[f"recall@{k}"] - ref[f"recall@{k}"], 4)
+
+
+def run_benchmark(n: int, dim: int, k: int = 10, n_queries: int = 1000) -> list[dict]:
+    """Benchmark every index type × codec (and its search-time sweep) on the same corpus."""
+    import faiss
+
+    corpus, queries = synthetic_corpus(n, dim, n_queries)
+    flat = vector_service.make_index(vector_service.resolve_index_spec(n, dim, "flat", "none"), corpus)
+    _, truth = flat.search(queries, k)
+
+    rows = []
+    combos = [(kind, quant) for kind in vector_service.INDEX_TYPES for quant in vector_service.QUANTIZATIONS]
+    for kind, quant in combos:
+        spec = vector_service.resolve_index_spec(n, dim, kind, quant)
+        if (spec["type"], spec["quantization"]) != (kind, quant):
+            continue  # Not trainable at this size, or a duplicate of another combination (e.g. ivf_flat+pq)
+
+        t0 = time.perf_counter()
+        index = vector_service.make_index(spec, corpus)
+        build_s = time.perf_counter() - t0
+        memory = int(faiss.serialize_index(index).nbytes)
+
+        if "nprobe" in spec:
+            sweep = [{**spec, "nprobe": p} for p in NPROBE_SWEEP if p <= spec["nlist"]]
+        elif "ef_search" in spec:
+            sweep = [{**spec, "ef_search": ef} for ef in EF_SEARCH_SWEEP]
+        else:
+            sweep = [spec]
+
+        for tuned in sweep:
+            vector_service.tune_index(index, tuned)
+            row = {
+                "index": kind,
+                "quantization": quant,
+                "factory": spec["factory"],
+                "nprobe": tuned.get("nprobe"),
+                "ef_search": tuned.get("ef_search"),
+                "build_s": round(build_s, 3),
+                "index_bytes": memory,
+                **_measure(index, queries, truth, k),
+            }
+            print(f"  {row}")
+            rows.append(row)
+    _add_compression_deltas(rows, k)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against exact search")
+    parser.add_argument("--n", type=int, default=100_000, help="Corpus size")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query for recall@k")
+    parser.add_argument("--queries", type=int, default=1000, help="Number of held-out queries")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+
+    print(f"🔎 Vector index benchmark: n={args.n} dim={args.dim} k={args.k}")
+    rows = run_benchmark(args.n, args.dim, args.k, args.queries)
+    report = {"n": args.n, "dim": args.dim, "k": args.k, "results": rows}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📈 Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,19 @@ Data preprocessing and feature engineering for ML training.
 import numpy as np
 import pandas as pd
 
+# Model input columns shared by the batch and streaming trainers
+FEATURE_COLUMNS = ["temperature", "humidity", "rain", "pressure", "wind_speed", "month", "hour"]
+CLUSTER_FEATURE_COLUMNS = ["temperature", "humidity", "rain", "pm2_5"]
+OUTLIER_COLUMNS = ["temperature", "humidity", "rain", "wind_speed", "pm2_5", "pm10"]  # Clipped to the 1st–99th pct
+AQI_CATEGORIES = [
+    "Good",
+    "Moderate",
+    "Unhealthy for Sensitive Groups",
+    "Unhealthy",
+    "Very Unhealthy",
+    "Hazardous",
+]
+
 
 def calculate_aqi_category(pm25: float) -> str:
     """Convert PM2.5 to EPA AQI category string."""
@@ -21,22 +34,31 @@ def calculate_aqi_category(pm25: float) -> str:
     return "Hazardous"
 
 
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Clean raw climate data: handle missing values and outliers."""
+def clean_data(
+    df: pd.DataFrame,
+    fill_values: dict[str, float] | None = None,
+    clip_bounds: dict[str, tuple[float, float]] | None = None,
+) -> pd.DataFrame:
+    """
+    Clean raw climate data: handle missing values and outliers.
+    Medians and 1st/99th percentiles come from `df` itself unless precomputed
+    `fill_values`/`clip_bounds` are given (e.g. over a whole streamed dataset).
+    """
     df = df.copy()
+    fill_values = fill_values or {}
+    clip_bounds = clip_bounds or {}
 
     # Forward fill then median fill for numeric columns
     numeric_cols = df.select_dtypes(include=[np.number]).columns
     df[numeric_cols] = df[numeric_cols].ffill()
     for col in numeric_cols:
-        median_val = df[col].median()
+        median_val = fill_values.get(col, df[col].median())
         df[col] = df[col].fillna(median_val)
 
     # Cap outliers using IQR method
-    for col in ["temperature", "humidity", "rain", "wind_speed", "pm2_5", "pm10"]:
+    for col in OUTLIER_COLUMNS:
         if col in df.columns:
-            q1 = df[col].quantile(0.01)
-            q99 = df[col].quantile(0.99)
+            q1, q99 = clip_bounds.get(col) or (df[col].quantile(0.01), df[col].quantile(0.99))
             df[col] = df[col].clip(q1, q99)
 
     # Ensure non-negative for pollution metrics
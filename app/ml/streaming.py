@@ -0,0 +1,295 @@
+"""
+Streaming (out-of-core) training mode.
+Reads training data in chunks, computes the cleaning statistics (fill medians,
+outlier bounds) over the whole dataset from bounded reservoir samples, fits scalers
+incrementally with partial_fit and trains incremental learners on rows shuffled
+within each chunk and chunks shuffled through a small buffer every epoch, so
+multi-year hourly data never has to fit in memory.
+Progress is checkpointed so an interrupted run can resume where it stopped.
+Artifacts use the same filenames and interfaces that ml_service loads.
+
+Usage: python -m app.ml.trainer --stream training_data.csv
+"""
+
+import os
+from collections.abc import Callable, Iterator
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import PCA
+from sklearn.linear_model import SGDClassifier, SGDRegressor
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from app.ml.preprocessing import (
+    AQI_CATEGORIES,
+    CLUSTER_FEATURE_COLUMNS,
+    FEATURE_COLUMNS,
+    OUTLIER_COLUMNS,
+    clean_data,
+    engineer_features,
+)
+
+CHECKPOINT_FILE = "streaming_checkpoint.joblib"
+HOLDOUT_EVERY = 5  # Every 5th row of a chunk is held out for evaluation
+RESERVOIR_SIZE = 100_000  # Sampled values per column for the global medians and percentiles
+SHUFFLE_BUFFER_CHUNKS = 8  # Chunks held in memory to randomize their order in each epoch
+SEED = 42
+
+ChunkSource = Callable[[], Iterator[pd.DataFrame]]
+
+
+def csv_chunks(path: str, chunksize: int = 50_000) -> ChunkSource:
+    """Return a re-iterable chunk source over a CSV file (one iterator per pass)."""
+
+    def _iter() -> Iterator[pd.DataFrame]:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+    return _iter
+
+
+def _shuffled(chunks: Iterator[pd.DataFrame], rng: np.random.Generator) -> Iterator[pd.DataFrame]:
+    """Yield chunks in a random order, drawn from a buffer of SHUFFLE_BUFFER_CHUNKS."""
+    buffer = []
+    for chunk in chunks:
+        buffer.append(chunk)
+        if len(buffer) == SHUFFLE_BUFFER_CHUNKS:
+            yield buffer.pop(int(rng.integers(len(buffer))))
+    while buffer:
+        yield buffer.pop(int(rng.integers(len(buffer))))
+
+
+def _prepare_chunk(chunk: pd.DataFrame, state: dict) -> pd.DataFrame:
+    """Apply the batch trainer's cleaning (with the dataset-wide statistics) and feature engineering to one chunk."""
+    chunk = clean_data(chunk, state["fill_values"], state["clip_bounds"])
+    chunk = engineer_features(chunk)
+    return chunk.dropna(subset=FEATURE_COLUMNS + ["pm2_5", "aqi_category"])
+
+
+def _new_state() -> dict:
+    """Fresh training state. Everything needed to resume lives in this dict."""
+    encoder = LabelEncoder().fit(AQI_CATEGORIES)
+    return {
+        "phase": "stats",  # "stats" → "scale" → "learn"
+        "epoch": 0,
+        "chunks_done": 0,
+        "rng": np.random.default_rng(SEED),
+        "samples": {},  # column → reservoir sample of its values (dropped once the statistics are computed)
+        "rows_seen": {},
+        "fill_values": {},
+        "clip_bounds": {},
+        "encoder": encoder,
+        "scaler_cls": StandardScaler(),
+        "scaler_reg": StandardScaler(),
+        "classifier": SGDClassifier(loss="log_loss", random_state=42),
+        "regressor": SGDRegressor(random_state=42),
+        "city_sums": {},
+        "city_counts": {},
+        "metrics": {"correct": 0, "seen": 0, "sq_err": 0.0},
+    }
+
+
+def _save_checkpoint(state: dict, models_dir: str):
+    path = os.path.join(models_dir, CHECKPOINT_FILE)
+    tmp = path + ".tmp"
+    joblib.dump(state, tmp)
+    os.replace(tmp, path)  # Atomic: a crash mid-write never corrupts the checkpoint
+
+
+def _load_checkpoint(models_dir: str) -> dict | None:
+    path = os.path.join(models_dir, CHECKPOINT_FILE)
+    if os.path.exists(path):
+        return joblib.load(path)
+    return None
+
+
+def _stats_pass_step(state: dict, chunk: pd.DataFrame):
+    """Pass 1: reservoir-sample every numeric column (Algorithm R, vectorized per chunk)."""
+    numeric = chunk.select_dtypes(include=[np.number]).ffill()  # As clean_data sees them
+    for col in numeric.columns:
+        values = numeric[col].dropna().to_numpy(dtype=float)
+        sample = state["samples"].get(col, np.empty(0))
+        seen = state["rows_seen"].get(col, 0)
+        free = RESERVOIR_SIZE - len(sample)
+        sample = np.concatenate([sample, values[:free]])
+        rest = values[free:]
+        if len(rest):
+            first = seen + len(values) - len(rest)
+            slots = state["rng"].integers(0, np.arange(first, first + len(rest)) + 1)
+            keep = slots < RESERVOIR_SIZE
+            sample[slots[keep]] = rest[keep]
+        state["samples"][col] = sample
+        state["rows_seen"][col] = seen + len(values)
+
+
+def _finish_stats(state: dict):
+    """Turn the reservoir samples into the fill medians and outlier clip bounds clean_data applies."""
+    for col, sample in state["samples"].items():
+        if not len(sample):
+            continue
+        state["fill_values"][col] = float(np.median(sample))
+        if col in OUTLIER_COLUMNS:
+            state["clip_bounds"][col] = (float(np.quantile(sample, 0.01)), float(np.quantile(sample, 0.99)))
+    state["samples"] = {}
+
+
+def _scale_pass_step(state: dict, chunk: pd.DataFrame):
+    """Pass 2: update scaler statistics and per-city clustering profiles."""
+    X = chunk[FEATURE_COLUMNS].values
+    state["scaler_cls"].partial_fit(X)
+    state["scaler_reg"].partial_fit(X)
+
+    grouped = chunk.groupby("city")[CLUSTER_FEATURE_COLUMNS]
+    sums, counts = grouped.sum(), grouped.size()
+    for city, row in sums.iterrows():
+        prev = state["city_sums"].get(city)
+        state["city_sums"][city] = row.values if prev is None else prev + row.values
+        state["city_counts"][city] = state["city_counts"].get(city, 0) + int(counts[city])
+
+
+def _learn_pass_step(state: dict, chunk: pd.DataFrame, evaluate: bool, rng: np.random.Generator):
+    """Pass 3: partial_fit the learners on scaled, shuffled rows, scoring the held-out rows."""
+    X = chunk[FEATURE_COLUMNS].values
+    y_cls = state["encoder"].transform(chunk["aqi_category"])
+    y_reg = chunk["pm2_5"].values
+
+    holdout = np.arange(len(chunk)) % HOLDOUT_EVERY == 0
+    train = ~holdout
+
+    X_cls = state["scaler_cls"].transform(X)
+    X_reg = state["scaler_reg"].transform(X)
+
+    # Held-out rows are never trained on, so they give an unbiased streaming estimate
+    if evaluate and holdout.any() and hasattr(state["classifier"], "classes_"):
+        m = state["metrics"]
+        m["correct"] += int((state["classifier"].predict(X_cls[holdout]) == y_cls[holdout]).sum())
+        m["sq_err"] += float(((state["regressor"].predict(X_reg[holdout]) - y_reg[holdout]) ** 2).sum())
+        m["seen"] += int(holdout.sum())
+
+    if train.any():
+        # Holdout is picked by position first, so shuffling never moves a row between the two sets
+        rows = rng.permutation(np.flatnonzero(train))
+        classes = np.arange(len(state["encoder"].classes_))
+        state["classifier"].partial_fit(X_cls[rows], y_cls[rows], classes=classes)
+        state["regressor"].partial_fit(X_reg[rows], y_reg[rows])
+
+
+def _fit_clustering(state: dict, models_dir: str):
+    """Fit clustering artifacts on the accumulated per-city mean profiles."""
+    cities = sorted(state["city_counts"])
+    profiles = np.array([state["city_sums"][c] / state["city_counts"][c] for c in cities])
+
+    scaler_clust = StandardScaler()
+    X_clust = scaler_clust.fit_transform(profiles)
+    joblib.dump(scaler_clust, f"{models_dir}/clustering_scaler.joblib")
+
+    pca = PCA(n_components=2)
+    pca.fit(X_clust)
+    joblib.dump(pca, f"{models_dir}/pca_model.joblib")
+
+    kmeans = MiniBatchKMeans(n_clusters=3, random_state=42, n_init=10, batch_size=1024)
+    kmeans.fit(X_clust)
+    joblib.dump(kmeans, f"{models_dir}/kmeans_model.joblib")
+    print(f"  Clustered {len(cities)} city profiles")
+
+
+def _save_artifacts(state: dict, models_dir: str):
+    """Write the classifier/regressor artifacts under ml_service's filenames."""
+    joblib.dump(state["encoder"], f"{models_dir}/classification_label_encoder.joblib")
+    joblib.dump(state["scaler_cls"], f"{models_dir}/classification_scaler.joblib")
+    joblib.dump(state["classifier"], f"{models_dir}/risk_xgboost.joblib")
+    joblib.dump(state["scaler_reg"], f"{models_dir}/regression_scaler.joblib")
+    joblib.dump(state["regressor"], f"{models_dir}/pollution_xgboost.joblib")
+
+
+def train_streaming(
+    chunks: ChunkSource,
+    models_dir: str,
+    epochs: int = 1,
+    checkpoint_every: int = 10,
+    resume: bool = True,
+) -> dict:
+    """
+    Train all models out-of-core from a re-iterable chunk source.
+    Pass 1 samples the cleaning statistics, pass 2 fits the scalers and per-city
+    profiles, pass 3 (repeated `epochs` times, in a new chunk and row order each time)
+    trains SGD learners, then clustering is fitted with MiniBatchKMeans.
+    A checkpoint is written every `checkpoint_every` chunks and removed on success.
+    Returns the held-out evaluation metrics.
+    """
+    os.makedirs(models_dir, exist_ok=True)
+
+    state = _load_checkpoint(models_dir) if resume else None
+    if state is not None:
+        print(f"  Resuming from checkpoint: phase={state['phase']} epoch={state['epoch']} chunk={state['chunks_done']}")
+    else:
+        state = _new_state()
+
+    if state["phase"] == "stats":
+        print("\n📊 Pass 1: sampling cleaning statistics...")
+        for i, chunk in enumerate(chunks()):
+            if i < state["chunks_done"]:
+                continue
+            _stats_pass_step(state, chunk)
+            state["chunks_done"] = i + 1
+            if state["chunks_done"] % checkpoint_every == 0:
+                _save_checkpoint(state, models_dir)
+        _finish_stats(state)
+        state.update(phase="scale", chunks_done=0)
+        _save_checkpoint(state, models_dir)
+
+    if state["phase"] == "scale":
+        print("\n📊 Pass 2: fitting scalers...")
+        for i, chunk in enumerate(chunks()):
+            if i < state["chunks_done"]:
+                continue
+            chunk = _prepare_chunk(chunk, state)
+            if not chunk.empty:
+                _scale_pass_step(state, chunk)
+            state["chunks_done"] = i + 1
+            if state["chunks_done"] % checkpoint_every == 0:
+                _save_checkpoint(state, models_dir)
+        if not state["city_counts"]:
+            raise ValueError("No usable training rows in the streamed data")
+        state.update(phase="learn", epoch=0, chunks_done=0)
+        _save_checkpoint(state, models_dir)
+
+    while state["phase"] == "learn" and state["epoch"] < epochs:
+        print(f"\n📊 Pass 3: training incremental learners (epoch {state['epoch'] + 1}/{epochs})...")
+        last_epoch = state["epoch"] == epochs - 1
+        # Seeded per epoch (and chunk), so a resumed epoch replays the same order
+        order = np.random.default_rng([SEED, state["epoch"]])
+        for i, chunk in enumerate(_shuffled(chunks(), order)):
+            if i < state["chunks_done"]:
+                continue
+            chunk = _prepare_chunk(chunk, state)
+            if not chunk.empty:
+                _learn_pass_step(state, chunk, last_epoch, np.random.default_rng([SEED, state["epoch"], i]))
+            state["chunks_done"] = i + 1
+            if state["chunks_done"] % checkpoint_every == 0:
+                _save_checkpoint(state, models_dir)
+        state.update(epoch=state["epoch"] + 1, chunks_done=0)
+        _save_checkpoint(state, models_dir)
+
+    m = state["metrics"]
+    metrics = {
+        "accuracy": m["correct"] / m["seen"] if m["seen"] else None,
+        "rmse": float(np.sqrt(m["sq_err"] / m["seen"])) if m["seen"] else None,
+        "holdout_rows": m["seen"],
+    }
+    if metrics["holdout_rows"]:
+        print(f"  Accuracy: {metrics['accuracy']:.4f}")
+        print(f"  RMSE: {metrics['rmse']:.4f}")
+
+    _save_artifacts(state, models_dir)
+
+    print("\n📊 Training City Clustering...")
+    _fit_clustering(state, models_dir)
+
+    checkpoint = os.path.join(models_dir, CHECKPOINT_FILE)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    print(f"\n✅ All models saved to {models_dir}/")
+    return metrics
@@ -4,12 +4,18 @@ Fetches data from Open-Meteo APIs, trains classification/regression/clustering m
 and saves them as .joblib files for the API to load at startup.
 
 Usage: python -m app.ml.trainer
+       python -m app.ml.trainer --benchmark [--latency-budget-ms 5]
+       python -m app.ml.trainer --export training_data.csv
+       python -m app.ml.trainer --stream training_data.csv [--chunksize 50000] [--epochs 1] [--no-resume]
 """
 
+import argparse
+import asyncio
+import hashlib
+import json
 import os
 from datetime import datetime, timedelta, timezone
 
-import httpx
 import joblib
 import numpy as np
 import pandas as pd
@@ -20,9 +26,12 @@ from sklearn.metrics import accuracy_score, mean_squared_error, silhouette_score
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 
-from app.ml.preprocessing import clean_data, engineer_features
+from app.ml.benchmarking import benchmark_candidates, classifier_candidates, regressor_candidates, select_best
+from app.ml.preprocessing import CLUSTER_FEATURE_COLUMNS, FEATURE_COLUMNS, clean_data, engineer_features
+from app.services import upstream
 
 MODELS_DIR = "app/ml/pretrained"
+BENCHMARK_REPORT_FILE = "model_benchmark.json"
 TRAINING_CITIES = [
     ("London", 51.5074, -0.1278),
     ("New York", 40.7128, -74.006),
@@ -59,74 +68,100 @@ TRAINING_CITIES = [
 
 def fetch_training_data() -> pd.DataFrame:
     """Fetch 90 days of weather + AQ data for training cities."""
+    return asyncio.run(_fetch_training_data())
+
+
+async def _fetch_training_data() -> pd.DataFrame:
+    # Bulk historical fetches go through the shared scheduler in the background lane
     end_date = (datetime.now(timezone.utc) - timedelta(days=5)).strftime("%Y-%m-%d")
     start_date = (datetime.now(timezone.utc) - timedelta(days=95)).strftime("%Y-%m-%d")
 
     all_data = []
-    client = httpx.Client(timeout=30.0)
-
-    for city_name, lat, lon in TRAINING_CITIES:
-        print(f"  Fetching {city_name}...")
-        try:
-            # Weather
-            w_resp = client.get(
-                "https://archive-api.open-meteo.com/v1/archive",
-                params={
-                    "latitude": lat,
-                    "longitude": lon,
-                    "start_date": start_date,
-                    "end_date": end_date,
-                    "hourly": ["temperature_2m", "relative_humidity_2m", "rain", "surface_pressure", "wind_speed_10m"],
-                },
-            )
-            w_data = w_resp.json().get("hourly", {})
-
-            # Air Quality
-            aq_resp = client.get(
-                "https://air-quality-api.open-meteo.com/v1/air-quality",
-                params={
-                    "latitude": lat,
-                    "longitude": lon,
-                    "start_date": start_date,
-                    "end_date": end_date,
-                    "hourly": ["pm10", "pm2_5", "nitrogen_dioxide", "ozone"],
-                },
-            )
-            aq_data = aq_resp.json().get("hourly", {})
-
-            # Merge
-            n = min(len(w_data.get("time", [])), len(aq_data.get("time", [])))
-            for i in range(0, n, 6):  # Sample every 6 hours to reduce data size
-                all_data.append(
-                    {
-                        "date": w_data["time"][i],
-                        "city": city_name,
-                        "temperature": w_data["temperature_2m"][i],
-                        "humidity": w_data["relative_humidity_2m"][i],
-                        "rain": w_data["rain"][i],
-                        "pressure": w_data["surface_pressure"][i],
-                        "wind_speed": w_data["wind_speed_10m"][i],
-                        "pm10": aq_data["pm10"][i] if i < len(aq_data.get("pm10", [])) else None,
-                        "pm2_5": aq_data["pm2_5"][i] if i < len(aq_data.get("pm2_5", [])) else None,
-                        "no2": aq_data["nitrogen_dioxide"][i] if i < len(aq_data.get("nitrogen_dioxide", [])) else None,
-                        "ozone": aq_data["ozone"][i] if i < len(aq_data.get("ozone", [])) else None,
-                    }
+
+    with upstream.background("trainer"):
+        for city_name, lat, lon in TRAINING_CITIES:
+            print(f"  Fetching {city_name}...")
+            try:
+                # Weather
+                w_resp = await upstream.get(
+                    "https://archive-api.open-meteo.com/v1/archive",
+                    params={
+                        "latitude": lat,
+                        "longitude": lon,
+                        "start_date": start_date,
+                        "end_date": end_date,
+                        "hourly": [
+                            "temperature_2m",
+                            "relative_humidity_2m",
+                            "rain",
+                            "surface_pressure",
+                            "wind_speed_10m",
+                        ],
+                    },
+                    timeout=30.0,
+                )
+                w_data = w_resp.json().get("hourly", {})
+
+                # Air Quality
+                aq_resp = await upstream.get(
+                    "https://air-quality-api.open-meteo.com/v1/air-quality",
+                    params={
+                        "latitude": lat,
+                        "longitude": lon,
+                        "start_date": start_date,
+                        "end_date": end_date,
+                        "hourly": ["pm10", "pm2_5", "nitrogen_dioxide", "ozone"],
+                    },
+                    timeout=30.0,
                 )
-        except Exception as e:
-            print(f"  Warning: Failed for {city_name}: {e}")
+                aq_data = aq_resp.json().get("hourly", {})
+
+                # Merge
+                n = min(len(w_data.get("time", [])), len(aq_data.get("time", [])))
+                for i in range(0, n, 6):  # Sample every 6 hours to reduce data size
+                    all_data.append(
+                        {
+                            "date": w_data["time"][i],
+                            "city": city_name,
+                            "temperature": w_data["temperature_2m"][i],
+                            "humidity": w_data["relative_humidity_2m"][i],
+                            "rain": w_data["rain"][i],
+                            "pressure": w_data["surface_pressure"][i],
+                            "wind_speed": w_data["wind_speed_10m"][i],
+                            "pm10": aq_data["pm10"][i] if i < len(aq_data.get("pm10", [])) else None,
+                            "pm2_5": aq_data["pm2_5"][i] if i < len(aq_data.get("pm2_5", [])) else None,
+                            "no2": aq_data["nitrogen_dioxide"][i]
+                            if i < len(aq_data.get("nitrogen_dioxide", []))
+                            else None,
+                            "ozone": aq_data["ozone"][i] if i < len(aq_data.get("ozone", [])) else None,
+                        }
+                    )
+            except Exception as e:
+                print(f"  Warning: Failed for {city_name}: {e}")
 
-    client.close()
     return pd.DataFrame(all_data)
 
 
-def train_all_models(df: pd.DataFrame):
-    """Train classification, regression, and clustering models."""
+def _file_sha256(path: str) -> str:
+    """Fingerprint of a saved model, so ml_service applies the report only to the models it benchmarked."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def train_all_models(df: pd.DataFrame, benchmark: bool = False, latency_budget_ms: float = 5.0):
+    """
+    Train classification, regression, and clustering models.
+    With benchmark=True, several candidate configurations are fitted per task and the
+    most accurate one within `latency_budget_ms` (single-row p99) is saved, along
+    with a machine-readable report in model_benchmark.json.
+    """
     os.makedirs(MODELS_DIR, exist_ok=True)
+    report = {"latency_budget_ms": latency_budget_ms, "generated_at": datetime.now(timezone.utc).isoformat()}
 
     df = clean_data(df)
     df = engineer_features(df)
 
-    features = ["temperature", "humidity", "rain", "pressure", "wind_speed", "month", "hour"]
+    features = FEATURE_COLUMNS
     df_clean = df.dropna(subset=features + ["pm2_5", "aqi_category"])
 
     # ── Classification: AQI Risk ──
@@ -142,11 +177,22 @@ def train_all_models(df: pd.DataFrame):
     X_test_s = scaler_cls.transform(X_test)
     joblib.dump(scaler_cls, f"{MODELS_DIR}/classification_scaler.joblib")
 
-    clf = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
-    clf.fit(X_train_s, y_train)
+    if benchmark:
+        rows, fitted = benchmark_candidates(
+            "classification", classifier_candidates(), X_train_s, y_train, X_test_s, y_test
+        )
+        selected = select_best(rows, latency_budget_ms)
+        report["classification"] = {"selected": selected, "candidates": rows}
+        clf = fitted[selected["name"]]
+        print(f"  Selected {selected['name']} ({selected['input_dtype']}, p99={selected['p99_ms']}ms)")
+    else:
+        clf = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=-1)
+        clf.fit(X_train_s, y_train)
     acc = accuracy_score(y_test, clf.predict(X_test_s))
     print(f"  Accuracy: {acc:.4f}")
     joblib.dump(clf, f"{MODELS_DIR}/risk_xgboost.joblib")
+    if benchmark:
+        report["classification"]["model_sha256"] = _file_sha256(f"{MODELS_DIR}/risk_xgboost.joblib")
 
     # ── Regression: PM2.5 ──
     print("\n📊 Training PM2.5 Regressor...")
@@ -157,15 +203,24 @@ def train_all_models(df: pd.DataFrame):
     X_test_s = scaler_reg.transform(X_test)
     joblib.dump(scaler_reg, f"{MODELS_DIR}/regression_scaler.joblib")
 
-    reg = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
-    reg.fit(X_train_s, y_train)
+    if benchmark:
+        rows, fitted = benchmark_candidates("regression", regressor_candidates(), X_train_s, y_train, X_test_s, y_test)
+        selected = select_best(rows, latency_budget_ms)
+        report["regression"] = {"selected": selected, "candidates": rows}
+        reg = fitted[selected["name"]]
+        print(f"  Selected {selected['name']} ({selected['input_dtype']}, p99={selected['p99_ms']}ms)")
+    else:
+        reg = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
+        reg.fit(X_train_s, y_train)
     rmse = np.sqrt(mean_squared_error(y_test, reg.predict(X_test_s)))
     print(f"  RMSE: {rmse:.4f}")
     joblib.dump(reg, f"{MODELS_DIR}/pollution_xgboost.joblib")
+    if benchmark:
+        report["regression"]["model_sha256"] = _file_sha256(f"{MODELS_DIR}/pollution_xgboost.joblib")
 
     # ── Clustering: City Segmentation ──
     print("\n📊 Training City Clustering...")
-    cluster_features = ["temperature", "humidity", "rain", "pm2_5"]
+    cluster_features = CLUSTER_FEATURE_COLUMNS
     city_profiles = df_clean.groupby("city")[cluster_features].mean()
 
     scaler_clust = StandardScaler()
@@ -182,22 +237,59 @@ def train_all_models(df: pd.DataFrame):
     print(f"  Silhouette Score: {sil:.4f}")
     joblib.dump(kmeans, f"{MODELS_DIR}/kmeans_model.joblib")
 
+    if benchmark:
+        with open(f"{MODELS_DIR}/{BENCHMARK_REPORT_FILE}", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n📈 Benchmark report written to {MODELS_DIR}/{BENCHMARK_REPORT_FILE}")
+
     print(f"\n✅ All models saved to {MODELS_DIR}/")
 
 
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Train Cloud Intelligence ML models")
+    parser.add_argument("--stream", metavar="CSV", help="Train out-of-core from a CSV file in chunks")
+    parser.add_argument("--chunksize", type=int, default=50_000, help="Rows per chunk in streaming mode")
+    parser.add_argument("--epochs", type=int, default=1, help="Passes over the data for incremental learners")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore an existing streaming checkpoint")
+    parser.add_argument("--benchmark", action="store_true", help="Benchmark candidate models and pick by latency")
+    parser.add_argument("--latency-budget-ms", type=float, default=5.0, help="Single-row p99 budget for --benchmark")
+    parser.add_argument("--export", metavar="CSV", help="Write fetched training data to CSV and exit")
+    return parser.parse_args()
+
+
 def main():
+    args = _parse_args()
     print("🔄 Cloud Intelligence — ML Training Pipeline")
     print("=" * 50)
+
+    if args.stream:
+        from app.ml.streaming import csv_chunks, train_streaming
+
+        print(f"Streaming training from {args.stream} (chunksize={args.chunksize})...")
+        train_streaming(
+            csv_chunks(args.stream, args.chunksize),
+            MODELS_DIR,
+            epochs=args.epochs,
+            resume=not args.no_resume,
+        )
+        print("\n🎉 Training complete!")
+        return
+
     print("Step 1: Fetching training data...")
     df = fetch_training_data()
     print(f"  Fetched {len(df)} data points")
 
+    if args.export:
+        df.to_csv(args.export, index=False)
+        print(f"  Exported to {args.export}")
+        return
+
     if len(df) < 100:
         print("❌ Insufficient data for training. Need at least 100 rows.")
         return
 
     print("\nStep 2: Training models...")
-    train_all_models(df)
+    train_all_models(df, benchmark=args.benchmark, latency_budget_ms=args.latency_budget_ms)
     print("\n🎉 Training complete!")
 
 
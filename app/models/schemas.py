@@ -36,6 +36,12 @@ class Season(str, Enum):
     WINTER = "winter"
 
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+
+
 # ──────────────────────────────────────────────
 # Geo & City Models
 # ──────────────────────────────────────────────
@@ -281,6 +287,7 @@ class CityDataPacket(BaseModel):
     weather: WeatherCurrent
     air_quality: AirQualityCurrent
     ingested_at: datetime
+    degraded: dict[str, str] = Field(default_factory=dict, description="Fallback fields → reason")
 
 
 class AnalysisInsight(BaseModel):
@@ -326,6 +333,14 @@ class RecommendationReport(BaseModel):
     generated_at: datetime
 
 
+class PipelineTimings(BaseModel):
+    """Per-stage durations of one pipeline run (mirrors the Server-Timing header)."""
+
+    stages_ms: dict[str, float]
+    cache_hits: dict[str, bool] = Field(default_factory=dict, description="Stage → served from cache")
+    total_ms: float
+
+
 class IntelligenceReport(BaseModel):
     """Complete intelligence report — final output of agent pipeline."""
 
@@ -337,6 +352,10 @@ class IntelligenceReport(BaseModel):
     air_quality: AirQualityCurrent
     analysis: AnalysisResult
     recommendations: RecommendationReport
+    degraded: dict[str, str] = Field(
+        default_factory=dict, description="Inputs served from stale cache or model estimates → reason"
+    )
+    timings: Optional[PipelineTimings] = None
     generated_at: datetime
 
 
@@ -349,11 +368,80 @@ class CityComparison(BaseModel):
     generated_at: datetime
 
 
+class ComparisonSummary(BaseModel):
+    """Closing event of a streamed multi-city comparison."""
+
+    summary: str
+    best_overall: Optional[str] = None
+    failed: list[str]
+    generated_at: datetime
+
+
+class AnalysisJobRequest(BaseModel):
+    """Background multi-city analysis request."""
+
+    cities: Optional[list[str]] = Field(
+        default=None, min_length=1, max_length=1000, description="Cities to analyze; omit for the whole catalog"
+    )
+
+
+class AnalysisJob(BaseModel):
+    """Background analysis job progress."""
+
+    job_id: str
+    status: JobStatus
+    total: int
+    completed: int
+    failed: int
+    progress: float = Field(..., ge=0, le=1)
+    submitted_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class AnalysisJobResults(AnalysisJob):
+    """Reports produced so far by a background job (partial while it is running)."""
+
+    reports: list[IntelligenceReport]
+    errors: dict[str, str]
+
+
+class LeaderboardEntry(BaseModel):
+    """A city's position on the livability leaderboard."""
+
+    rank: int
+    city: str
+    country: str
+    overall_score: float
+    aqi: int
+    temperature_c: float
+    updated_at: datetime
+
+
+class Leaderboard(BaseModel):
+    """Catalog cities ranked by livability score."""
+
+    entries: list[LeaderboardEntry]
+    ranked: int = Field(..., description="Cities scored so far (those with fetched weather and AQ)")
+    catalog_size: int
+    generated_at: datetime
+
+
+class SearchFilters(BaseModel):
+    """Structured metadata filters applied during semantic search."""
+
+    continent: Optional[str] = None
+    country: Optional[str] = None
+    min_population: Optional[int] = Field(default=None, ge=0)
+    max_population: Optional[int] = Field(default=None, ge=0)
+
+
 class SemanticSearchQuery(BaseModel):
     """Semantic search input."""
 
     query: str = Field(..., min_length=3, max_length=500, description="Natural language query")
     top_k: int = Field(default=5, ge=1, le=20)
+    filters: Optional[SearchFilters] = None
 
 
 class SemanticSearchResult(BaseModel):
@@ -375,6 +463,21 @@ class SemanticSearchResponse(BaseModel):
     total: int
 
 
+class BatchSemanticSearchQuery(BaseModel):
+    """Batch semantic search input — many queries in one request."""
+
+    queries: list[str] = Field(..., min_length=1, max_length=500, description="Natural language queries")
+    top_k: int = Field(default=5, ge=1, le=20)
+    filters: Optional[SearchFilters] = None
+
+
+class BatchSemanticSearchResponse(BaseModel):
+    """Batch semantic search results, one response per query in input order."""
+
+    results: list[SemanticSearchResponse]
+    total: int
+
+
 # ──────────────────────────────────────────────
 # System Models
 # ──────────────────────────────────────────────
@@ -397,4 +500,46 @@ class SystemStatus(BaseModel):
     faiss_index_size: int
     cities_count: int
     cache_stats: dict
+    jobs: dict = {}
+    upstreams: dict = {}
+    event_loop: dict = {}
+    startup: dict = {}
     uptime_seconds: float
+
+
+class MemoryReport(BaseModel):
+    """Process memory and the approximate size of each cache, model and index."""
+
+    rss_bytes: int
+    peak_rss_bytes: int
+    accounted_bytes: int = Field(..., description="Sum of the component sizes")
+    unaccounted_bytes: int = Field(..., description="RSS not attributed to a component (interpreter, libraries)")
+    components: dict[str, dict] = Field(..., description="Component → bytes, entries and component details")
+    rss_history: list[dict] = []
+
+
+class ProfileSummary(BaseModel):
+    """A stored request profile (single request or aggregation session)."""
+
+    profile_id: str
+    label: str
+    created_at: str
+    complete: bool = Field(..., description="False while an aggregation session is still collecting")
+    requests: int
+    duration_ms: float
+    samples: int
+    interval_ms: float
+
+
+class ProfileFrame(BaseModel):
+    """A function's share of the sampled stacks."""
+
+    function: str
+    total_pct: float = Field(..., description="Samples with the function anywhere on the stack")
+    self_pct: float = Field(..., description="Samples with the function executing")
+
+
+class ProfileReport(ProfileSummary):
+    """Profile summary with its hottest functions."""
+
+    top: list[ProfileFrame]
@@ -1,30 +1,60 @@
 """Agent orchestration endpoints: full city analysis, comparison, semantic search."""
 
-from fastapi import APIRouter, Body, HTTPException
+import asyncio
+import json
 
-from app.agents import orchestrator
+from fastapi import APIRouter, Body, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.agents import leaderboard, orchestrator
+from app.agents.deadline import Deadline
+from app.config import get_settings
 from app.models.schemas import (
+    AnalysisJob,
+    AnalysisJobRequest,
+    AnalysisJobResults,
+    BatchSemanticSearchQuery,
+    BatchSemanticSearchResponse,
     CityComparison,
     IntelligenceReport,
+    Leaderboard,
+    LeaderboardEntry,
+    PipelineTimings,
     SemanticSearchQuery,
     SemanticSearchResponse,
 )
-from app.services import vector_service
+from app.services import geocoding_service, job_service, timing, vector_service
 
 router = APIRouter(prefix="/api/v1/agents", tags=["Agents"])
+settings = get_settings()
 
 
 @router.post("/analyze/{city}", response_model=IntelligenceReport)
-async def analyze_city(city: str):
+async def analyze_city(
+    city: str,
+    response: Response,
+    timings: bool = Query(False, description="Include per-stage timings in the report"),
+):
     """
     Run the full agent pipeline for a city:
     Ingestion → Analysis → Recommendations
-    Returns a complete intelligence report.
+    Returns a complete intelligence report within ANALYZE_DEADLINE_MS; inputs that
+    could not be fetched in time are served from fallbacks and listed in `degraded`.
+    Stage durations and cache hits are always sent in the Server-Timing header.
     """
     try:
-        return await orchestrator.run_city_analysis(city)
+        with timing.recording() as recorded:
+            report = await orchestrator.run_city_analysis(city, Deadline.from_budget(settings.ANALYZE_DEADLINE_MS))
+        response.headers["Server-Timing"] = recorded.server_timing()
+        if timings:
+            # Cached reports are shared between requests, so attach timings to a copy
+            report = report.model_copy(update={"timings": PipelineTimings(**recorded.summary())})
+        return report
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except TimeoutError:
+        raise HTTPException(status_code=504, detail=f"No data for {city} within the latency budget")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Agent pipeline failed: {str(e)}")
 
@@ -33,22 +63,115 @@ async def analyze_city(city: str):
 async def compare_cities(cities: list[str] = Body(..., min_length=2, max_length=10)):
     """Compare multiple cities side-by-side using the agent pipeline."""
     try:
-        return await orchestrator.compare_cities(cities)
+        return await orchestrator.compare_cities(cities, Deadline.from_budget(settings.COMPARE_DEADLINE_MS))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Comparison failed: {str(e)}")
 
 
+@router.post("/compare/stream")
+async def compare_cities_stream(
+    cities: list[str] = Body(..., min_length=2, max_length=10),
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson lines or text/event-stream"),
+):
+    """
+    Streaming comparison: each city's IntelligenceReport is sent as soon as it is ready
+    ("report" events, or "error" for a city that failed), followed by a closing
+    "summary" event with best_overall. Time-to-first-byte follows the fastest city.
+    """
+
+    async def events():
+        deadline = Deadline.from_budget(settings.COMPARE_DEADLINE_MS)
+        async for event, payload in orchestrator.stream_comparison(cities, deadline):
+            data = payload.model_dump_json() if isinstance(payload, BaseModel) else json.dumps(payload)
+            if format == "sse":
+                yield f"event: {event}\ndata: {data}\n\n"
+            else:
+                yield f'{{"event": "{event}", "data": {data}}}\n'
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/leaderboard", response_model=Leaderboard)
+async def get_leaderboard(top: int = Query(10, ge=1, le=500)):
+    """
+    Catalog cities ranked by livability score. Scores update incrementally as each
+    city's weather/AQ data refreshes, so this never calls upstream APIs.
+    """
+    return leaderboard.get_top(top)
+
+
+@router.get("/leaderboard/{city}", response_model=LeaderboardEntry)
+async def get_leaderboard_rank(
+    city: str, country: str | None = Query(None, description="Disambiguates cities sharing a name")
+):
+    """
+    Leaderboard rank and score of one city (matched by catalog name, case-insensitive;
+    the best-ranked one when several catalog cities share the name and no country is given).
+    """
+    entry = leaderboard.get_rank(city, country)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"{city} has not been scored yet")
+    return entry
+
+
+@router.post("/jobs", response_model=AnalysisJob, status_code=202)
+async def submit_analysis_job(request: AnalysisJobRequest):
+    """
+    Queue a background analysis of many cities (the whole catalog when none are given).
+    Returns a job id immediately; poll /jobs/{job_id} for progress and /jobs/{job_id}/results for reports.
+    """
+    cities = request.cities or [c.name for c in geocoding_service.get_all_cities()]
+    try:
+        return await job_service.submit_job(cities)
+    except job_service.QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))  # No cities given and the catalog is empty
+
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJob)
+async def get_analysis_job(job_id: str):
+    """Progress of a background analysis job."""
+    job = job_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@router.get("/jobs/{job_id}/results", response_model=AnalysisJobResults)
+async def get_analysis_job_results(job_id: str):
+    """Reports finished so far (all of them once the job is completed) — served from storage, never re-run."""
+    results = job_service.get_job_results(job_id)
+    if results is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return results
+
+
 @router.post("/search", response_model=SemanticSearchResponse)
 async def semantic_search(query: SemanticSearchQuery):
     """
     Semantic search across city intelligence using natural language.
     Example: 'cities with clean air and warm weather'
+    Optional filters (continent, country, population range) are applied inside the vector search.
     """
-    results = vector_service.semantic_search(query.query, top_k=query.top_k)
+    # In a worker thread: the first search may have to load the embedding model
+    results = await asyncio.to_thread(vector_service.semantic_search, query.query, query.top_k, query.filters)
     return SemanticSearchResponse(
         query=query.query,
         results=results,
         total=len(results),
     )
+
+
+@router.post("/search/batch", response_model=BatchSemanticSearchResponse)
+async def semantic_search_batch(query: BatchSemanticSearchQuery):
+    """
+    Run many semantic searches in one call.
+    All queries are embedded in a single forward pass and searched with one index lookup.
+    """
+    batches = await asyncio.to_thread(vector_service.semantic_search_batch, query.queries, query.top_k, query.filters)
+    responses = [SemanticSearchResponse(query=q, results=r, total=len(r)) for q, r in zip(query.queries, batches)]
+    return BatchSemanticSearchResponse(results=responses, total=len(responses))
@@ -3,20 +3,37 @@
 import time
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
 
+from app.agents import orchestrator
 from app.config import get_settings
-from app.models.schemas import HealthCheck, SystemStatus
-from app.services import geocoding_service, ml_service, vector_service
+from app.models.schemas import HealthCheck, MemoryReport, SystemStatus
+from app.services import (
+    air_quality_service,
+    geocoding_service,
+    job_service,
+    loop_monitor,
+    memory,
+    metrics,
+    ml_service,
+    upstream,
+    vector_service,
+    warmup,
+    weather_service,
+)
 
 router = APIRouter()
 settings = get_settings()
 
 _start_time = time.time()
 
+# The stats routes are async: they iterate caches, metric series and warm-up state that
+# the event loop mutates, which is only safe from the loop itself (not the threadpool).
+
 
 @router.get("/health", response_model=HealthCheck, tags=["System"])
 def health_check():
-    """Basic health check endpoint."""
+    """Liveness check: answers as soon as the process serves, even while warm-up is running."""
     return HealthCheck(
         status="healthy",
         version=settings.APP_VERSION,
@@ -24,8 +41,15 @@ def health_check():
     )
 
 
+@router.get("/ready", tags=["System"])
+async def readiness_check():
+    """Readiness check: 503 until the models, city catalog and vector index have finished loading."""
+    stats = warmup.get_stats()
+    return JSONResponse(stats, status_code=200 if stats["ready"] else 503)
+
+
 @router.get("/api/v1/status", response_model=SystemStatus, tags=["System"])
-def system_status():
+async def system_status():
     """Detailed system status including model availability and cache stats."""
     return SystemStatus(
         status="operational",
@@ -33,6 +57,32 @@ def system_status():
         models_loaded=ml_service.get_models_status(),
         faiss_index_size=vector_service.get_index_size(),
         cities_count=len(geocoding_service.get_all_cities()),
-        cache_stats={"weather": "in-memory", "aq": "in-memory", "geocoding": "in-memory"},
+        cache_stats={
+            "weather": weather_service.get_cache_stats(),
+            "aq": air_quality_service.get_cache_stats(),
+            "geocoding": geocoding_service.get_cache_stats(),
+            "reports": orchestrator.get_report_cache_stats(),
+            "query_embeddings": vector_service.get_query_cache_stats(),
+        },
+        jobs=job_service.get_queue_stats(),
+        upstreams=upstream.get_stats(),
+        event_loop=loop_monitor.get_stats(),
+        startup=warmup.get_stats(),
         uptime_seconds=round(time.time() - _start_time, 1),
     )
+
+
+@router.get("/metrics", response_class=PlainTextResponse, tags=["System"])
+async def metrics_exposition():
+    """Prometheus text exposition: route, upstream, model and FAISS latency histograms, cache counters."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/api/v1/diagnostics/memory", response_model=MemoryReport, tags=["System"])
+async def memory_diagnostics():
+    """
+    Where RAM goes: RSS now and at peak, its sampled history, and the approximate size of
+    each cache, the loaded models, the city catalog, the FAISS index and docs, and the embedder.
+    Walks every cache, so it is meant for sizing and debugging rather than frequent polling.
+    """
+    return memory.get_report()
@@ -0,0 +1,54 @@
+"""On-demand profiling endpoints (available only while PROFILING_TOKEN is set)."""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.models.schemas import ProfileReport, ProfileSummary
+from app.services import profiler
+
+
+def require_profiling_token(x_profile: str | None = Header(None)):
+    """Hide the endpoints unless profiling is enabled; require the token in X-Profile."""
+    if not profiler.settings.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Missing or wrong X-Profile token")
+
+
+router = APIRouter(prefix="/api/v1/profiles", tags=["System"], dependencies=[Depends(require_profiling_token)])
+
+
+@router.get("", response_model=list[ProfileSummary])
+def list_profiles():
+    """Stored profiles, newest first."""
+    return profiler.list_profiles()
+
+
+@router.post("/aggregate", response_model=ProfileSummary, status_code=202)
+def start_aggregation(
+    prefix: str = Query("/api/v1/agents", description="Profile requests whose path starts with this"),
+    requests: int = Query(50, ge=1, le=10000, description="Requests to merge into the profile"),
+):
+    """
+    Profile the next N requests under a path prefix into one profile, for a hot-path flame graph.
+    Poll the returned profile until `complete`, then fetch it with `?format=collapsed`.
+    """
+    return profiler.start_aggregation(prefix, requests).summary()
+
+
+@router.get("/{profile_id}", response_model=ProfileReport)
+def get_profile(
+    profile_id: str,
+    format: str = Query("top", pattern="^(top|collapsed)$", description="top functions, or folded stacks"),
+    limit: int = Query(30, ge=1, le=500),
+):
+    """
+    A profile's hottest functions, or its stacks in the folded format
+    (`?format=collapsed`, for flamegraph.pl or speedscope).
+    """
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    return {**profile.summary(), "top": profile.top(limit)}
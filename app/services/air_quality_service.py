@@ -3,11 +3,10 @@ Air Quality service: fetches current AQ, forecasts, and rankings
 from Open-Meteo Air Quality API. Includes EPA AQI calculation.
 """
 
-import time
+import asyncio
+from collections.abc import Callable
 from datetime import datetime, timezone
 
-import httpx
-
 from app.config import get_settings
 from app.models.schemas import (
     AirQualityCurrent,
@@ -17,23 +16,38 @@ from app.models.schemas import (
     AQRankings,
     CityRanking,
 )
+from app.services import memory, metrics, timing, upstream
+from app.services.response_cache import ResponseCache
 
 settings = get_settings()
 
-_cache: dict[str, tuple[float, object]] = {}
+_cache = ResponseCache()
+
+# Called with (lat, lon) whenever a current-conditions entry is refreshed from upstream
+_refresh_listeners: list[Callable[[float, float], None]] = []
+
+
+def add_refresh_listener(listener: Callable[[float, float], None]):
+    """Register a callback run with (lat, lon) after current conditions for a location are refreshed."""
+    if listener not in _refresh_listeners:
+        _refresh_listeners.append(listener)
+
+
+def _notify_refresh(lat: float, lon: float):
+    for listener in _refresh_listeners:
+        try:
+            listener(lat, lon)
+        except Exception as e:
+            print(f"Warning: refresh listener failed: {e}")
 
 
-def _get_cached(key: str, ttl: int):
-    if key in _cache:
-        ts, val = _cache[key]
-        if time.time() - ts < ttl:
-            return val
-        del _cache[key]
-    return None
+def get_cache_stats() -> dict:
+    """Hit/miss/eviction counters and occupancy of the response cache."""
+    return _cache.stats()
 
 
-def _set_cached(key: str, val: object):
-    _cache[key] = (time.time(), val)
+metrics.register_cache("air_quality", get_cache_stats)
+memory.register("aq_cache", lambda: {"bytes": memory.deep_sizeof(_cache.entries), "entries": len(_cache.entries)})
 
 
 def calculate_aqi_from_pm25(pm25: float) -> int:
@@ -75,10 +89,27 @@ def _dominant_pollutant(pm25: float, pm10: float, no2: float, o3: float) -> str:
     return max(pollutants, key=pollutants.get)
 
 
-async def get_current_air_quality(city: str, lat: float, lon: float) -> AirQualityCurrent:
-    """Fetch current air quality data from Open-Meteo."""
-    cache_key = f"aq_current_{lat:.2f}_{lon:.2f}"
-    cached = _get_cached(cache_key, settings.AQ_CACHE_TTL)
+def _current_cache_key(lat: float, lon: float) -> str:
+    return f"aq_current_{lat:.2f}_{lon:.2f}"
+
+
+def peek_current_air_quality(lat: float, lon: float) -> tuple[float, AirQualityCurrent] | None:
+    """The cached current air quality entry for these coordinates as (fetched_at, value), if still fresh."""
+    return _cache.peek(
+        _current_cache_key(lat, lon), upstream.cache_ttl(settings.OPEN_METEO_AQ_URL, settings.AQ_CACHE_TTL)
+    )
+
+
+def peek_stale_current_air_quality(lat: float, lon: float) -> tuple[float, AirQualityCurrent] | None:
+    """The last fetched current air quality entry as (fetched_at, value), up to STALE_CACHE_MAX_AGE_S old."""
+    return _cache.peek_stale(_current_cache_key(lat, lon))
+
+
+async def get_current_air_quality(city: str, lat: float, lon: float, timeout: float = 15.0) -> AirQualityCurrent:
+    """Fetch current air quality data from Open-Meteo (timeout: seconds left for the upstream call)."""
+    cache_key = _current_cache_key(lat, lon)
+    cached = _cache.get(cache_key, upstream.cache_ttl(settings.OPEN_METEO_AQ_URL, settings.AQ_CACHE_TTL))
+    timing.mark_cache("air_quality", cached is not None)
     if cached:
         return cached
 
@@ -88,10 +119,11 @@ async def get_current_air_quality(city: str, lat: float, lon: float) -> AirQuali
         "current": ["pm10", "pm2_5", "nitrogen_dioxide", "ozone"],
     }
 
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.get(settings.OPEN_METEO_AQ_URL, params=params)
-        resp.raise_for_status()
-        data = resp.json()
+    try:
+        resp = await upstream.get(settings.OPEN_METEO_AQ_URL, params=params, timeout=timeout)
+    except upstream.UpstreamUnavailableError as e:
+        return _cache.stale_or_raise(cache_key, e)
+    data = resp.json()
 
     current = data.get("current", {})
     pm25 = current.get("pm2_5") or 0
@@ -114,14 +146,33 @@ async def get_current_air_quality(city: str, lat: float, lon: float) -> AirQuali
         dominant_pollutant=_dominant_pollutant(pm25, pm10, no2, o3),
         timestamp=datetime.now(timezone.utc),
     )
-    _set_cached(cache_key, result)
+    _cache.set(cache_key, result)
+    _notify_refresh(lat, lon)
     return result
 
 
+def estimate_current_air_quality(city: str, lat: float, lon: float, pm25: float) -> AirQualityCurrent:
+    """Build a current AQ reading from an estimated PM2.5 (other pollutants unknown → 0, as for missing API values)."""
+    aqi = calculate_aqi_from_pm25(pm25)
+    return AirQualityCurrent(
+        city=city,
+        lat=lat,
+        lon=lon,
+        aqi=aqi,
+        category=aqi_to_category(aqi),
+        pm2_5=round(pm25, 1),
+        pm10=0,
+        no2=0,
+        o3=0,
+        dominant_pollutant=_dominant_pollutant(pm25, 0, 0, 0),
+        timestamp=datetime.now(timezone.utc),
+    )
+
+
 async def get_aq_forecast(city: str, lat: float, lon: float, days: int = 5) -> AirQualityForecast:
     """Fetch air quality forecast."""
     cache_key = f"aq_forecast_{lat:.2f}_{lon:.2f}_{days}"
-    cached = _get_cached(cache_key, settings.FORECAST_CACHE_TTL)
+    cached = _cache.get(cache_key, upstream.cache_ttl(settings.OPEN_METEO_AQ_URL, settings.FORECAST_CACHE_TTL))
     if cached:
         return cached
 
@@ -132,10 +183,11 @@ async def get_aq_forecast(city: str, lat: float, lon: float, days: int = 5) -> A
         "forecast_days": min(days, 5),
     }
 
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.get(settings.OPEN_METEO_AQ_URL, params=params)
-        resp.raise_for_status()
-        data = resp.json()
+    try:
+        resp = await upstream.get(settings.OPEN_METEO_AQ_URL, params=params, timeout=15.0)
+    except upstream.UpstreamUnavailableError as e:
+        return _cache.stale_or_raise(cache_key, e)
+    data = resp.json()
 
     hourly = data.get("hourly", {})
     times = hourly.get("time", [])
@@ -180,24 +232,24 @@ async def get_aq_forecast(city: str, lat: float, lon: float, days: int = 5) -> A
         forecast_days=forecast_days,
         generated_at=datetime.now(timezone.utc),
     )
-    _set_cached(cache_key, result)
+    _cache.set(cache_key, result)
     return result
 
 
 async def get_aq_rankings(cities: list[dict], top_n: int = 10) -> AQRankings:
     """Fetch current AQ for multiple cities and rank them."""
     cache_key = f"aq_rankings_{len(cities)}_{top_n}"
-    cached = _get_cached(cache_key, settings.AQ_CACHE_TTL)
+    cached = _cache.get(cache_key, settings.AQ_CACHE_TTL)
     if cached:
         return cached
 
-    results = []
-    for city_data in cities:
-        try:
-            aq = await get_current_air_quality(city_data["name"], city_data["lat"], city_data["lon"])
-            results.append((city_data, aq))
-        except Exception:
-            continue
+    # Bulk fetch in the background lane (never starves interactive requests); the upstream
+    # scheduler's adaptive concurrency limit decides how many of these run at once
+    with upstream.background("aq_rankings"):
+        fetched = await asyncio.gather(
+            *(get_current_air_quality(cd["name"], cd["lat"], cd["lon"]) for cd in cities), return_exceptions=True
+        )
+    results = [(cd, aq) for cd, aq in zip(cities, fetched) if not isinstance(aq, BaseException)]
 
     # Sort by AQI
     results.sort(key=lambda x: x[1].aqi)
@@ -227,5 +279,5 @@ async def get_aq_rankings(cities: list[dict], top_n: int = 10) -> AQRankings:
         most_polluted=most_polluted,
         generated_at=datetime.now(timezone.utc),
     )
-    _set_cached(cache_key, result)
+    _cache.set(cache_key, result)
     return result
@@ -9,16 +9,18 @@ import math
 from difflib import SequenceMatcher
 from pathlib import Path
 
-import httpx
-
 from app.config import get_settings
 from app.models.schemas import CityInfo
+from app.services import air_quality_service, memory, metrics, timing, upstream, vector_service, weather_service
 
 settings = get_settings()
 
 # ── In-memory city database ──────────────────────────────
 _cities_db: list[CityInfo] = []
 _geocode_cache: dict[str, CityInfo] = {}
+_by_location: dict[str, CityInfo] = {}  # "lat_lon" → catalog or API-resolved city, for refresh hooks
+_cache_hits = 0
+_cache_misses = 0
 
 
 def _load_cities_db() -> list[CityInfo]:
@@ -31,9 +33,14 @@ def _load_cities_db() -> list[CityInfo]:
         with open(db_path, "r", encoding="utf-8") as f:
             raw = json.load(f)
         _cities_db = [CityInfo(**city) for city in raw]
+        _by_location.update({_location_key(c.lat, c.lon): c for c in _cities_db})
     return _cities_db
 
 
+def _location_key(lat: float, lon: float) -> str:
+    return f"{lat:.2f}_{lon:.2f}"
+
+
 def _similarity(a: str, b: str) -> float:
     """Fuzzy string similarity ratio."""
     return SequenceMatcher(None, a.lower(), b.lower()).ratio()
@@ -55,11 +62,15 @@ async def geocode_city(city_name: str) -> CityInfo | None:
     2. Fuzzy search local database
     3. Fallback to Open-Meteo Geocoding API
     """
+    global _cache_hits, _cache_misses
     key = city_name.lower().strip()
 
     # Check cache
+    timing.mark_cache("geocode", key in _geocode_cache)
     if key in _geocode_cache:
+        _cache_hits += 1
         return _geocode_cache[key]
+    _cache_misses += 1
 
     # Search local DB (fuzzy)
     cities = _load_cities_db()
@@ -77,32 +88,62 @@ async def geocode_city(city_name: str) -> CityInfo | None:
 
     # Fallback: Open-Meteo Geocoding API
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(
-                settings.OPEN_METEO_GEOCODING_URL,
-                params={"name": city_name, "count": 1, "language": "en", "format": "json"},
+        resp = await upstream.get(
+            settings.OPEN_METEO_GEOCODING_URL,
+            params={"name": city_name, "count": 1, "language": "en", "format": "json"},
+            timeout=10.0,
+        )
+        data = resp.json()
+        if "results" in data and len(data["results"]) > 0:
+            r = data["results"][0]
+            city_info = CityInfo(
+                name=r.get("name", city_name),
+                country=r.get("country", "Unknown"),
+                lat=r["latitude"],
+                lon=r["longitude"],
+                population=r.get("population"),
+                timezone=r.get("timezone"),
+                continent=None,
             )
-            resp.raise_for_status()
-            data = resp.json()
-            if "results" in data and len(data["results"]) > 0:
-                r = data["results"][0]
-                city_info = CityInfo(
-                    name=r.get("name", city_name),
-                    country=r.get("country", "Unknown"),
-                    lat=r["latitude"],
-                    lon=r["longitude"],
-                    population=r.get("population"),
-                    timezone=r.get("timezone"),
-                    continent=None,
-                )
-                _geocode_cache[key] = city_info
-                return city_info
+            _geocode_cache[key] = city_info
+            _by_location[_location_key(city_info.lat, city_info.lon)] = city_info
+            # Make API-resolved cities searchable without blocking this request
+            vector_service.schedule_upsert(city_info.model_dump())
+            return city_info
     except Exception:
         pass
 
     return None
 
 
+def _on_refresh(lat: float, lon: float):
+    """Re-sync a refreshed city's search document with its geocoding record (unchanged documents are a no-op)."""
+    _load_cities_db()
+    city = _by_location.get(_location_key(lat, lon))
+    if city is not None:
+        vector_service.schedule_upsert(city.model_dump())
+
+
+weather_service.add_refresh_listener(_on_refresh)
+air_quality_service.add_refresh_listener(_on_refresh)
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss counters and occupancy of the geocode cache."""
+    total = _cache_hits + _cache_misses
+    return {
+        "entries": len(_geocode_cache),
+        "hits": _cache_hits,
+        "misses": _cache_misses,
+        "hit_rate": round(_cache_hits / total, 4) if total else 0.0,
+    }
+
+
+metrics.register_cache("geocoding", get_cache_stats)
+memory.register("geocode_cache", lambda: {"bytes": memory.deep_sizeof(_geocode_cache), "entries": len(_geocode_cache)})
+memory.register("city_catalog", lambda: {"bytes": memory.deep_sizeof(_cities_db), "entries": len(_cities_db)})
+
+
 def search_cities(query: str, limit: int = 20) -> list[CityInfo]:
     """Fuzzy search cities by name. Returns ranked results."""
     cities = _load_cities_db()
@@ -0,0 +1,156 @@
+"""
+Job service: runs large multi-city analyses in the background.
+Each submitted city becomes an item on a bounded in-process queue served by a
+fixed pool of worker tasks, so batch jobs never hold a request open and never
+run more than JOB_WORKERS pipelines at once. Jobs expose progress and partial
+results while running; finished reports are kept for download.
+"""
+
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from app.agents import orchestrator
+from app.config import get_settings
+from app.models.schemas import AnalysisJob, AnalysisJobResults, JobStatus
+from app.services import memory, upstream
+
+settings = get_settings()
+
+
+class QueueFullError(Exception):
+    """Raised when a job does not fit in the remaining queue capacity."""
+
+
+# ── Job Registry ─────────────────────────────────────────
+_jobs: OrderedDict[str, dict] = OrderedDict()
+
+# Queue and workers belong to the event loop they were started on
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _ensure_workers():
+    """Start the worker pool on the running loop (first submission, or after a restart)."""
+    global _queue, _workers, _loop
+    loop = asyncio.get_running_loop()
+    if _loop is loop and _workers:
+        return
+    _queue = asyncio.Queue(maxsize=settings.JOB_QUEUE_SIZE)
+    _workers = [loop.create_task(_worker()) for _ in range(settings.JOB_WORKERS)]
+    _loop = loop
+    print(f"Job service: started {settings.JOB_WORKERS} workers (queue size {settings.JOB_QUEUE_SIZE})")
+
+
+async def _worker():
+    while True:
+        job_id, index, city = await _queue.get()
+        try:
+            job = _jobs.get(job_id)
+            if job is None:
+                continue  # Evicted before it ran
+            if job["status"] == JobStatus.QUEUED:
+                job["status"] = JobStatus.RUNNING
+                job["started_at"] = datetime.now(timezone.utc)
+            try:
+                with upstream.background("jobs"):
+                    job["reports"][index] = await orchestrator.run_city_analysis(city)
+            except Exception as e:
+                job["errors"][index] = str(e)
+            if len(job["reports"]) + len(job["errors"]) == len(job["cities"]):
+                job["status"] = JobStatus.COMPLETED
+                job["finished_at"] = datetime.now(timezone.utc)
+        finally:
+            _queue.task_done()
+
+
+def _evict_finished():
+    """Drop the oldest finished jobs beyond JOB_HISTORY_SIZE."""
+    finished = [job_id for job_id, job in _jobs.items() if job["status"] == JobStatus.COMPLETED]
+    for job_id in finished[: max(0, len(finished) - settings.JOB_HISTORY_SIZE)]:
+        del _jobs[job_id]
+
+
+async def submit_job(cities: list[str]) -> AnalysisJob:
+    """
+    Queue one analysis per city and return the new job; raises QueueFullError when it
+    doesn't fit and ValueError when there is nothing to analyze.
+    """
+    if not cities:
+        raise ValueError("No cities to analyze")
+    _ensure_workers()
+    free = _queue.maxsize - _queue.qsize()
+    if len(cities) > free:
+        raise QueueFullError(f"Job queue is full ({free} free slots, {len(cities)} cities requested)")
+
+    job_id = uuid.uuid4().hex
+    _jobs[job_id] = {
+        "cities": list(cities),
+        "status": JobStatus.QUEUED,
+        "reports": {},
+        "errors": {},
+        "submitted_at": datetime.now(timezone.utc),
+        "started_at": None,
+        "finished_at": None,
+    }
+    for index, city in enumerate(cities):
+        _queue.put_nowait((job_id, index, city))
+    _evict_finished()
+    return get_job(job_id)
+
+
+def get_job(job_id: str) -> AnalysisJob | None:
+    """Progress of a job, or None if unknown/evicted."""
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    total = len(job["cities"])
+    completed = len(job["reports"])
+    failed = len(job["errors"])
+    return AnalysisJob(
+        job_id=job_id,
+        status=job["status"],
+        total=total,
+        completed=completed,
+        failed=failed,
+        progress=round((completed + failed) / total, 4),
+        submitted_at=job["submitted_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+    )
+
+
+def get_job_results(job_id: str) -> AnalysisJobResults | None:
+    """Stored reports of a job in submission order (partial while the job is running)."""
+    progress = get_job(job_id)
+    if progress is None:
+        return None
+    job = _jobs[job_id]
+    reports = [job["reports"][i] for i in sorted(job["reports"])]
+    errors = {job["cities"][i]: detail for i, detail in sorted(job["errors"].items())}
+    return AnalysisJobResults(**progress.model_dump(), reports=reports, errors=errors)
+
+
+def get_queue_stats() -> dict:
+    """Worker pool and queue occupancy."""
+    return {
+        "workers": len([w for w in _workers if not w.done()]),
+        "queued": _queue.qsize() if _queue else 0,
+        "max_queued": settings.JOB_QUEUE_SIZE,
+        "jobs": len(_jobs),
+    }
+
+
+async def shutdown():
+    """Cancel the worker pool (queued work is dropped)."""
+    global _workers, _loop
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers = []
+    _loop = None
+
+
+memory.register("jobs", lambda: {"bytes": memory.deep_sizeof(_jobs), "entries": len(_jobs)})
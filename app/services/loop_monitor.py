@@ -0,0 +1,96 @@
+"""
+Event-loop monitor: a task sleeps for a fixed interval and records how late it wakes
+up (loop lag) in the /metrics histogram. Lag above LOOP_BLOCK_THRESHOLD_MS counts as
+a stall. In debug mode a watchdog thread also prints the stack of the code holding
+the loop, captured while it is still blocking, so synchronous hot spots (CPU-bound
+analysis, fuzzy matching, file reads) can be found and moved off the loop with evidence.
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from app.config import get_settings
+from app.services import metrics
+
+settings = get_settings()
+
+_task: asyncio.Task | None = None
+_watchdog: threading.Thread | None = None
+_stop_watchdog = threading.Event()
+_loop_thread_id: int | None = None
+_heartbeat = 0.0  # perf_counter when the sampler last ran on the loop
+_stats = {"samples": 0, "stalls": 0, "stacks_logged": 0, "last_lag_ms": 0.0, "max_lag_ms": 0.0}
+
+
+async def _sample(interval_s: float, threshold_s: float):
+    global _heartbeat
+    while True:
+        _heartbeat = time.perf_counter()
+        await asyncio.sleep(interval_s)
+        lag = max(0.0, time.perf_counter() - _heartbeat - interval_s)
+        metrics.EVENT_LOOP_LAG.observe(lag)
+        _stats["samples"] += 1
+        _stats["last_lag_ms"] = round(lag * 1000, 2)
+        _stats["max_lag_ms"] = max(_stats["max_lag_ms"], _stats["last_lag_ms"])
+        if lag >= threshold_s:
+            _stats["stalls"] += 1
+            metrics.EVENT_LOOP_STALLS.inc()
+
+
+def _watch(interval_s: float, threshold_s: float):
+    """Runs in a thread: when the sampler is overdue by the threshold, print the loop thread's stack once."""
+    logged_heartbeat = None
+    while not _stop_watchdog.wait(threshold_s / 2):
+        heartbeat = _heartbeat
+        blocked_s = time.perf_counter() - heartbeat - interval_s
+        if blocked_s < threshold_s or heartbeat == logged_heartbeat:
+            continue
+        frame = sys._current_frames().get(_loop_thread_id)
+        if frame is None:
+            continue
+        logged_heartbeat = heartbeat
+        _stats["stacks_logged"] += 1
+        stack = "".join(traceback.format_stack(frame))
+        print(f"⚠️ Event loop blocked for {blocked_s * 1000:.0f}+ ms; the loop thread is at:\n{stack}", flush=True)
+
+
+def start():
+    """Start sampling on the running loop (and the stack watchdog when DEBUG is set)."""
+    global _task, _watchdog, _loop_thread_id, _heartbeat
+    interval_ms, threshold_ms = settings.LOOP_MONITOR_INTERVAL_MS, settings.LOOP_BLOCK_THRESHOLD_MS
+    if interval_ms <= 0 or _task is not None:
+        return
+    _loop_thread_id = threading.get_ident()
+    _heartbeat = time.perf_counter()
+    _task = asyncio.create_task(_sample(interval_ms / 1000, threshold_ms / 1000))
+    if settings.DEBUG:
+        _stop_watchdog.clear()
+        _watchdog = threading.Thread(
+            target=_watch, args=(interval_ms / 1000, threshold_ms / 1000), name="loop-watchdog", daemon=True
+        )
+        _watchdog.start()
+    print(f"Loop monitor: sampling every {interval_ms} ms, stall threshold {threshold_ms} ms")
+
+
+async def stop():
+    """Stop the sampler and the watchdog."""
+    global _task, _watchdog
+    if _watchdog is not None:
+        _stop_watchdog.set()
+        _watchdog.join()
+        _watchdog = None
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def get_stats() -> dict:
+    """Loop lag (last and max since start, ms) and stall counts, for /status."""
+    return {**_stats, "running": _task is not None, "threshold_ms": settings.LOOP_BLOCK_THRESHOLD_MS}
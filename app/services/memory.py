@@ -0,0 +1,133 @@
+"""
+Memory accounting. Caches, models and indexes register a function reporting their
+approximate size (deep object size, array bytes or an estimate for native structures),
+read on demand at /api/v1/diagnostics/memory, like cache stats in the metrics service.
+A background task samples the process RSS so the peak and its history are visible
+next to the per-component breakdown and in /metrics.
+"""
+
+import asyncio
+import enum
+import resource
+import sys
+import time
+import types
+from collections import deque
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+from app.config import get_settings
+from app.services import metrics
+
+settings = get_settings()
+
+# component → function returning {"bytes": int, "entries": int | None, ...}
+_components: dict[str, Callable[[], dict]] = {}
+_history: deque = deque(maxlen=settings.MEMORY_HISTORY_SIZE)  # (unix time, rss bytes)
+_task: asyncio.Task | None = None
+
+# Shared or immutable singletons that belong to no component
+_SKIP_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, enum.Enum)
+
+
+def register(component: str, stats: Callable[[], dict]):
+    """Expose a component's size, computed from its stats function when the report is requested."""
+    _components[component] = stats
+
+
+def deep_sizeof(obj) -> int:
+    """
+    Approximate bytes held by obj and everything it references (containers, instance
+    attributes, pydantic fields, numpy buffers), counting shared objects once.
+    """
+    seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or item is None or isinstance(item, _SKIP_TYPES):
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)  # Includes the data buffer of arrays that own it
+        if isinstance(item, (str, bytes, int, float, bool)) or hasattr(item, "__array_interface__"):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        else:
+            if hasattr(item, "__dict__"):
+                stack.append(item.__dict__)
+            for slot in getattr(type(item), "__slots__", ()):
+                stack.append(getattr(item, slot, None))
+    return total
+
+
+def rss_bytes() -> tuple[int, int]:
+    """Current and peak resident set size of the process (VmRSS/VmHWM, or getrusage off Linux)."""
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) * 1024, int(fields["VmHWM"].split()[0]) * 1024
+    except (OSError, KeyError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak *= 1 if sys.platform == "darwin" else 1024  # Bytes on macOS, KiB on Linux
+        return peak, peak
+
+
+def sample() -> int:
+    """Record the current RSS in the history and the /metrics gauges."""
+    current, peak = rss_bytes()
+    _history.append((time.time(), current))
+    metrics.PROCESS_RSS.set(current)
+    metrics.PROCESS_RSS_PEAK.set(peak)
+    return current
+
+
+async def _sample_periodically(interval_s: float):
+    while True:
+        sample()
+        await asyncio.sleep(interval_s)
+
+
+def start():
+    """Start sampling RSS every MEMORY_SAMPLE_INTERVAL_S (0 = only when the report is requested)."""
+    global _task
+    if settings.MEMORY_SAMPLE_INTERVAL_S > 0 and _task is None:
+        _task = asyncio.create_task(_sample_periodically(settings.MEMORY_SAMPLE_INTERVAL_S))
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def get_report() -> dict:
+    """RSS now and at peak, its sampled history and the approximate size of every registered component."""
+    sample()
+    current, peak = rss_bytes()
+    components = {}
+    for name, stats in sorted(_components.items()):
+        try:
+            components[name] = stats()
+        except Exception as e:
+            components[name] = {"bytes": 0, "entries": None, "error": str(e)}
+    accounted = sum(c.get("bytes", 0) for c in components.values())
+    return {
+        "rss_bytes": current,
+        "peak_rss_bytes": peak,
+        "accounted_bytes": accounted,
+        "unaccounted_bytes": max(0, current - accounted),  # Interpreter, libraries, allocator slack
+        "components": components,
+        "rss_history": [
+            {"at": datetime.fromtimestamp(at, timezone.utc).isoformat(timespec="seconds"), "rss_bytes": rss}
+            for at, rss in _history
+        ],
+    }
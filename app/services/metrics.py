@@ -0,0 +1,166 @@
+"""
+Metrics service: in-process counters, gauges and latency histograms rendered in
+the Prometheus text exposition format at /metrics.
+Recording is a dict lookup, a bisect and two additions, so it stays on in production.
+Cache counters are not duplicated here: each cache registers its stats function
+and is read at scrape time.
+"""
+
+import bisect
+import time
+from collections.abc import Callable
+from contextlib import contextmanager
+
+# Latency buckets (seconds) shared by every histogram
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Scalar:
+    """One number per label combination."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+
+class Counter(_Scalar):
+    """Monotonic counter per label combination."""
+
+    kind = "counter"
+
+
+class Gauge(_Scalar):
+    """Value that can go up and down (e.g. requests in flight)."""
+
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket (last slot = +Inf)..., sum]
+        self._series: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the wall time of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "API request latency by route template", ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "API requests being served")
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Open-Meteo request latency by host", ("host", "outcome")
+)
+UPSTREAM_IN_FLIGHT = Gauge("upstream_requests_in_flight", "Open-Meteo requests awaiting a response", ("host",))
+MODEL_LATENCY = Histogram("model_predict_duration_seconds", "Model predict call latency (one batch)", ("model",))
+VECTOR_SEARCH_LATENCY = Histogram("faiss_search_duration_seconds", "FAISS index search latency (one batch)")
+EVENT_LOOP_LAG = Histogram("event_loop_lag_seconds", "Delay of a periodic sleep waking up on the event loop")
+EVENT_LOOP_STALLS = Counter("event_loop_stalls_total", "Loop lag samples above the stall threshold")
+PROCESS_RSS = Gauge("process_resident_memory_bytes", "Resident set size at the last memory sample")
+PROCESS_RSS_PEAK = Gauge("process_resident_memory_peak_bytes", "Peak resident set size since the process started")
+
+_METRICS = [
+    REQUEST_LATENCY,
+    REQUESTS_IN_FLIGHT,
+    UPSTREAM_LATENCY,
+    UPSTREAM_IN_FLIGHT,
+    MODEL_LATENCY,
+    VECTOR_SEARCH_LATENCY,
+    EVENT_LOOP_LAG,
+    EVENT_LOOP_STALLS,
+    PROCESS_RSS,
+    PROCESS_RSS_PEAK,
+]
+
+# namespace -> stats function returning hits/misses/entries (and evictions where the cache evicts)
+_caches: dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(namespace: str, stats: Callable[[], dict]):
+    """Expose a cache's hit/miss/eviction counters and size, read from its stats function at scrape time."""
+    _caches[namespace] = stats
+
+
+def _cache_samples() -> list[str]:
+    families = {
+        "cache_hits_total": ("counter", "Cache lookups served from the cache", "hits"),
+        "cache_misses_total": ("counter", "Cache lookups that missed", "misses"),
+        "cache_evictions_total": ("counter", "Entries dropped from the cache", "evictions"),
+        "cache_entries": ("gauge", "Entries currently held", "entries"),
+    }
+    stats = {namespace: fn() for namespace, fn in _caches.items()}
+    lines = []
+    for name, (kind, help_text, field) in families.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{namespace="{ns}"}} {s.get(field, 0)}' for ns, s in stats.items()]
+    return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _METRICS:
+        lines += [f"# HELP {metric.name} {metric.help_text}", f"# TYPE {metric.name} {metric.kind}"]
+        lines += metric.samples()
+    lines += _cache_samples()
+    return "\n".join(lines) + "\n"
@@ -1,11 +1,15 @@
 """
 ML service: loads pre-trained models and runs inference.
-Models are loaded once at startup and kept in memory.
+Models are loaded once, in a warm-up thread at startup, and kept in memory;
+until then predictions use the rule-based fallbacks.
 """
 
+import hashlib
+import json
+import pickle
+import weakref
 from pathlib import Path
 
-import joblib
 import numpy as np
 
 from app.config import get_settings
@@ -15,6 +19,7 @@ from app.models.schemas import (
     PollutionPrediction,
     RiskLevel,
 )
+from app.services import memory, metrics
 
 settings = get_settings()
 
@@ -22,10 +27,22 @@ settings = get_settings()
 _models: dict[str, object] = {}
 _models_loaded = False
 
+# Model input column order (matches app.ml.preprocessing)
+FEATURE_COLUMNS = ("temperature", "humidity", "rain", "pressure", "wind_speed", "month", "hour")
+CLUSTER_FEATURE_COLUMNS = ("temperature", "humidity", "rain", "pm2_5")
+
+# Serving input dtype per model, as selected by the trainer's benchmark report
+_input_dtypes: dict[str, str] = {}
+# Model name → (weak reference to the loaded object, its pickled size); recomputed when the model is reloaded
+_model_bytes: dict[str, tuple[weakref.ref, int]] = {}
+_BENCHMARK_TASKS = {"classification": "risk_classifier", "regression": "pollution_regressor"}
+
 
 def load_all_models():
     """Load all pre-trained models into memory. Called at startup."""
     global _models, _models_loaded
+    import joblib  # Deferred with sklearn (pulled in by unpickling) to keep app import fast
+
     models_dir = Path(settings.MODELS_DIR)
 
     model_files = {
@@ -39,20 +56,59 @@ def load_all_models():
         "pca": "pca_model.joblib",
     }
 
+    # Published in one update, so a request racing the warm-up never sees a model without its scaler
+    loaded = {}
     for key, filename in model_files.items():
         path = models_dir / filename
         if path.exists():
             try:
-                _models[key] = joblib.load(path)
+                loaded[key] = joblib.load(path)
             except Exception as e:
                 print(f"Warning: Failed to load {filename}: {e}")
         else:
             print(f"Info: Model file not found: {path}")
 
+    _load_benchmark_selection(models_dir / "model_benchmark.json", models_dir, model_files)
+    _models.update(loaded)
+
     _models_loaded = True
     print(f"ML Service: Loaded {len(_models)}/{len(model_files)} models")
 
 
+def _load_benchmark_selection(path: Path, models_dir: Path, model_files: dict[str, str]):
+    """
+    Pick up the input dtype the trainer benchmarked as fastest for each model, as long
+    as the model file is still the one the report was written for (a later retrain
+    without --benchmark, or a streaming one, leaves an outdated report behind).
+    """
+    _input_dtypes.clear()
+    if not path.exists():
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        for task, key in _BENCHMARK_TASKS.items():
+            selected = report.get(task, {}).get("selected")
+            if not selected:
+                continue
+            model_path = models_dir / model_files[key]
+            if not model_path.exists() or report[task].get("model_sha256") != _file_sha256(model_path):
+                print(f"Info: Ignoring benchmark selection for {key}: {model_path.name} was retrained since")
+                continue
+            _input_dtypes[key] = selected.get("input_dtype", "float64")
+    except Exception as e:
+        print(f"Warning: Failed to read benchmark report: {e}")
+
+
+def _file_sha256(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def is_loaded() -> bool:
+    """Whether load_all_models has run (until then predictions come from the fallbacks)."""
+    return _models_loaded
+
+
 def get_models_status() -> dict[str, bool]:
     """Return which models are available."""
     return {
@@ -62,6 +118,23 @@ def get_models_status() -> dict[str, bool]:
     }
 
 
+def get_memory_stats() -> dict:
+    """Approximate size of each loaded model: its pickled size (fitted estimators are mostly arrays)."""
+    sizes = {}
+    for key, model in list(_models.items()):
+        cached = _model_bytes.get(key)
+        if cached is None or cached[0]() is not model:
+            cached = (weakref.ref(model), len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)))
+            _model_bytes[key] = cached
+        sizes[key] = cached[1]
+    for key in _model_bytes.keys() - sizes.keys():
+        del _model_bytes[key]
+    return {"bytes": sum(sizes.values()), "entries": len(sizes), "models": sizes}
+
+
+memory.register("models", get_memory_stats)
+
+
 def _pm25_to_risk(pm25: float) -> RiskLevel:
     if pm25 <= 12:
         return RiskLevel.LOW
@@ -117,32 +190,42 @@ def predict_aqi_risk(
         "month": month,
         "hour": hour,
     }
+    return predict_aqi_risk_batch([features])[0]
+
 
+def predict_aqi_risk_batch(rows: list[dict]) -> list[AQIRiskPrediction]:
+    """Classify many feature rows (keyed by FEATURE_COLUMNS) with a single scaler/model call."""
     if "risk_classifier" not in _models:
         # Fallback: rule-based estimation
-        return AQIRiskPrediction(
-            aqi_category="Moderate",
-            confidence=0.5,
-            risk_level=RiskLevel.MODERATE,
-            features_used=features,
-        )
+        return [
+            AQIRiskPrediction(
+                aqi_category="Moderate",
+                confidence=0.5,
+                risk_level=RiskLevel.MODERATE,
+                features_used=features,
+            )
+            for features in rows
+        ]
 
     scaler = _models["risk_scaler"]
     model = _models["risk_classifier"]
     encoder = _models["risk_encoder"]
 
-    X = np.array([[temperature, humidity, rain, pressure, wind_speed, month, hour]])
-    X_scaled = scaler.transform(X)
-    pred_encoded = model.predict(X_scaled)[0]
-    pred_label = encoder.inverse_transform([pred_encoded])[0]
-    confidence = float(np.max(model.predict_proba(X_scaled)))
-
-    return AQIRiskPrediction(
-        aqi_category=pred_label,
-        confidence=round(confidence, 3),
-        risk_level=_category_to_risk(pred_label),
-        features_used=features,
-    )
+    X = np.array([[features[c] for c in FEATURE_COLUMNS] for features in rows])
+    X_scaled = scaler.transform(X).astype(_input_dtypes.get("risk_classifier", "float64"), copy=False)
+    with metrics.MODEL_LATENCY.time("risk_classifier"):
+        labels = encoder.inverse_transform(model.predict(X_scaled))
+        confidences = model.predict_proba(X_scaled).max(axis=1)
+
+    return [
+        AQIRiskPrediction(
+            aqi_category=label,
+            confidence=round(float(confidence), 3),
+            risk_level=_category_to_risk(label),
+            features_used=features,
+        )
+        for label, confidence, features in zip(labels, confidences, rows)
+    ]
 
 
 def predict_pollution(
@@ -158,60 +241,77 @@ def predict_pollution(
         "month": month,
         "hour": hour,
     }
+    return predict_pollution_batch([features])[0]
 
+
+def predict_pollution_batch(rows: list[dict]) -> list[PollutionPrediction]:
+    """Predict PM2.5 for many feature rows (keyed by FEATURE_COLUMNS) with a single scaler/model call."""
     if "pollution_regressor" not in _models:
         # Fallback: simple estimation
-        estimated = max(5, 30 - wind_speed * 0.5 + humidity * 0.1)
-        return PollutionPrediction(
-            predicted_pm25=round(estimated, 1),
-            risk_level=_pm25_to_risk(estimated),
-            features_used=features,
-        )
+        preds = [max(5, 30 - features["wind_speed"] * 0.5 + features["humidity"] * 0.1) for features in rows]
+        return [
+            PollutionPrediction(
+                predicted_pm25=round(estimated, 1),
+                risk_level=_pm25_to_risk(estimated),
+                features_used=features,
+            )
+            for estimated, features in zip(preds, rows)
+        ]
 
     scaler = _models["pollution_scaler"]
     model = _models["pollution_regressor"]
 
-    X = np.array([[temperature, humidity, rain, pressure, wind_speed, month, hour]])
-    X_scaled = scaler.transform(X)
-    pred = float(model.predict(X_scaled)[0])
+    X = np.array([[features[c] for c in FEATURE_COLUMNS] for features in rows])
+    X_scaled = scaler.transform(X).astype(_input_dtypes.get("pollution_regressor", "float64"), copy=False)
+    with metrics.MODEL_LATENCY.time("pollution_regressor"):
+        preds = model.predict(X_scaled)
 
-    return PollutionPrediction(
-        predicted_pm25=round(max(0, pred), 1),
-        risk_level=_pm25_to_risk(pred),
-        features_used=features,
+    return [
+        PollutionPrediction(
+            predicted_pm25=round(max(0, float(pred)), 1),
+            risk_level=_pm25_to_risk(float(pred)),
+            features_used=features,
+        )
+        for pred, features in zip(preds, rows)
+    ]
+
+
+def _cluster_result(cluster_id: int) -> ClusterResult:
+    info = CLUSTER_INFO.get(cluster_id, CLUSTER_INFO[0])
+    return ClusterResult(
+        cluster_id=cluster_id,
+        cluster_name=info["name"],
+        cluster_description=info["description"],
+        similar_cities=info["similar"],
     )
 
 
 def predict_cluster(temperature: float, humidity: float, rain: float, pm2_5: float) -> ClusterResult:
     """Assign a city to an environmental cluster."""
+    features = {"temperature": temperature, "humidity": humidity, "rain": rain, "pm2_5": pm2_5}
+    return predict_cluster_batch([features])[0]
+
+
+def predict_cluster_batch(rows: list[dict]) -> list[ClusterResult]:
+    """Assign many feature rows (keyed by CLUSTER_FEATURE_COLUMNS) to clusters with a single model call."""
     if "kmeans" not in _models:
         # Fallback: rule-based
-        if pm2_5 > 50:
-            cluster_id = 1
-        elif temperature > 30 or temperature < -5:
-            cluster_id = 2
-        else:
-            cluster_id = 0
-
-        info = CLUSTER_INFO[cluster_id]
-        return ClusterResult(
-            cluster_id=cluster_id,
-            cluster_name=info["name"],
-            cluster_description=info["description"],
-            similar_cities=info["similar"],
-        )
+        results = []
+        for features in rows:
+            if features["pm2_5"] > 50:
+                cluster_id = 1
+            elif features["temperature"] > 30 or features["temperature"] < -5:
+                cluster_id = 2
+            else:
+                cluster_id = 0
+            results.append(_cluster_result(cluster_id))
+        return results
 
     scaler = _models["cluster_scaler"]
     model = _models["kmeans"]
 
-    X = np.array([[temperature, humidity, rain, pm2_5]])
+    X = np.array([[features[c] for c in CLUSTER_FEATURE_COLUMNS] for features in rows])
     X_scaled = scaler.transform(X)
-    cluster_id = int(model.predict(X_scaled)[0])
-
-    info = CLUSTER_INFO.get(cluster_id, CLUSTER_INFO[0])
-    return ClusterResult(
-        cluster_id=cluster_id,
-        cluster_name=info["name"],
-        cluster_description=info["description"],
-        similar_cities=info["similar"],
-    )
+    with metrics.MODEL_LATENCY.time("kmeans"):
+        cluster_ids = model.predict(X_scaled)
+    return [_cluster_result(int(cluster_id)) for cluster_id in cluster_ids]
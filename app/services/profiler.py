@@ -0,0 +1,207 @@
+"""
+On-demand request profiler (opt-in via PROFILING_TOKEN). While a profiled request is
+being handled, a thread samples the Python stacks of the event-loop thread and of
+busy worker threads every PROFILING_INTERVAL_MS. The samples are stored as a
+profile with an id and served as collapsed stacks (for flamegraph.pl / speedscope)
+or as a top-functions table.
+An aggregation session merges the profiles of the next N requests under a path
+prefix (e.g. /api/v1/agents) into one profile, for hot-path flame graphs.
+
+Sampling is wall-clock and process-wide: time the loop spends waiting on upstream
+I/O shows up as an idle frame, and work for concurrent unprofiled requests is
+included, so profile on a quiet instance.
+"""
+
+import hmac
+import sys
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app.config import get_settings
+
+settings = get_settings()
+
+IDLE_FRAME = "(idle: awaiting I/O)"
+_CWD = str(Path.cwd()) + "/"
+# Worker threads parked in these modules are idle, not working for the request
+_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    if "site-packages/" in path:
+        path = path.split("site-packages/", 1)[1]
+    elif path.startswith(_CWD):
+        path = path[len(_CWD) :]
+    else:
+        path = Path(path).name
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> list[str]:
+    """Outermost-first frame labels."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class SamplingProfiler:
+    """Samples the loop thread and busy worker threads from a background thread until stopped."""
+
+    def __init__(self, loop_thread_id: int, interval_s: float):
+        self.loop_thread_id = loop_thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _sample(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            leaf = frame.f_code.co_filename
+            idle = leaf.endswith(_IDLE_MODULES)
+            if thread_id == self.loop_thread_id:
+                stack = ["event-loop", IDLE_FRAME] if idle else ["event-loop", *_stack(frame)]
+            elif idle or names.get(thread_id, "").startswith(("request-profiler", "loop-watchdog")):
+                continue
+            else:
+                stack = [names.get(thread_id, "thread"), *_stack(frame)]
+            self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self._sample()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class Profile:
+    """Sampled stacks of one request, or merged over an aggregation session."""
+
+    def __init__(self, label: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.created_at = datetime.now(timezone.utc)
+        self.requests = 0
+        self.duration_ms = 0.0
+        self.samples = 0
+        self.stacks: Counter[str] = Counter()
+        self.complete = False
+
+    def add(self, profiler: SamplingProfiler, duration_ms: float):
+        self.requests += 1
+        self.duration_ms += duration_ms
+        self.samples += profiler.samples
+        self.stacks.update(profiler.stacks)
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: one `frame;frame;... count` line per distinct stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 30) -> list[dict]:
+        """Functions by exclusive (self) then inclusive (total) share of the sampled stacks."""
+        weight = sum(self.stacks.values()) or 1
+        total: Counter[str] = Counter()
+        own: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]  # Drop the thread root
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        return [
+            {
+                "function": frame,
+                "total_pct": round(100 * n / weight, 1),
+                "self_pct": round(100 * own[frame] / weight, 1),
+            }
+            for frame, n in sorted(total.items(), key=lambda item: (own[item[0]], item[1]), reverse=True)[:limit]
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "profile_id": self.id,
+            "label": self.label,
+            "created_at": self.created_at.isoformat(timespec="seconds"),
+            "complete": self.complete,
+            "requests": self.requests,
+            "duration_ms": round(self.duration_ms, 1),
+            "samples": self.samples,
+            "interval_ms": settings.PROFILING_INTERVAL_MS,
+        }
+
+
+_profiles: OrderedDict[str, Profile] = OrderedDict()
+_session: dict | None = None  # {"prefix", "remaining", "profile"} while aggregating
+
+
+def _store(profile: Profile):
+    _profiles[profile.id] = profile
+    while len(_profiles) > settings.PROFILING_HISTORY_SIZE:
+        _profiles.popitem(last=False)
+
+
+def start_aggregation(prefix: str, requests: int) -> Profile:
+    """Merge the profiles of the next `requests` requests whose path starts with `prefix` (replaces any session)."""
+    global _session
+    profile = Profile(f"aggregate {prefix}* over {requests} requests")
+    _store(profile)
+    _session = {"prefix": prefix, "remaining": requests, "profile": profile}
+    return profile
+
+
+def aggregating(path: str) -> bool:
+    """Whether a request to `path` should be profiled for the running aggregation session."""
+    return _session is not None and _session["remaining"] > 0 and path.startswith(_session["prefix"])
+
+
+def authorized(token: str | None) -> bool:
+    """Whether `token` matches PROFILING_TOKEN (profiling is off while the setting is empty)."""
+    return bool(settings.PROFILING_TOKEN) and token is not None and hmac.compare_digest(token, settings.PROFILING_TOKEN)
+
+
+def begin(loop_thread_id: int) -> SamplingProfiler:
+    profiler = SamplingProfiler(loop_thread_id, settings.PROFILING_INTERVAL_MS / 1000)
+    profiler.start()
+    return profiler
+
+
+def finish(profiler: SamplingProfiler, path: str, duration_ms: float, profile: Profile | None):
+    """Stop sampling and file the samples: into the request's own profile, if any, and the aggregation session."""
+    global _session
+    profiler.stop()
+    if profile is not None:
+        profile.add(profiler, duration_ms)
+        profile.complete = True
+        _store(profile)
+    if aggregating(path):
+        session_profile = _session["profile"]
+        session_profile.add(profiler, duration_ms)
+        _session["remaining"] -= 1
+        if _session["remaining"] == 0:
+            session_profile.complete = True
+            _session = None
+
+
+def get_profile(profile_id: str) -> Profile | None:
+    return _profiles.get(profile_id)
+
+
+def list_profiles() -> list[dict]:
+    return [profile.summary() for profile in reversed(_profiles.values())]
@@ -0,0 +1,75 @@
+"""
+Response cache shared by the weather and air-quality services: upstream responses
+keyed by request, fresh for a per-lookup TTL. Expired entries are not dropped —
+they stay (until refreshed or evicted) as the stale fallback served while an
+upstream is unavailable. Size is bounded by RESPONSE_CACHE_MAX_ENTRIES with
+least-recently-used eviction; the dict's order is least → most recently used.
+"""
+
+import time
+
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class ResponseCache:
+    """TTL cache with LRU eviction and a stale fallback (see module docstring)."""
+
+    def __init__(self):
+        self.entries: dict[str, tuple[float, object]] = {}  # key → (stored_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, ttl: float) -> object | None:
+        """The value if stored less than `ttl` seconds ago, else None (an expired entry is kept as a fallback)."""
+        entry = self.entries.get(key)
+        if entry and time.time() - entry[0] < ttl:
+            self.entries[key] = self.entries.pop(key)  # Most recently used
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, key: str, value: object):
+        self.entries.pop(key, None)
+        self.entries[key] = (time.time(), value)
+        while len(self.entries) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+            del self.entries[next(iter(self.entries))]
+            self.evictions += 1
+
+    def peek(self, key: str, ttl: float) -> tuple[float, object] | None:
+        """The fresh (stored_at, value) entry, without counting a lookup or touching the LRU order."""
+        entry = self.entries.get(key)
+        if entry and time.time() - entry[0] < ttl:
+            return entry
+        return None
+
+    def peek_stale(self, key: str) -> tuple[float, object] | None:
+        """The last stored (stored_at, value) entry, up to STALE_CACHE_MAX_AGE_S old."""
+        entry = self.entries.get(key)
+        if entry and time.time() - entry[0] < settings.STALE_CACHE_MAX_AGE_S:
+            return entry
+        return None
+
+    def stale_or_raise(self, key: str, error: Exception) -> object:
+        """Serve the last value, up to STALE_CACHE_MAX_AGE_S old, while the upstream is down (circuit open or quota spent)."""
+        entry = self.peek_stale(key)
+        if entry is None:
+            raise error
+        return entry[1]
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss/eviction counters and occupancy."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
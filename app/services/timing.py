@@ -0,0 +1,89 @@
+"""
+Per-request stage timing. An endpoint opens a `recording()`; spans opened anywhere
+below it (agents, services, tasks they spawn) add their duration to it through a
+ContextVar, and services flag whether they were served from cache. Without an
+active recording, spans cost a single ContextVar lookup.
+"""
+
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class Timings:
+    """Stage durations (ms, summed over repeats) and cache-hit flags for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.cache_hits: dict[str, bool] = {}
+
+    def add(self, stage: str, ms: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, one metric per stage plus the total."""
+        parts = []
+        for stage, ms in self.stages.items():
+            part = f"{stage};dur={ms:.1f}"
+            if stage in self.cache_hits:
+                part += ';desc="cache hit"' if self.cache_hits[stage] else ';desc="cache miss"'
+            parts.append(part)
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+    def summary(self) -> dict:
+        """Stage durations and cache flags in the shape of schemas.PipelineTimings."""
+        return {
+            "stages_ms": {stage: round(ms, 2) for stage, ms in self.stages.items()},
+            "cache_hits": dict(self.cache_hits),
+            "total_ms": round(self.total_ms(), 2),
+        }
+
+
+_current: ContextVar[Timings | None] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def recording() -> Iterator[Timings]:
+    """Collect the spans of the enclosed block (and the tasks it spawns)."""
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as `stage` in the active recording, if any."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(stage, (time.perf_counter() - start) * 1000)
+
+
+async def timed(stage: str, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+    """Call and await fn inside a span (for stages that run concurrently under gather)."""
+    with span(stage):
+        return await fn(*args, **kwargs)
+
+
+def mark_cache(stage: str, hit: bool):
+    """Flag whether `stage` was served from cache in the active recording, if any."""
+    timings = _current.get()
+    if timings is not None:
+        timings.cache_hits[stage] = hit
@@ -0,0 +1,397 @@
+"""
+Upstream scheduler: every outbound Open-Meteo call goes through `get`.
+Per upstream host it applies
+- a token-bucket rate limit with two priority lanes: interactive requests always
+  go first, and background traffic (jobs, rankings, training) cannot spend the
+  tokens reserved for interactive use;
+- retries with jittered exponential backoff for 429, 5xx and transport errors,
+  honouring Retry-After;
+- an adaptive (AIMD) cap on in-flight requests: it grows by one per window of
+  healthy responses and is cut multiplicatively on 429/5xx, timeouts or latency
+  well above the no-load baseline, so fan-out settles at what the API sustains;
+- a circuit breaker that opens after repeated failures and fails fast with
+  CircuitOpenError, so callers can serve cached data instead of waiting on timeouts;
+- daily quota accounting per caller. Near the budget, background calls pause and
+  `cache_ttl` stretches service TTLs; once it is spent every call fails fast with
+  QuotaExhaustedError and the services serve stale data.
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import get_settings
+from app.services import metrics
+
+settings = get_settings()
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+_lane: ContextVar[str] = ContextVar("upstream_lane", default=INTERACTIVE)
+_caller: ContextVar[str] = ContextVar("upstream_caller", default="other")
+
+# Injected in tests to point every service at a local mock upstream
+_transport: httpx.AsyncBaseTransport | None = None
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised without calling the upstream; callers should fall back to cached data."""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """The upstream's circuit breaker is open."""
+
+
+class QuotaExhaustedError(UpstreamUnavailableError):
+    """The upstream's daily budget is spent (or, for background calls, nearly spent)."""
+
+
+@contextmanager
+def background(caller: str):
+    """Run the enclosed upstream calls (and tasks spawned inside) in the background lane, counted for caller."""
+    lane_token = _lane.set(BACKGROUND)
+    caller_token = _caller.set(caller)
+    try:
+        yield
+    finally:
+        _caller.reset(caller_token)
+        _lane.reset(lane_token)
+
+
+def set_caller(caller: str):
+    """Attribute the current context's upstream calls (e.g. the API route being served) to caller."""
+    _caller.set(caller)
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` per second up to `burst`, with an interactive reserve."""
+
+    def __init__(self, rate: float, burst: int, reserve: float):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve  # Tokens background requests must leave in the bucket
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self.waiting = {INTERACTIVE: 0, BACKGROUND: 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, lane: str):
+        self.waiting[lane] += 1
+        try:
+            while True:
+                self._refill()
+                needed = 1.0 if lane == INTERACTIVE else 1.0 + self.reserve
+                if self.tokens >= needed and (lane == INTERACTIVE or not self.waiting[INTERACTIVE]):
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(needed - self.tokens, 1.0) / self.rate)
+        finally:
+            self.waiting[lane] -= 1
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on concurrent requests. Each healthy response adds 1/limit (about +1 per
+    round trip at full concurrency); an overload signal multiplies the limit by `backoff`,
+    at most once per baseline round trip so one burst of failures counts once.
+    Waiting interactive requests are admitted before background ones.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, backoff: float, tolerance: float):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.baseline_ms: float | None = None  # Running estimate of no-load latency
+        self._last_decrease = 0.0
+        self._waiters: dict[str, deque[asyncio.Future]] = {INTERACTIVE: deque(), BACKGROUND: deque()}
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    async def acquire(self, lane: str):
+        if self._has_capacity() and not any(self._waiters.values()):
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        try:
+            await waiter  # The releasing request hands its slot over (in_flight already counted)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            elif waiter in self._waiters[lane]:
+                self._waiters[lane].remove(waiter)
+            raise
+
+    def release(self, latency_ms: float | None = None, overloaded: bool = False):
+        """Free a slot and adapt the limit; no latency and no overload (e.g. cancelled) leaves it unchanged."""
+        self.in_flight -= 1
+        if overloaded or (latency_ms is not None and self._is_slow(latency_ms)):
+            self._decrease()
+        elif latency_ms is not None:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        if latency_ms is not None:
+            self._observe(latency_ms)
+        self._wake()
+
+    def _is_slow(self, latency_ms: float) -> bool:
+        return self.baseline_ms is not None and latency_ms > self.baseline_ms * self.tolerance
+
+    def _observe(self, latency_ms: float):
+        # Drop to new minimums at once, drift up slowly so the baseline follows lasting changes
+        if self.baseline_ms is None or latency_ms < self.baseline_ms:
+            self.baseline_ms = latency_ms
+        else:
+            self.baseline_ms += 0.01 * (latency_ms - self.baseline_ms)
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < (self.baseline_ms or 0) / 1000:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+    def _wake(self):
+        for lane in (INTERACTIVE, BACKGROUND):
+            waiters = self._waiters[lane]
+            while waiters and self._has_capacity():
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.in_flight += 1
+                    waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `cooldown` one trial request is let through."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def check(self, host: str):
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return
+        raise CircuitOpenError(f"Circuit open for {host}; retry in {self._retry_in():.0f}s")
+
+    def _retry_in(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def abandon_probe(self):
+        """A trial request was cancelled before it could succeed or fail."""
+        self._probing = False
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class DailyQuota:
+    """Outbound calls per UTC day, by caller, against a daily budget (0 = unlimited)."""
+
+    def __init__(self, budget: int, saving_at: float):
+        self.budget = budget
+        self.saving_at = saving_at
+        self.day = _utc_today()
+        self.used = 0
+        self.by_caller: dict[str, int] = {}
+
+    def _roll_over(self):
+        today = _utc_today()
+        if today != self.day:
+            self.day = today
+            self.used = 0
+            self.by_caller = {}
+
+    @property
+    def state(self) -> str:
+        self._roll_over()
+        if not self.budget:
+            return "ok"
+        if self.used >= self.budget:
+            return "exhausted"
+        return "saving" if self.used >= self.budget * self.saving_at else "ok"
+
+    def check(self, host: str, lane: str):
+        state = self.state
+        if state == "exhausted" or (state == "saving" and lane == BACKGROUND):
+            raise QuotaExhaustedError(f"Daily quota {state} for {host} ({self.used}/{self.budget} calls)")
+
+    def record(self, caller: str):
+        self._roll_over()
+        self.used += 1
+        self.by_caller[caller] = self.by_caller.get(caller, 0) + 1
+
+
+class _Upstream:
+    def __init__(self):
+        self.bucket = TokenBucket(
+            settings.UPSTREAM_RATE_PER_SEC,
+            settings.UPSTREAM_BURST,
+            settings.UPSTREAM_BURST * settings.UPSTREAM_INTERACTIVE_RESERVE,
+        )
+        self.limiter = AdaptiveLimiter(
+            settings.UPSTREAM_CONCURRENCY_INITIAL,
+            settings.UPSTREAM_CONCURRENCY_MIN,
+            settings.UPSTREAM_CONCURRENCY_MAX,
+            settings.UPSTREAM_CONCURRENCY_BACKOFF,
+            settings.UPSTREAM_LATENCY_TOLERANCE,
+        )
+        self.breaker = CircuitBreaker(settings.UPSTREAM_BREAKER_THRESHOLD, settings.UPSTREAM_BREAKER_COOLDOWN_S)
+        self.quota = DailyQuota(settings.UPSTREAM_DAILY_BUDGET, settings.UPSTREAM_QUOTA_SAVING_AT)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+
+_upstreams: dict[str, _Upstream] = {}
+
+
+def _upstream_for(url: str) -> tuple[str, _Upstream]:
+    host = urlsplit(url).netloc
+    if host not in _upstreams:
+        _upstreams[host] = _Upstream()
+    return host, _upstreams[host]
+
+
+def cache_ttl(url: str, ttl: int) -> int:
+    """Cache TTL for data from this upstream, stretched while its daily quota is running low."""
+    upstream = _upstreams.get(urlsplit(url).netloc)
+    if upstream and upstream.quota.state != "ok":
+        return int(ttl * settings.UPSTREAM_QUOTA_TTL_FACTOR)
+    return ttl
+
+
+def _backoff_seconds(attempt: int, retry_after: float | None) -> float:
+    """Full-jitter exponential backoff, or the server's Retry-After when it sent one."""
+    if retry_after is not None:
+        return min(retry_after, settings.UPSTREAM_BACKOFF_MAX_MS / 1000)
+    cap = min(settings.UPSTREAM_BACKOFF_MAX_MS, settings.UPSTREAM_BACKOFF_BASE_MS * 2**attempt)
+    return random.uniform(0, cap) / 1000
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+async def get(url: str, params: dict | None = None, timeout: float = 15.0) -> httpx.Response:
+    """
+    Rate-limited, retried GET. Returns the successful response; raises
+    httpx.HTTPStatusError (non-retryable 4xx, or retries exhausted),
+    httpx.TransportError (retries exhausted), CircuitOpenError or QuotaExhaustedError.
+    """
+    host, upstream = _upstream_for(url)
+    lane = _lane.get()
+    attempt = 0
+    while True:
+        try:
+            upstream.quota.check(host, lane)
+            upstream.breaker.check(host)
+        except UpstreamUnavailableError:
+            upstream.stats["rejected"] += 1
+            raise
+        try:
+            await upstream.bucket.acquire(lane)
+            await upstream.limiter.acquire(lane)
+        except BaseException:
+            upstream.breaker.abandon_probe()  # Cancelled while queued: let the next request be the trial
+            raise
+        upstream.stats["requests"] += 1
+        upstream.quota.record(_caller.get())
+
+        retry_after = None
+        metrics.UPSTREAM_IN_FLIGHT.inc(host)
+        started = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(timeout=timeout, transport=_transport) as client:
+                resp = await client.get(url, params=params)
+        except httpx.TransportError as e:
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, host, type(e).__name__)
+            upstream.limiter.release(overloaded=True)
+            error = e
+        except BaseException:
+            upstream.limiter.release()
+            upstream.breaker.abandon_probe()
+            raise
+        else:
+            latency_ms = (time.perf_counter() - started) * 1000
+            metrics.UPSTREAM_LATENCY.observe(latency_ms / 1000, host, str(resp.status_code))
+            if resp.status_code != 429 and resp.status_code < 500:
+                upstream.limiter.release(latency_ms)
+                upstream.breaker.record_success()
+                resp.raise_for_status()
+                return resp
+            upstream.limiter.release(latency_ms, overloaded=True)
+            error = httpx.HTTPStatusError(f"{resp.status_code} from {host}", request=resp.request, response=resp)
+            retry_after = _retry_after(resp)
+        finally:
+            metrics.UPSTREAM_IN_FLIGHT.dec(host)
+
+        upstream.stats["failures"] += 1
+        upstream.breaker.record_failure()
+        if attempt >= settings.UPSTREAM_MAX_RETRIES:
+            raise error
+        upstream.stats["retries"] += 1
+        await asyncio.sleep(_backoff_seconds(attempt, retry_after))
+        attempt += 1
+
+
+def get_stats() -> dict:
+    """Per-upstream request counters, circuit state, tokens, concurrency limit and daily quota use."""
+    return {
+        host: {
+            **u.stats,
+            "circuit": u.breaker.state,
+            "tokens": round(u.bucket.tokens, 2),
+            "waiting": dict(u.bucket.waiting),
+            "concurrency_limit": int(u.limiter.limit),
+            "in_flight": u.limiter.in_flight,
+            "baseline_latency_ms": round(u.limiter.baseline_ms, 1) if u.limiter.baseline_ms else None,
+            "quota": {
+                "state": u.quota.state,
+                "used": u.quota.used,
+                "budget": u.quota.budget,
+                "by_caller": dict(u.quota.by_caller),
+            },
+        }
+        for host, u in _upstreams.items()
+    }
@@ -1,88 +1,440 @@
 """
 Vector search service: FAISS-based semantic search over city intelligence data.
 Uses sentence-transformers for embedding generation.
+
+The index, doc metadata and an embeddings cache (keyed by content hash) are
+persisted under FAISS_INDEX_PATH. At startup an unchanged catalog is loaded
+straight from disk, and only new or edited documents are re-embedded, so the
+embedding model is not loaded until it is actually needed.
+
+Vectors can be stored int8 scalar-quantized or product-quantized inside the
+index (VECTOR_QUANTIZATION), and document text lives in a memory-mapped side
+file that is only read for returned hits.
+
+The index is ID-mapped: single documents can be added, updated or removed
+after startup (cities resolved through the geocoding API fallback, and catalog
+cities re-synced whenever their weather or air quality is refreshed).
+Such runtime changes live in memory and are not written back to the store.
 """
 
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
 import numpy as np
 
 from app.config import get_settings
-from app.models.schemas import SemanticSearchResult
+from app.models.schemas import SearchFilters, SemanticSearchResult
+from app.services import memory, metrics
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
 _index = None
 _embedder = None
-_city_docs: list[dict] = []
+_embedder_lock = threading.Lock()  # The model loads once, whichever thread (warm-up or search) needs it first
+_city_docs: dict[int, dict] = {}  # FAISS id → doc metadata
+_doc_ids: dict[str, int] = {}  # "name|country" → FAISS id
+_tombstones: set[int] = set()  # Ids whose vectors the index cannot delete (HNSW); hidden at query time
+_next_id = 0
+_index_mmapped = False  # Memory-mapped indexes may be read-only; reloaded in memory before mutation
+_index_lock = threading.RLock()  # Guards index search/mutation across the event loop and worker threads
+_pending_upserts: set[asyncio.Future] = set()
+
+# Pre-computed filter indexes over doc metadata, maintained alongside _city_docs
+_facets: dict[str, dict[str, set[int]]] = {"continent": {}, "country": {}}  # field → lowercased value → ids
+_by_population: list[tuple[int, int]] = []  # Sorted (population, id) pairs for range filters
+_FILTER_EXHAUSTIVE_RATIO = 0.01  # Filters matching less than this share of the index probe exhaustively
+
+# Memory-mapped doc text side file; docs loaded from the store hold offsets instead of text
+_text_store: mmap.mmap | bytes = b""
+_METADATA_FIELDS = ("id", "city", "country", "lat", "lon", "continent", "population", "hash")
 _initialized = False
 
+# LRU cache of normalized query text → normalized embedding
+_query_cache: OrderedDict[str, np.ndarray] = OrderedDict()
+_query_cache_lock = threading.Lock()  # Searches run in worker threads; held for lookups, not for encoding
+_query_cache_hits = 0
+_query_cache_misses = 0
+_query_cache_evictions = 0
+
+# ── Persisted store layout (under settings.FAISS_INDEX_PATH) ──
+_INDEX_FILE = "index.faiss"
+_DOCS_FILE = "docs.json"
+_EMBEDDINGS_FILE = "embeddings.npy"
+_EMBEDDING_KEYS_FILE = "embedding_keys.json"
+_DOC_TEXT_FILE = "doc_text.bin"
+_MANIFEST_FILE = "manifest.json"
+_STORE_VERSION = 4
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+QUANTIZATIONS = ("none", "sq8", "pq")
+_MIN_POINTS_PER_CENTROID = 39  # FAISS warns below this many training points per k-means centroid
+_PQ_NBITS = 8
+
 
 def _get_embedder():
-    """Lazy-load the sentence transformer model."""
+    """Lazy-load the sentence transformer model (blocking: call from worker threads, not the event loop)."""
     global _embedder
     if _embedder is None:
-        try:
-            from sentence_transformers import SentenceTransformer
-
-            _embedder = SentenceTransformer(settings.VECTOR_MODEL_NAME)
-        except ImportError:
-            print("Warning: sentence-transformers not installed. Semantic search disabled.")
-            return None
+        with _embedder_lock:
+            if _embedder is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+
+                    _embedder = SentenceTransformer(settings.VECTOR_MODEL_NAME)
+                except ImportError:
+                    logger.warning("sentence-transformers not installed. Semantic search disabled.")
+                    return None
     return _embedder
 
 
+def _content_hash(text: str) -> str:
+    """Embedding cache key: a document's text under the current embedding model."""
+    return hashlib.sha256(f"{settings.VECTOR_MODEL_NAME}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _catalog_hash(docs: list[dict]) -> str:
+    """Fingerprint of the whole catalog: doc ids, metadata and text under the current model."""
+    payload = settings.VECTOR_MODEL_NAME + json.dumps(docs, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _encode(texts: list[str]) -> np.ndarray:
+    """Encode texts to L2-normalized float32 vectors."""
+    import faiss
+
+    embeddings = np.array(_get_embedder().encode(texts, show_progress_bar=False), dtype="float32")
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def _index_build_settings() -> dict:
+    """Settings that change the index structure (search-time knobs are applied on load instead)."""
+    return {
+        "type": settings.VECTOR_INDEX_TYPE.lower(),
+        "quantization": settings.VECTOR_QUANTIZATION.lower(),
+        "nlist": settings.VECTOR_IVF_NLIST,
+        "pq_m": settings.VECTOR_PQ_M,
+        "hnsw_m": settings.VECTOR_HNSW_M,
+        "ef_construction": settings.VECTOR_HNSW_EF_CONSTRUCTION,
+    }
+
+
+def resolve_index_spec(n: int, dim: int, index_type: str | None = None, quantization: str | None = None) -> dict:
+    """
+    Turn settings into concrete index parameters for a corpus of n vectors.
+    Index types or codecs that cannot be trained on so few vectors degrade to the next simpler one
+    (IVF → flat, PQ → SQ8).
+    """
+    kind = (index_type or settings.VECTOR_INDEX_TYPE).lower()
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {kind} (expected one of {', '.join(INDEX_TYPES)})")
+    quant = (quantization or settings.VECTOR_QUANTIZATION).lower()
+    if quant not in QUANTIZATIONS:
+        raise ValueError(f"Unknown vector quantization: {quant} (expected one of {', '.join(QUANTIZATIONS)})")
+
+    pq_trainable = n >= _MIN_POINTS_PER_CENTROID * 2**_PQ_NBITS
+    if quant == "pq" and not pq_trainable:
+        quant = "sq8"
+    m = max(d for d in range(1, min(settings.VECTOR_PQ_M, dim) + 1) if dim % d == 0)
+    pq = {"pq_m": m} if quant == "pq" else {}
+
+    if kind == "hnsw":
+        suffix = {"none": "", "sq8": "_SQ8", "pq": f"_PQ{m}"}[quant]
+        return {
+            "type": "hnsw",
+            "quantization": quant,
+            "factory": f"HNSW{settings.VECTOR_HNSW_M}{suffix}",
+            "ef_construction": settings.VECTOR_HNSW_EF_CONSTRUCTION,
+            "ef_search": settings.VECTOR_HNSW_EF_SEARCH,
+            **pq,
+        }
+
+    codec = {"none": "Flat", "sq8": "SQ8", "pq": f"PQ{m}x{_PQ_NBITS}"}[quant]
+    if kind in ("ivf_flat", "ivf_pq"):
+        nlist = settings.VECTOR_IVF_NLIST or int(4 * math.sqrt(n))
+        nlist = min(nlist, n // _MIN_POINTS_PER_CENTROID)
+        if nlist < 2:
+            return resolve_index_spec(n, dim, "flat", quant)
+        spec = {"nlist": nlist, "nprobe": min(settings.VECTOR_IVF_NPROBE, nlist)}
+        if (kind == "ivf_pq" and pq_trainable) or quant == "pq":
+            return {
+                "type": "ivf_pq",
+                "quantization": "pq",
+                "factory": f"IVF{nlist},PQ{m}x{_PQ_NBITS}",
+                "pq_m": m,
+                **spec,
+            }
+        return {"type": "ivf_flat", "quantization": quant, "factory": f"IVF{nlist},{codec}", **spec}
+
+    return {"type": "flat", "quantization": quant, "factory": codec, **pq}
+
+
+def _base_index(index):
+    """The index wrapped by an IDMap (where nprobe/efSearch/hnsw actually live)."""
+    import faiss
+
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def tune_index(index, spec: dict):
+    """Apply search-time parameters (nprobe / efSearch)."""
+    import faiss
+
+    params = faiss.ParameterSpace()
+    base = _base_index(index)
+    if "nprobe" in spec:
+        params.set_index_parameter(base, "nprobe", spec["nprobe"])
+    if "ef_search" in spec:
+        params.set_index_parameter(base, "efSearch", spec["ef_search"])
+
+
+def make_index(spec: dict, embeddings: np.ndarray, ids: np.ndarray | None = None):
+    """Build, train and fill an ID-mapped inner-product index described by a resolved spec."""
+    import faiss
+
+    index = faiss.index_factory(embeddings.shape[1], f"IDMap2,{spec['factory']}", faiss.METRIC_INNER_PRODUCT)
+    if "ef_construction" in spec:
+        _base_index(index).hnsw.efConstruction = spec["ef_construction"]
+    if not index.is_trained:
+        index.train(embeddings)
+    if ids is None:
+        ids = np.arange(len(embeddings), dtype="int64")
+    index.add_with_ids(embeddings, ids)
+    tune_index(index, spec)
+    return index
+
+
+def _doc_key(name: str, country: str) -> str:
+    return f"{name.lower().strip()}|{country.lower().strip()}"
+
+
+def _make_doc(doc_id: int, city: dict, text: str) -> dict:
+    return {
+        "id": doc_id,
+        "hash": _content_hash(text),
+        "city": city.get("name", "Unknown"),
+        "country": city.get("country", "Unknown"),
+        "lat": city.get("lat", 0),
+        "lon": city.get("lon", 0),
+        "continent": city.get("continent"),
+        "population": city.get("population"),
+        "text": text,
+    }
+
+
+def _add_facets(doc: dict):
+    for field, values in _facets.items():
+        if doc.get(field):
+            values.setdefault(doc[field].lower(), set()).add(doc["id"])
+    if doc.get("population") is not None:
+        bisect.insort(_by_population, (doc["population"], doc["id"]))
+
+
+def _drop_facets(doc: dict):
+    for field, values in _facets.items():
+        ids = values.get((doc.get(field) or "").lower())
+        if ids:
+            ids.discard(doc["id"])
+            if not ids:
+                del values[doc[field].lower()]
+    if doc.get("population") is not None:
+        entry = (doc["population"], doc["id"])
+        i = bisect.bisect_left(_by_population, entry)
+        if i < len(_by_population) and _by_population[i] == entry:
+            del _by_population[i]
+
+
+def _doc_metadata(doc: dict) -> dict:
+    return {field: doc.get(field) for field in _METADATA_FIELDS}
+
+
+def _doc_text(doc: dict) -> str:
+    """A doc's text — in memory for runtime upserts, otherwise read from the mapped side file."""
+    if "text" in doc:
+        return doc["text"]
+    start = doc["text_offset"]
+    return _text_store[start : start + doc["text_length"]].decode("utf-8")
+
+
+def _open_text_store(path: Path) -> mmap.mmap | bytes:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _install(index, docs: list[dict], mmapped: bool):
+    """Swap in a new index and its doc tables atomically with respect to searches."""
+    global _index, _city_docs, _doc_ids, _tombstones, _next_id, _index_mmapped, _facets, _by_population
+    with _index_lock:
+        _index = index
+        _city_docs = {d["id"]: d for d in docs}
+        _doc_ids = {_doc_key(d["city"], d["country"]): d["id"] for d in docs}
+        _tombstones = set()
+        _next_id = max(_city_docs, default=-1) + 1
+        _index_mmapped = mmapped
+        _facets = {field: {} for field in _facets}
+        _by_population = []
+        for doc in docs:
+            _add_facets(doc)
+
+
+def _load_persisted(store: Path, catalog_hash: str) -> bool:
+    """Load the saved index and docs if they were built from this exact catalog and model."""
+    import faiss
+
+    try:
+        with open(store / _MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (
+            manifest.get("version") != _STORE_VERSION
+            or manifest.get("catalog_hash") != catalog_hash
+            or manifest.get("model") != settings.VECTOR_MODEL_NAME
+            or manifest.get("index_build") != _index_build_settings()
+        ):
+            return False
+        index = faiss.read_index(str(store / _INDEX_FILE), faiss.IO_FLAG_MMAP)
+        spec = resolve_index_spec(manifest["count"], manifest["dim"])
+        tune_index(index, spec)
+        with open(store / _DOCS_FILE, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        text_store = _open_text_store(store / _DOC_TEXT_FILE)
+    except (OSError, ValueError, RuntimeError):
+        return False
+
+    global _text_store
+    with _index_lock:
+        _text_store = text_store
+        _install(index, docs, mmapped=True)
+    return True
+
+
+def _load_embedding_cache(store: Path) -> dict[str, np.ndarray]:
+    """Map content hash → embedding row from the memory-mapped embeddings file."""
+    try:
+        with open(store / _EMBEDDING_KEYS_FILE, "r", encoding="utf-8") as f:
+            keys = json.load(f)
+        embeddings = np.load(store / _EMBEDDINGS_FILE, mmap_mode="r")
+    except (OSError, ValueError):
+        return {}
+    if len(keys) != len(embeddings):
+        return {}
+    return dict(zip(keys, embeddings))
+
+
+def _write_atomic(path: Path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _persist(store: Path, keys: list[str], embeddings: np.ndarray, catalog_hash: str):
+    """Save index, docs, embeddings cache and manifest. The manifest goes last so a partial save is ignored."""
+    import faiss
+
+    store.mkdir(parents=True, exist_ok=True)
+    _write_atomic(store / _INDEX_FILE, lambda p: faiss.write_index(_index, str(p)))
+
+    # Doc text goes to a side file; docs.json keeps only metadata plus offsets into it
+    blob = bytearray()
+    docs = []
+    for doc in _city_docs.values():
+        raw = _doc_text(doc).encode("utf-8")
+        docs.append({**_doc_metadata(doc), "text_offset": len(blob), "text_length": len(raw)})
+        blob += raw
+    _write_atomic(store / _DOC_TEXT_FILE, lambda p: p.write_bytes(bytes(blob)))
+    _write_atomic(store / _DOCS_FILE, lambda p: p.write_text(json.dumps(docs), encoding="utf-8"))
+    _write_atomic(store / _EMBEDDING_KEYS_FILE, lambda p: p.write_text(json.dumps(keys), encoding="utf-8"))
+    with open(store / (_EMBEDDINGS_FILE + ".tmp"), "wb") as f:
+        np.save(f, embeddings)
+    os.replace(store / (_EMBEDDINGS_FILE + ".tmp"), store / _EMBEDDINGS_FILE)
+    manifest = {
+        "version": _STORE_VERSION,
+        "model": settings.VECTOR_MODEL_NAME,
+        "catalog_hash": catalog_hash,
+        "count": len(keys),
+        "dim": int(embeddings.shape[1]),
+        "index_build": _index_build_settings(),
+    }
+    _write_atomic(store / _MANIFEST_FILE, lambda p: p.write_text(json.dumps(manifest), encoding="utf-8"))
+
+
 def build_index(cities_data: list[dict]):
     """
     Build FAISS index from city intelligence summaries.
     Each city gets a text document describing its environmental profile.
+    Reuses the persisted index when the catalog and model are unchanged, and
+    re-embeds only documents whose content hash is not in the embeddings cache.
     """
-    global _index, _city_docs, _initialized
-
-    embedder = _get_embedder()
-    if embedder is None:
-        _initialized = True
-        return
+    global _initialized
 
     try:
-        import faiss
+        import faiss  # noqa: F401
     except ImportError:
-        print("Warning: faiss-cpu not installed. Semantic search disabled.")
+        logger.warning("faiss-cpu not installed. Semantic search disabled.")
         _initialized = True
         return
 
-    _city_docs = []
+    docs = []
     texts = []
 
-    for city in cities_data:
+    for i, city in enumerate(cities_data):
         doc_text = _generate_city_doc(city)
-        _city_docs.append(
-            {
-                "city": city.get("name", "Unknown"),
-                "country": city.get("country", "Unknown"),
-                "lat": city.get("lat", 0),
-                "lon": city.get("lon", 0),
-                "text": doc_text,
-            }
-        )
+        docs.append(_make_doc(i, city, doc_text))
         texts.append(doc_text)
 
     if not texts:
         _initialized = True
         return
 
-    # Generate embeddings
-    embeddings = embedder.encode(texts, show_progress_bar=False)
-    embeddings = np.array(embeddings, dtype="float32")
+    store = Path(settings.FAISS_INDEX_PATH)
+    keys = [_content_hash(t) for t in texts]
+    catalog_hash = _catalog_hash(docs)
 
-    # Build FAISS index (flat L2 for simplicity with <1000 entries)
+    if _load_persisted(store, catalog_hash):
+        _initialized = True
+        print(f"Vector Service: Loaded persisted index with {len(_city_docs)} city documents")
+        return
+
+    # Reuse cached embeddings; only new or changed documents hit the embedding model
+    cache = _load_embedding_cache(store)
+    missing = [i for i, key in enumerate(keys) if key not in cache]
+    if missing:
+        if _get_embedder() is None:
+            _initialized = True
+            return
+        fresh = _encode([texts[i] for i in missing])
+        cache.update({keys[i]: fresh[j] for j, i in enumerate(missing)})
+    embeddings = np.array([cache[key] for key in keys], dtype="float32")
+
+    # Inner product on normalized vectors = cosine similarity. Flat is exact and right for
+    # the seeded catalog; IVF/PQ/HNSW trade a little recall for scale (see VECTOR_INDEX_TYPE)
     dim = embeddings.shape[1]
-    _index = faiss.IndexFlatIP(dim)  # Inner product (cosine sim on normalized vectors)
+    spec = resolve_index_spec(len(embeddings), dim)
+    _install(make_index(spec, embeddings), docs, mmapped=False)
 
-    # Normalize for cosine similarity
-    faiss.normalize_L2(embeddings)
-    _index.add(embeddings)
+    try:
+        _persist(store, keys, embeddings, catalog_hash)
+        # Re-open from the store so doc text is served from the mapped side file, not the heap
+        _load_persisted(store, catalog_hash)
+    except Exception as e:
+        logger.warning(f"Failed to persist vector index: {e}")
 
     _initialized = True
-    print(f"Vector Service: Indexed {len(texts)} city documents (dim={dim})")
+    print(
+        f"Vector Service: Indexed {len(texts)} city documents "
+        f"(dim={dim}, index={spec['factory']}, re-embedded {len(missing)})"
+    )
 
 
 def _generate_city_doc(city: dict) -> str:
@@ -126,46 +478,340 @@ def _generate_city_doc(city: dict) -> str:
     )
 
 
-def semantic_search(query: str, top_k: int = 5) -> list[SemanticSearchResult]:
-    """Search for cities matching a natural language query."""
-    if _index is None or not _city_docs:
-        return []
-
-    embedder = _get_embedder()
-    if embedder is None:
-        return []
-
-    import faiss as faiss_lib
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
 
-    # Encode query
-    query_vec = embedder.encode([query])
-    query_vec = np.array(query_vec, dtype="float32")
-    faiss_lib.normalize_L2(query_vec)
-
-    # Search
-    k = min(top_k, len(_city_docs))
-    scores, indices = _index.search(query_vec, k)
 
+def _encode_queries(queries: list[str]) -> np.ndarray:
+    """
+    Encode queries through the LRU query-embedding cache.
+    Misses are de-duplicated and encoded together in a single forward pass.
+    """
+    global _query_cache_hits, _query_cache_misses, _query_cache_evictions
+    keys = [_normalize_query(q) for q in queries]
+    # Resolve hits before inserting misses, whose evictions may drop the least recently used of them
+    resolved = {}
+    with _query_cache_lock:
+        for key in dict.fromkeys(keys):
+            if key in _query_cache:
+                resolved[key] = _query_cache[key]
+                _query_cache.move_to_end(key)
+        missing = [key for key in dict.fromkeys(keys) if key not in resolved]
+        _query_cache_misses += len(missing)
+        _query_cache_hits += len(keys) - len(missing)
+    if missing:
+        vectors = _encode(missing)
+        with _query_cache_lock:
+            for key, vec in zip(missing, vectors):
+                resolved[key] = _query_cache[key] = vec
+                if len(_query_cache) > settings.QUERY_EMBEDDING_CACHE_SIZE:
+                    _query_cache.popitem(last=False)
+                    _query_cache_evictions += 1
+    return np.array([resolved[key] for key in keys], dtype="float32")
+
+
+def _to_results(scores: np.ndarray, ids: np.ndarray, top_k: int) -> list[SemanticSearchResult]:
     results = []
-    for i in range(k):
-        idx = indices[0][i]
-        if idx < 0 or idx >= len(_city_docs):
+    for score, doc_id in zip(scores, ids):
+        doc = _city_docs.get(int(doc_id))  # -1 padding and tombstoned ids have no doc
+        if doc is None:
             continue
-        doc = _city_docs[idx]
         results.append(
             SemanticSearchResult(
                 city=doc["city"],
                 country=doc["country"],
                 lat=doc["lat"],
                 lon=doc["lon"],
-                score=round(float(scores[0][i]), 4),
-                summary=doc["text"],
+                score=round(float(score), 4),
+                summary=_doc_text(doc),
             )
         )
-
+        if len(results) == top_k:
+            break
     return results
 
 
+def _matching_ids(filters: SearchFilters) -> np.ndarray | None:
+    """Resolve structured filters to the ids that pass them, using the facet indexes (None = unfiltered)."""
+    candidates = []
+    if filters.continent:
+        candidates.append(_facets["continent"].get(filters.continent.lower(), set()))
+    if filters.country:
+        candidates.append(_facets["country"].get(filters.country.lower(), set()))
+    if filters.min_population is not None or filters.max_population is not None:
+        lo = bisect.bisect_left(_by_population, (filters.min_population or 0, -1))
+        hi = (
+            bisect.bisect_right(_by_population, (filters.max_population, math.inf))
+            if filters.max_population is not None
+            else len(_by_population)
+        )
+        candidates.append({doc_id for _, doc_id in _by_population[lo:hi]})
+    if not candidates:
+        return None
+    candidates.sort(key=len)
+    ids = candidates[0].intersection(*candidates[1:])
+    return np.fromiter(sorted(ids), dtype="int64", count=len(ids))
+
+
+def _filter_params(selector, exhaustive: bool):
+    """Search parameters carrying an id selector, keeping (or widening) the index's own probe depth."""
+    import faiss
+
+    base = _base_index(_index)
+    if isinstance(base, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=base.nlist if exhaustive else base.nprobe)
+    if isinstance(base, faiss.IndexHNSW):
+        ef = base.hnsw.efSearch
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=max(ef, _index.ntotal) if exhaustive else ef)
+    return faiss.SearchParameters(sel=selector)
+
+
+def _filtered_search(query_vecs: np.ndarray, top_k: int, match_ids: np.ndarray):
+    """
+    Search only among match_ids via a bitmap IDSelector, so FAISS ranks just the
+    allowed vectors. Approximate indexes that come back short are re-probed exhaustively.
+    """
+    import faiss
+
+    mask = np.zeros(_next_id, dtype=bool)
+    mask[match_ids] = True
+    bits = np.packbits(mask, bitorder="little")  # Must outlive the searches below
+    selector = faiss.IDSelectorBitmap(len(bits), faiss.swig_ptr(bits))  # Length in bytes, not bits
+
+    k = min(top_k, len(match_ids))
+    exhaustive = len(match_ids) < _FILTER_EXHAUSTIVE_RATIO * _index.ntotal
+    scores, ids = _index.search(query_vecs, k, params=_filter_params(selector, exhaustive))
+    if not exhaustive and (ids < 0).any():
+        scores, ids = _index.search(query_vecs, k, params=_filter_params(selector, True))
+    return scores, ids
+
+
+def semantic_search_batch(
+    queries: list[str], top_k: int = 5, filters: SearchFilters | None = None
+) -> list[list[SemanticSearchResult]]:
+    """
+    Search many queries at once: one encode pass for cache misses and one index.search over the matrix.
+    Optional metadata filters are applied inside the FAISS search, so top_k results all pass them.
+    """
+    if _index is None or not _city_docs or not queries:
+        return [[] for _ in queries]
+
+    embedder = _get_embedder()
+    if embedder is None:
+        return [[] for _ in queries]
+
+    query_vecs = _encode_queries(queries)
+
+    with _index_lock, metrics.VECTOR_SEARCH_LATENCY.time():
+        match_ids = _matching_ids(filters) if filters else None
+        if match_ids is not None:
+            if len(match_ids) == 0:
+                return [[] for _ in queries]
+            scores, ids = _filtered_search(query_vecs, top_k, match_ids)
+        else:
+            # Over-fetch by the tombstone count so hidden vectors never shrink the result list
+            k = min(top_k + len(_tombstones), _index.ntotal)
+            scores, ids = _index.search(query_vecs, k)
+        return [_to_results(scores[i], ids[i], top_k) for i in range(len(queries))]
+
+
+def semantic_search(query: str, top_k: int = 5, filters: SearchFilters | None = None) -> list[SemanticSearchResult]:
+    """Search for cities matching a natural language query."""
+    return semantic_search_batch([query], top_k=top_k, filters=filters)[0]
+
+
+def get_query_cache_stats() -> dict:
+    """Hit/miss counters and occupancy of the query-embedding LRU cache."""
+    with _query_cache_lock:
+        total = _query_cache_hits + _query_cache_misses
+        return {
+            "entries": len(_query_cache),
+            "max_entries": settings.QUERY_EMBEDDING_CACHE_SIZE,
+            "hits": _query_cache_hits,
+            "misses": _query_cache_misses,
+            "evictions": _query_cache_evictions,
+            "hit_rate": round(_query_cache_hits / total, 4) if total else 0.0,
+        }
+
+
+metrics.register_cache("query_embeddings", get_query_cache_stats)
+
+
+def _ensure_writable():
+    """Swap a memory-mapped (possibly read-only) index for an in-memory copy before mutating it."""
+    global _index, _index_mmapped
+    import faiss
+
+    if _index_mmapped:
+        store = Path(settings.FAISS_INDEX_PATH)
+        index = faiss.read_index(str(store / _INDEX_FILE))
+        tune_index(index, resolve_index_spec(index.ntotal, index.d))
+        _index, _index_mmapped = index, False
+
+
+def _remove_ids(ids: list[int]):
+    try:
+        _index.remove_ids(np.array(ids, dtype="int64"))
+    except RuntimeError:
+        _tombstones.update(ids)  # HNSW cannot delete vectors
+    for doc_id in ids:
+        doc = _city_docs.pop(doc_id, None)
+        if doc is not None:
+            _drop_facets(doc)
+
+
+def upsert_document(city: dict) -> int | None:
+    """
+    Add or refresh a single city document. Unchanged documents are a no-op.
+    Embedding runs outside the index lock, so concurrent searches are only held
+    up for the insert itself. Returns the document id, or None if search is disabled.
+    """
+    global _next_id
+    text = _generate_city_doc(city)
+    key = _doc_key(city.get("name", "Unknown"), city.get("country", "Unknown"))
+    with _index_lock:  # A concurrent upsert or removal may replace the doc between the lookup and the comparison
+        existing = _doc_ids.get(key)
+        if existing is not None and _city_docs[existing]["hash"] == _content_hash(text):
+            doc = _make_doc(existing, city, text)
+            if _doc_metadata(doc) != _doc_metadata(_city_docs[existing]):
+                # Metadata-only change (e.g. population within the same size band): no re-embedding
+                _drop_facets(_city_docs[existing])
+                _city_docs[existing] = doc
+                _add_facets(doc)
+            return existing
+    if _index is None or _get_embedder() is None:
+        return None
+
+    vec = _encode([text])
+
+    with _index_lock:
+        _ensure_writable()
+        existing = _doc_ids.get(key)
+        if existing is not None:
+            _remove_ids([existing])
+        doc_id = _next_id
+        _next_id += 1
+        _index.add_with_ids(vec, np.array([doc_id], dtype="int64"))
+        _city_docs[doc_id] = _make_doc(doc_id, city, text)
+        _add_facets(_city_docs[doc_id])
+        _doc_ids[key] = doc_id
+    return doc_id
+
+
+def remove_document(name: str, country: str) -> bool:
+    """Remove a city document from the index. Returns False if it was not indexed."""
+    with _index_lock:
+        doc_id = _doc_ids.pop(_doc_key(name, country), None)
+        if doc_id is None or _index is None:
+            return False
+        _ensure_writable()
+        _remove_ids([doc_id])
+    return True
+
+
+def _upsert_quietly(city: dict):
+    try:
+        upsert_document(city)
+    except Exception as e:
+        logger.warning(f"Vector upsert failed for {city.get('name')}: {e}")
+
+
+def schedule_upsert(city: dict):
+    """
+    Embed and insert a document on a worker thread without blocking the event loop.
+    Falls back to a synchronous upsert when called outside a running loop.
+    """
+    if _index is None:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _upsert_quietly(city)
+        return
+    future = loop.run_in_executor(None, _upsert_quietly, city)
+    _pending_upserts.add(future)
+    future.add_done_callback(_pending_upserts.discard)
+
+
+def get_store_stats() -> dict:
+    """Where the vector store's bytes live: index codes, doc text on heap vs memory-mapped."""
+    heap_text = sum(len(d["text"].encode("utf-8")) for d in _city_docs.values() if "text" in d)
+    return {
+        "documents": len(_city_docs),
+        "index_type": settings.VECTOR_INDEX_TYPE,
+        "quantization": settings.VECTOR_QUANTIZATION,
+        "bytes_per_vector": _bytes_per_vector(),
+        "text_heap_bytes": heap_text,
+        "text_mmap_bytes": len(_text_store),
+    }
+
+
+def _bytes_per_vector() -> int | None:
+    """Stored code size per vector (graph links excluded for HNSW)."""
+    if _index is None:
+        return None
+    base = _base_index(_index)
+    storage = getattr(base, "storage", None)
+    try:
+        return int((storage or base).sa_code_size())
+    except RuntimeError:
+        return None
+
+
 def get_index_size() -> int:
     """Return number of indexed documents."""
-    return len(_city_docs) if _city_docs else 0
+    return len(_city_docs)
+
+
+def _index_bytes() -> int:
+    """Estimated index size: stored codes plus id map, HNSW graph links or IVF centroids and list ids."""
+    if _index is None:
+        return 0
+    import faiss
+
+    base = _base_index(_index)
+    total = _index.ntotal * (_bytes_per_vector() or _index.d * 4)
+    if isinstance(_index, faiss.IndexIDMap):
+        total += _index.ntotal * 8
+    hnsw = getattr(base, "hnsw", None)
+    if hnsw is not None:
+        total += hnsw.neighbors.size() * 4 + hnsw.levels.size() * 4 + hnsw.offsets.size() * 8
+    quantizer = getattr(base, "quantizer", None)
+    if quantizer is not None:
+        total += quantizer.ntotal * quantizer.d * 4 + base.ntotal * 8
+    return int(total)
+
+
+def _embedder_bytes() -> int:
+    """Parameter and buffer bytes of the loaded embedding model (0 until it is first needed)."""
+    if _embedder is None:
+        return 0
+    tensors = [*_embedder.parameters(), *_embedder.buffers()]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _query_cache_memory_stats() -> dict:
+    with _query_cache_lock:
+        return {"bytes": memory.deep_sizeof(_query_cache), "entries": len(_query_cache)}
+
+
+def _docs_memory_stats() -> dict:
+    with _index_lock:  # Upserts from worker threads mutate the docs and filter indexes
+        return {
+            "bytes": memory.deep_sizeof((_city_docs, _doc_ids, _facets, _by_population, _tombstones)),
+            "entries": len(_city_docs),
+            "text_mmap_bytes": len(_text_store),
+        }
+
+
+memory.register(
+    "faiss_index",
+    lambda: {
+        "bytes": _index_bytes(),
+        "entries": _index.ntotal if _index is not None else 0,
+        "memory_mapped": _index_mmapped,  # File-backed pages count towards RSS only once touched
+    },
+)
+memory.register("city_docs", _docs_memory_stats)
+memory.register("query_embeddings", _query_cache_memory_stats)
+memory.register("embedder", lambda: {"bytes": _embedder_bytes(), "entries": int(_embedder is not None)})
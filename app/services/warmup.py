@@ -0,0 +1,96 @@
+"""
+Startup warm-up. The server starts answering as soon as the app is imported, while
+the ML models, the city catalog and the vector index load concurrently in worker
+threads (their heavy imports — joblib/sklearn, faiss, sentence-transformers — happen
+there too). Until then requests use the services' fallbacks.
+/health stays a liveness check; /ready returns 503 until every phase has finished.
+/status reports how long the imports and each phase took.
+"""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from app import IMPORT_STARTED
+from app.config import get_settings
+from app.services import geocoding_service, ml_service, vector_service
+
+settings = get_settings()
+
+_imports_ms: float | None = None
+_phases: dict[str, dict] = {}  # phase → {"state": running|done|failed, "ms", "error"}
+_ready_after_ms: float | None = None
+_task: asyncio.Task | None = None
+
+
+def _build_vector_index():
+    cities_path = Path(settings.CITIES_DB_PATH)
+    if not cities_path.exists():
+        return
+    with open(cities_path, "r", encoding="utf-8") as f:
+        vector_service.build_index(json.load(f))
+
+
+PHASES = {
+    "models": ml_service.load_all_models,
+    "catalog": geocoding_service.get_all_cities,
+    "vector_index": _build_vector_index,
+}
+
+
+async def _run_phase(name: str, fn):
+    _phases[name] = {"state": "running", "ms": None, "error": None}
+    start = time.perf_counter()
+    try:
+        await asyncio.to_thread(fn)
+        _phases[name]["state"] = "done"
+    except Exception as e:
+        _phases[name].update(state="failed", error=str(e))
+        print(f"Warning: Warm-up phase '{name}' failed: {e}")
+    finally:
+        _phases[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+async def warm_up():
+    """Run every phase concurrently; the app is ready once all have finished (failed phases stay degraded)."""
+    global _ready_after_ms
+    await asyncio.gather(*(_run_phase(name, fn) for name, fn in PHASES.items()))
+    _ready_after_ms = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+    print(f"✅ Warm-up finished {_ready_after_ms:.0f} ms after import")
+
+
+async def start():
+    """Called from the lifespan: record the import time and warm up in the background (or inline)."""
+    global _imports_ms, _task
+    _imports_ms = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+    if settings.WARMUP_IN_BACKGROUND:
+        _task = asyncio.create_task(warm_up())
+    else:
+        await warm_up()
+
+
+async def stop():
+    """Stop waiting on an unfinished warm-up (its worker threads run to completion)."""
+    global _task
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+
+
+def is_ready() -> bool:
+    return _ready_after_ms is not None
+
+
+def get_stats() -> dict:
+    """Startup-time breakdown for /status and /ready."""
+    return {
+        "ready": is_ready(),
+        "imports_ms": _imports_ms,
+        "phases": {name: dict(phase) for name, phase in _phases.items()},
+        "ready_after_ms": _ready_after_ms,
+    }
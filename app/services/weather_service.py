@@ -3,11 +3,9 @@ Weather service: fetches current weather, forecasts, and historical data
 from Open-Meteo APIs. Includes in-memory caching with TTL.
 """
 
-import time
+from collections.abc import Callable
 from datetime import datetime, timedelta, timezone
 
-import httpx
-
 from app.config import get_settings
 from app.models.schemas import (
     ForecastDay,
@@ -16,24 +14,39 @@ from app.models.schemas import (
     WeatherForecast,
     WeatherHistory,
 )
+from app.services import memory, metrics, timing, upstream
+from app.services.response_cache import ResponseCache
 
 settings = get_settings()
 
 # ── Simple TTL Cache ─────────────────────────────────────
-_cache: dict[str, tuple[float, object]] = {}
+_cache = ResponseCache()
+
+# Called with (lat, lon) whenever a current-conditions entry is refreshed from upstream
+_refresh_listeners: list[Callable[[float, float], None]] = []
+
+
+def add_refresh_listener(listener: Callable[[float, float], None]):
+    """Register a callback run with (lat, lon) after current conditions for a location are refreshed."""
+    if listener not in _refresh_listeners:
+        _refresh_listeners.append(listener)
 
 
-def _get_cached(key: str, ttl: int) -> object | None:
-    if key in _cache:
-        ts, val = _cache[key]
-        if time.time() - ts < ttl:
-            return val
-        del _cache[key]
-    return None
+def _notify_refresh(lat: float, lon: float):
+    for listener in _refresh_listeners:
+        try:
+            listener(lat, lon)
+        except Exception as e:
+            print(f"Warning: refresh listener failed: {e}")
 
 
-def _set_cached(key: str, val: object):
-    _cache[key] = (time.time(), val)
+def get_cache_stats() -> dict:
+    """Hit/miss/eviction counters and occupancy of the response cache."""
+    return _cache.stats()
+
+
+metrics.register_cache("weather", get_cache_stats)
+memory.register("weather_cache", lambda: {"bytes": memory.deep_sizeof(_cache.entries), "entries": len(_cache.entries)})
 
 
 def _weather_condition(rain: float, cloud_cover: float | None, wind: float) -> str:
@@ -67,10 +80,29 @@ def _forecast_condition(precip: float, precip_prob: float, wind: float) -> str:
     return "Clear"
 
 
-async def get_current_weather(city: str, lat: float, lon: float, country: str | None = None) -> WeatherCurrent:
-    """Fetch current weather from Open-Meteo."""
-    cache_key = f"weather_current_{lat:.2f}_{lon:.2f}"
-    cached = _get_cached(cache_key, settings.WEATHER_CACHE_TTL)
+def _current_cache_key(lat: float, lon: float) -> str:
+    return f"weather_current_{lat:.2f}_{lon:.2f}"
+
+
+def peek_current_weather(lat: float, lon: float) -> tuple[float, WeatherCurrent] | None:
+    """The cached current weather entry for these coordinates as (fetched_at, value), if still fresh."""
+    return _cache.peek(
+        _current_cache_key(lat, lon), upstream.cache_ttl(settings.OPEN_METEO_WEATHER_URL, settings.WEATHER_CACHE_TTL)
+    )
+
+
+def peek_stale_current_weather(lat: float, lon: float) -> tuple[float, WeatherCurrent] | None:
+    """The last fetched current weather entry as (fetched_at, value), up to STALE_CACHE_MAX_AGE_S old."""
+    return _cache.peek_stale(_current_cache_key(lat, lon))
+
+
+async def get_current_weather(
+    city: str, lat: float, lon: float, country: str | None = None, timeout: float = 15.0
+) -> WeatherCurrent:
+    """Fetch current weather from Open-Meteo (timeout: seconds left for the upstream call)."""
+    cache_key = _current_cache_key(lat, lon)
+    cached = _cache.get(cache_key, upstream.cache_ttl(settings.OPEN_METEO_WEATHER_URL, settings.WEATHER_CACHE_TTL))
+    timing.mark_cache("weather", cached is not None)
     if cached:
         return cached
 
@@ -89,10 +121,11 @@ async def get_current_weather(city: str, lat: float, lon: float, country: str |
         ],
     }
 
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.get(settings.OPEN_METEO_WEATHER_URL, params=params)
-        resp.raise_for_status()
-        data = resp.json()
+    try:
+        resp = await upstream.get(settings.OPEN_METEO_WEATHER_URL, params=params, timeout=timeout)
+    except upstream.UpstreamUnavailableError as e:
+        return _cache.stale_or_raise(cache_key, e)
+    data = resp.json()
 
     current = data["current"]
     rain = current.get("rain", 0) or 0
@@ -116,14 +149,15 @@ async def get_current_weather(city: str, lat: float, lon: float, country: str |
         timestamp=datetime.now(timezone.utc),
     )
 
-    _set_cached(cache_key, result)
+    _cache.set(cache_key, result)
+    _notify_refresh(lat, lon)
     return result
 
 
 async def get_weather_forecast(city: str, lat: float, lon: float, days: int = 7) -> WeatherForecast:
     """Fetch multi-day forecast from Open-Meteo."""
     cache_key = f"weather_forecast_{lat:.2f}_{lon:.2f}_{days}"
-    cached = _get_cached(cache_key, settings.FORECAST_CACHE_TTL)
+    cached = _cache.get(cache_key, upstream.cache_ttl(settings.OPEN_METEO_WEATHER_URL, settings.FORECAST_CACHE_TTL))
     if cached:
         return cached
 
@@ -141,10 +175,11 @@ async def get_weather_forecast(city: str, lat: float, lon: float, days: int = 7)
         "forecast_days": min(days, 16),
     }
 
-    async with httpx.AsyncClient(timeout=15.0) as client:
-        resp = await client.get(settings.OPEN_METEO_WEATHER_URL, params=params)
-        resp.raise_for_status()
-        data = resp.json()
+    try:
+        resp = await upstream.get(settings.OPEN_METEO_WEATHER_URL, params=params, timeout=15.0)
+    except upstream.UpstreamUnavailableError as e:
+        return _cache.stale_or_raise(cache_key, e)
+    data = resp.json()
 
     daily = data["daily"]
     forecast_days = []
@@ -176,14 +211,14 @@ async def get_weather_forecast(city: str, lat: float, lon: float, days: int = 7)
         forecast_days=forecast_days,
         generated_at=datetime.now(timezone.utc),
     )
-    _set_cached(cache_key, result)
+    _cache.set(cache_key, result)
     return result
 
 
 async def get_weather_history(city: str, lat: float, lon: float, days: int = 30) -> WeatherHistory:
     """Fetch historical weather data from Open-Meteo Archive API."""
     cache_key = f"weather_history_{lat:.2f}_{lon:.2f}_{days}"
-    cached = _get_cached(cache_key, settings.FORECAST_CACHE_TTL)
+    cached = _cache.get(cache_key, upstream.cache_ttl(settings.OPEN_METEO_ARCHIVE_URL, settings.FORECAST_CACHE_TTL))
     if cached:
         return cached
 
@@ -204,10 +239,11 @@ async def get_weather_history(city: str, lat: float, lon: float, days: int = 30)
         ],
     }
 
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        resp = await client.get(settings.OPEN_METEO_ARCHIVE_URL, params=params)
-        resp.raise_for_status()
-        data = resp.json()
+    try:
+        resp = await upstream.get(settings.OPEN_METEO_ARCHIVE_URL, params=params, timeout=20.0)
+    except upstream.UpstreamUnavailableError as e:
+        return _cache.stale_or_raise(cache_key, e)
+    data = resp.json()
 
     daily = data["daily"]
     daily_data = []
@@ -233,5 +269,5 @@ async def get_weather_history(city: str, lat: float, lon: float, days: int = 30)
         period_end=end_date,
         daily_data=daily_data,
     )
-    _set_cached(cache_key, result)
+    _cache.set(cache_key, result)
     return result
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks (not part of the pytest suite).
+Everything runs offline against an Open-Meteo stand-in that replays recorded
+responses; see `python -m benchmarks.run --help`.
+"""
@@ -0,0 +1,60 @@
+"""Fuzzy name search, fuzzy geocoding and radius search over synthetic catalogs of 10k/100k cities."""
+
+import random
+
+from app.models.schemas import CityInfo
+from app.services import geocoding_service
+from benchmarks import measure
+
+_SYLLABLES = ["ba", "ko", "ri", "san", "to", "mel", "lin", "dor", "va", "ne", "shi", "ra", "gu", "pol", "ter", "an"]
+
+
+def synthetic_catalog(n: int, seed: int = 42) -> list[CityInfo]:
+    rng = random.Random(seed)
+    return [
+        CityInfo(
+            name="".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))).title() + f" {i}",
+            country="Benchland",
+            lat=rng.uniform(-60, 70),
+            lon=rng.uniform(-180, 180),
+            population=rng.randint(10_000, 10_000_000),
+        )
+        for i in range(n)
+    ]
+
+
+def _typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    return name[:i] + name[i + 1 :]
+
+
+async def run(sizes: list[int], queries: int) -> dict:
+    """Each case runs `queries` lookups drawn from the catalog (names with one dropped character)."""
+    results = {}
+    saved_db, saved_cache = geocoding_service._cities_db, dict(geocoding_service._geocode_cache)
+    try:
+        for n in sizes:
+            catalog = synthetic_catalog(n)
+            geocoding_service._cities_db = catalog
+            rng = random.Random(n)
+            sample = [rng.choice(catalog) for _ in range(queries + 1)]
+            names = iter([_typo(city.name, rng) for city in sample] * 2)
+            points = iter([(city.lat, city.lon) for city in sample] * 2)
+
+            results[f"geocoding/fuzzy_search[{n}]"] = measure.time_sync(
+                lambda: geocoding_service.search_cities(next(names), limit=10), queries
+            )
+
+            async def geocode():
+                geocoding_service._geocode_cache.clear()
+                await geocoding_service.geocode_city(next(names))
+
+            results[f"geocoding/fuzzy_geocode[{n}]"] = await measure.time_async(geocode, queries)
+            results[f"geocoding/nearby[{n}]"] = measure.time_sync(
+                lambda: geocoding_service.get_nearby_cities(*next(points), radius_km=250), queries
+            )
+    finally:
+        geocoding_service._cities_db = saved_db
+        geocoding_service._geocode_cache.clear()
+        geocoding_service._geocode_cache.update(saved_cache)
+    return results
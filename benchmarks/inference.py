@@ -0,0 +1,44 @@
+"""Single-row latency and batch throughput for each model on the serving path (ml_service)."""
+
+import random
+
+from app.services import ml_service
+from benchmarks import measure
+
+
+def _rows(n: int, seed: int = 42) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "temperature": rng.uniform(-15, 40),
+            "humidity": rng.uniform(10, 100),
+            "rain": rng.choice([0.0, 0.0, 0.5, 4.0]),
+            "pressure": rng.uniform(990, 1030),
+            "wind_speed": rng.uniform(0, 60),
+            "month": rng.randint(1, 12),
+            "hour": rng.randint(0, 23),
+            "pm2_5": rng.uniform(2, 150),
+        }
+        for _ in range(n)
+    ]
+
+
+def run(repeats: int, batch_size: int) -> dict:
+    ml_service.load_all_models()
+    rows = _rows(batch_size)
+    cases = {
+        "aqi_risk": ml_service.predict_aqi_risk_batch,
+        "pollution": ml_service.predict_pollution_batch,
+        "cluster": ml_service.predict_cluster_batch,
+    }
+    loaded = ml_service.get_models_status()
+    results = {}
+    for name, predict in cases.items():
+        single = iter(rows * (repeats // len(rows) + 2))
+        results[f"inference/{name}_single"] = measure.time_sync(lambda: predict([next(single)]), repeats)
+        results[f"inference/{name}_batch[{batch_size}]"] = measure.time_sync(
+            lambda: predict(rows), max(3, repeats // 50), ops_per_call=batch_size
+        )
+    for case in results.values():
+        case["models_loaded"] = sum(loaded.values())
+    return results
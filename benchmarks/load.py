@@ -0,0 +1,277 @@
+"""
+Closed-loop load test for the end-to-end agent endpoints.
+Each simulated user sends a request, waits for the response (plus optional think
+time) and sends the next, so offered load follows what the server sustains.
+Stepping the user count (--users 1,4,16,64) shows where throughput stops growing
+and latency climbs: the saturation point of one worker.
+
+Requests follow a traffic mix (--mix analyze=0.6,compare=0.2,...) over cities drawn
+from the catalog with Zipf popularity, against the offline Open-Meteo stand-in.
+The app runs in-process over ASGI (default) or behind a local uvicorn in the same
+process (--server uvicorn), so upstream calls always hit the stand-in.
+
+Usage: python -m benchmarks.load --users 1,4,16,64 --duration 20 --mix analyze=0.7,compare=0.3
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from app.config import get_settings
+from app.services import job_service, ml_service
+from benchmarks.measure import summarize
+from benchmarks.routes import reset_caches
+from benchmarks.stand_in import OpenMeteoStandIn
+
+settings = get_settings()
+
+OPERATIONS = ("analyze", "compare", "weather", "air_quality", "search")
+DEFAULT_MIX = "analyze=0.6,compare=0.2,weather=0.1,air_quality=0.1"
+
+
+def _request(op: str, pick) -> tuple[str, str, object]:
+    """(method, path, JSON body) for one operation; pick() draws a city by popularity."""
+    if op == "analyze":
+        return "POST", f"/api/v1/agents/analyze/{pick()}", None
+    if op == "compare":
+        cities = {pick() for _ in range(3)}
+        while len(cities) < 2:
+            cities.add(pick())
+        return "POST", "/api/v1/agents/compare", sorted(cities)
+    if op == "weather":
+        return "GET", f"/api/v1/weather/current/{pick()}", None
+    if op == "air_quality":
+        return "GET", f"/api/v1/air-quality/current/{pick()}", None
+    if op == "search":
+        return "POST", "/api/v1/agents/search", {"query": f"cities like {pick()}", "top_k": 5}
+    raise ValueError(f"Unknown operation: {op}")
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        op, _, weight = part.partition("=")
+        if op.strip() not in OPERATIONS:
+            raise ValueError(f"Unknown operation {op!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[op.strip()] = float(weight or 1)
+    return mix
+
+
+def zipf_picker(names: list[str], exponent: float, seed: int):
+    """Draw names with probability ∝ 1 / rank^exponent (catalog order is the popularity rank)."""
+    rng = random.Random(seed)
+    weights = [1 / (rank**exponent) for rank in range(1, len(names) + 1)]
+    cumulative = list(np.cumsum(weights))
+
+    def pick() -> str:
+        return rng.choices(names, cum_weights=cumulative)[0]
+
+    return pick
+
+
+class LoopLagSampler:
+    """Measures how late a periodic sleep wakes up on the shared event loop (the app's loop in-process)."""
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.samples_ms: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            self.samples_ms.append(max(0.0, (time.perf_counter() - t0 - self.interval_s) * 1000))
+
+    def start(self):
+        self.samples_ms = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if not self.samples_ms:
+            return {}
+        return {
+            "p50_ms": round(float(np.percentile(self.samples_ms, 50)), 2),
+            "p99_ms": round(float(np.percentile(self.samples_ms, 99)), 2),
+            "max_ms": round(max(self.samples_ms), 2),
+        }
+
+
+async def _cache_stats(client: httpx.AsyncClient) -> dict:
+    return (await client.get("/api/v1/status")).json()["cache_stats"]
+
+
+def _hit_rates(before: dict, after: dict) -> dict:
+    rates = {}
+    for name, stats in after.items():
+        if not isinstance(stats, dict) or "hits" not in stats:
+            continue
+        hits = stats["hits"] - before.get(name, {}).get("hits", 0)
+        misses = stats["misses"] - before.get(name, {}).get("misses", 0)
+        rates[name] = round(hits / (hits + misses), 4) if hits + misses else None
+    return rates
+
+
+async def run_level(
+    client: httpx.AsyncClient, users: int, duration_s: float, warmup_s: float, mix: dict, pick, think_ms: float
+) -> dict:
+    """Drive `users` closed-loop clients for warmup + duration; only the measured window is reported."""
+    ops, weights = list(mix), list(mix.values())
+    rng = random.Random(users)
+    latencies: dict[str, list[float]] = {op: [] for op in ops}
+    errors: dict[str, int] = {}
+    measuring = False
+    stop_at = time.perf_counter() + warmup_s + duration_s
+
+    async def user():
+        while time.perf_counter() < stop_at:
+            op = rng.choices(ops, weights)[0]
+            method, path, body = _request(op, pick)
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                failed = response.status_code >= 500
+            except httpx.HTTPError:
+                failed = True
+            if measuring:
+                latencies[op].append((time.perf_counter() - t0) * 1000)
+                if failed:
+                    errors[op] = errors.get(op, 0) + 1
+            # Always yields, so a request served without awaiting cannot starve the other users
+            await asyncio.sleep(think_ms / 1000)
+
+    tasks = [asyncio.create_task(user()) for _ in range(users)]
+    await asyncio.sleep(warmup_s)
+    measuring = True
+    before = await _cache_stats(client)
+    lag = LoopLagSampler()
+    lag.start()
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - started
+    loop_lag = await lag.stop()
+    after = await _cache_stats(client)
+
+    all_samples = [ms for samples in latencies.values() for ms in samples]
+    return {
+        "users": users,
+        **(summarize(all_samples, wall) if all_samples else {}),
+        "by_operation": {op: summarize(s, wall) for op, s in latencies.items() if s},
+        "errors": errors,
+        "loop_lag": loop_lag,
+        "cache_hit_rates": _hit_rates(before, after),
+    }
+
+
+def _saturation(levels: list[dict]) -> int | None:
+    """First user count whose throughput gain over the previous level is under 10%."""
+    for previous, level in zip(levels, levels[1:]):
+        if level.get("throughput_per_s", 0) < previous.get("throughput_per_s", 0) * 1.1:
+            return previous["users"]
+    return None
+
+
+async def _uvicorn_server(port: int):
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    from app.main import app
+
+    ml_service.load_all_models()
+    names = [c["name"] for c in json.loads(Path(settings.CITIES_DB_PATH).read_text(encoding="utf-8"))]
+    pick = zipf_picker(names, args.zipf, args.seed)
+    mix = parse_mix(args.mix)
+    stand_in = OpenMeteoStandIn(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate)
+
+    levels = []
+    with stand_in.installed(unthrottled=not args.throttled):
+        server = None
+        if args.server == "uvicorn":
+            server, server_task = await _uvicorn_server(args.port)
+            client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=60.0)
+        else:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=60.0)
+        try:
+            for users in args.users:
+                if args.cold:
+                    reset_caches()
+                print(f"  {users} user(s)...")
+                level = await run_level(client, users, args.duration, args.warmup, mix, pick, args.think_ms)
+                levels.append(level)
+                print(
+                    f"    {level.get('throughput_per_s')} req/s  p50 {level.get('p50_ms')} ms  "
+                    f"p99 {level.get('p99_ms')} ms  loop lag p99 {level['loop_lag'].get('p99_ms')} ms"
+                )
+        finally:
+            await client.aclose()
+            if server is not None:
+                server.should_exit = True
+                await server_task
+            await job_service.shutdown()
+
+    return {
+        "config": {
+            "server": args.server,
+            "mix": mix,
+            "zipf": args.zipf,
+            "duration_s": args.duration,
+            "stand_in_latency_ms": args.latency_ms,
+            "upstream_requests": sum(stand_in.requests.values()),
+        },
+        "levels": levels,
+        "saturation_users": _saturation(levels),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop load test of the agent endpoints")
+    parser.add_argument("--users", default="1,4,16,64", help="Comma-separated concurrent user counts to step through")
+    parser.add_argument("--duration", type=float, default=15.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Traffic mix, op=weight (analyze, compare, weather, ...)")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of city popularity")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Pause between a user's requests")
+    parser.add_argument("--cold", action="store_true", help="Clear caches before each level")
+    parser.add_argument("--server", choices=("asgi", "uvicorn"), default="asgi", help="In-process ASGI or uvicorn")
+    parser.add_argument("--port", type=int, default=8765, help="Port for --server uvicorn")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Stand-in upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="Stand-in latency jitter (±)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream requests that fail")
+    parser.add_argument("--throttled", action="store_true", help="Keep the upstream rate limit and quota in force")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args()
+    args.users = [int(u) for u in args.users.split(",") if u]
+
+    print(f"🏋️ Load test ({args.server}): mix {args.mix}, Zipf s={args.zipf}, {args.duration}s per level")
+    report = asyncio.run(main_async(args))
+    saturation = report["saturation_users"]
+    print(f"📈 Saturates at ~{saturation} users" if saturation else "📈 No saturation within the tested levels")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Timing loops, percentile summaries, memory tracking and baseline comparison shared by the suites."""
+
+import asyncio
+import json
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from app.services import memory
+
+# Latency changes smaller than this are timer noise, never a regression
+MIN_DELTA_MS = 0.05
+# Peak RSS changes smaller than this are allocator noise, never a regression
+MIN_DELTA_MB = 5.0
+
+
+def summarize(samples_ms: list[float], wall_s: float, ops: int | None = None) -> dict:
+    """p50/p99/mean latency and throughput (ops per second of wall time)."""
+    return {
+        "p50_ms": round(float(np.percentile(samples_ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(samples_ms, 99)), 4),
+        "mean_ms": round(float(np.mean(samples_ms)), 4),
+        "throughput_per_s": round((ops if ops is not None else len(samples_ms)) / wall_s, 1) if wall_s else None,
+    }
+
+
+def time_sync(fn: Callable[[], object], repeats: int, warmup: int = 1, ops_per_call: int = 1) -> dict:
+    """Latency of repeated sequential calls; throughput counts ops_per_call per call (e.g. batch rows)."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize(samples, time.perf_counter() - start, repeats * ops_per_call)
+
+
+async def time_async(fn: Callable[[], Awaitable[object]], repeats: int, concurrency: int = 1, warmup: int = 1) -> dict:
+    """Latency of `repeats` calls issued by `concurrency` closed-loop workers."""
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    remaining = repeats
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            await fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, time.perf_counter() - start)
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak RSS (Linux VmHWM) so the next reading covers one suite; cumulative elsewhere."""
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="utf-8") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+@contextmanager
+def track_memory(results: dict, suite: str):
+    """Record the suite's peak RSS and RSS growth as the case `memory.<suite>`."""
+    rss_before, _ = memory.rss_bytes()
+    _reset_peak_rss()
+    yield
+    rss_after, peak = memory.rss_bytes()
+    results[f"memory.{suite}"] = {
+        "peak_rss_mb": round(peak / 2**20, 1),
+        "rss_growth_mb": round((rss_after - rss_before) / 2**20, 1),
+    }
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8")).get("results", {})
+
+
+def save_baseline(path: Path, results: dict, meta: dict):
+    path.write_text(json.dumps({"meta": meta, "results": results}, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Regressions against the baseline: latency (p50/p99) or peak RSS above baseline × (1 + tolerance),
+    or throughput below baseline × (1 - tolerance). Cases missing from either side are skipped.
+    """
+    regressions = []
+    for case, current in sorted(results.items()):
+        base = baseline.get(case)
+        if not base:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if key in base and key in current:
+                limit = base[key] * (1 + tolerance)
+                if current[key] > limit and current[key] - base[key] > MIN_DELTA_MS:
+                    regressions.append(f"{case}: {key} {current[key]} > {base[key]} (+{tolerance:.0%} allowed)")
+        if "peak_rss_mb" in base and "peak_rss_mb" in current:
+            limit = base["peak_rss_mb"] * (1 + tolerance)
+            if current["peak_rss_mb"] > limit and current["peak_rss_mb"] - base["peak_rss_mb"] > MIN_DELTA_MB:
+                regressions.append(
+                    f"{case}: peak_rss_mb {current['peak_rss_mb']} > {base['peak_rss_mb']} (+{tolerance:.0%} allowed)"
+                )
+        if base.get("throughput_per_s") and current.get("throughput_per_s") is not None:
+            floor = base["throughput_per_s"] * (1 - tolerance)
+            if current["throughput_per_s"] < floor:
+                regressions.append(
+                    f"{case}: throughput {current['throughput_per_s']}/s < {base['throughput_per_s']}/s "
+                    f"(-{tolerance:.0%} allowed)"
+                )
+    return regressions
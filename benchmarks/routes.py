@@ -0,0 +1,77 @@
+"""Throughput and p50/p99 for every API route, served in-process over ASGI."""
+
+import httpx
+
+from app.agents import orchestrator
+from app.services import air_quality_service, geocoding_service, job_service, ml_service, weather_service
+from benchmarks import measure
+
+_FEATURES = {"temperature": 21.0, "humidity": 60.0, "rain": 0.0, "pressure": 1012.0, "wind_speed": 12.0}
+
+# (case name, method, path, JSON body). {job_id} is filled from a job submitted during setup.
+ROUTES = [
+    ("health", "GET", "/health", None),
+    ("status", "GET", "/api/v1/status", None),
+    ("metrics", "GET", "/metrics", None),
+    ("cities_all", "GET", "/api/v1/cities/all", None),
+    ("cities_search", "GET", "/api/v1/cities/search?q=Lond", None),
+    ("cities_nearby", "GET", "/api/v1/cities/nearby?lat=51.5&lon=-0.12&radius_km=500", None),
+    ("weather_current", "GET", "/api/v1/weather/current/London", None),
+    ("weather_forecast", "GET", "/api/v1/weather/forecast/London", None),
+    ("weather_historical", "GET", "/api/v1/weather/historical/London", None),
+    ("aq_current", "GET", "/api/v1/air-quality/current/London", None),
+    ("aq_forecast", "GET", "/api/v1/air-quality/forecast/London", None),
+    ("aq_rankings", "GET", "/api/v1/air-quality/rankings", None),
+    ("predict_aqi_risk", "POST", "/api/v1/predict/aqi-risk", {**_FEATURES, "month": 6, "hour": 14}),
+    ("predict_pollution", "POST", "/api/v1/predict/pollution", {**_FEATURES, "month": 6, "hour": 14}),
+    (
+        "predict_cluster",
+        "POST",
+        "/api/v1/predict/cluster",
+        {"temperature": 21.0, "humidity": 60.0, "rain": 0.0, "pm2_5": 12.0},
+    ),
+    ("agents_analyze", "POST", "/api/v1/agents/analyze/London", None),
+    ("agents_compare", "POST", "/api/v1/agents/compare", ["London", "Paris", "Tokyo"]),
+    ("agents_compare_stream", "POST", "/api/v1/agents/compare/stream", ["London", "Paris", "Tokyo"]),
+    ("agents_leaderboard", "GET", "/api/v1/agents/leaderboard?top=10", None),
+    ("agents_leaderboard_city", "GET", "/api/v1/agents/leaderboard/London", None),
+    ("agents_search", "POST", "/api/v1/agents/search", {"query": "clean air and mild weather", "top_k": 5}),
+    ("agents_search_batch", "POST", "/api/v1/agents/search/batch", {"queries": ["sunny coast", "cold capital"]}),
+    ("agents_job_status", "GET", "/api/v1/agents/jobs/{job_id}", None),
+    ("agents_job_results", "GET", "/api/v1/agents/jobs/{job_id}/results", None),
+    ("agents_job_submit", "POST", "/api/v1/agents/jobs", {"cities": ["London", "Paris"]}),
+]
+
+
+def reset_caches():
+    """Drop every response and report cache so the next request goes upstream."""
+    weather_service._cache.clear()
+    air_quality_service._cache.clear()
+    geocoding_service._geocode_cache.clear()
+    orchestrator._report_cache.clear()
+
+
+async def run(requests: int, concurrency: int = 1, cold: bool = False) -> dict:
+    """One case per route; cold clears the caches before every request (warm primes them once)."""
+    from app.main import app
+
+    ml_service.load_all_models()
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+        job = (await client.post("/api/v1/agents/jobs", json={"cities": ["London", "Paris"]})).json()
+        for name, method, path, body in ROUTES:
+            url = path.format(job_id=job["job_id"])
+            failures = 0
+
+            async def call():
+                nonlocal failures
+                if cold:
+                    reset_caches()
+                response = await client.request(method, url, json=body)
+                failures += response.status_code >= 500
+
+            stats = await measure.time_async(call, requests, concurrency)
+            results[f"routes/{name}{'[cold]' if cold else ''}"] = {**stats, "server_errors": failures}
+    await job_service.shutdown()
+    return results
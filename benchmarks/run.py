@@ -0,0 +1,129 @@
+"""
+Benchmark runner: routes, geocoding, inference and vector suites against the
+offline Open-Meteo stand-in, compared with a stored baseline. Each suite's peak
+RSS is recorded too (case memory.<suite>), so memory regressions fail the run as well.
+
+Usage:
+  python -m benchmarks.run                          # all suites, compare with benchmarks/baseline.json
+  python -m benchmarks.run --suites routes --cold   # routes with caches cleared before every request
+  python -m benchmarks.run --save-baseline          # record the current numbers as the new baseline
+Exits with status 1 when a case regresses beyond --tolerance.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import geocoding, inference, measure, routes, vector
+from benchmarks.stand_in import OpenMeteoStandIn
+
+SUITES = ("routes", "geocoding", "inference", "vector")
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+def _sizes(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+async def run_suites(args: argparse.Namespace) -> dict:
+    stand_in = OpenMeteoStandIn(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, error_status=args.error_status
+    )
+    results = {}
+    with stand_in.installed():
+        if "routes" in args.suites:
+            print("  routes...")
+            with measure.track_memory(results, "routes"):
+                results.update(await routes.run(args.requests, args.concurrency, args.cold))
+        if "geocoding" in args.suites:
+            print("  geocoding...")
+            with measure.track_memory(results, "geocoding"):
+                results.update(await geocoding.run(_sizes(args.catalog_sizes), args.geocode_queries))
+        if "inference" in args.suites:
+            print("  inference...")
+            with measure.track_memory(results, "inference"):
+                results.update(inference.run(args.inference_repeats, args.batch_size))
+        if "vector" in args.suites:
+            print("  vector...")
+            with measure.track_memory(results, "vector"):
+                results.update(vector.run(_sizes(args.vector_sizes), args.dim, args.vector_queries))
+    print(f"  stand-in served {sum(stand_in.requests.values())} upstream requests ({stand_in.errors} injected errors)")
+    return results
+
+
+def _print_table(results: dict, baseline: dict):
+    print(f"\n{'case':<48} {'p50 ms':>10} {'p99 ms':>10} {'ops/s':>11} {'base p99':>10}")
+    for case, stats in sorted(results.items()):
+        if "p50_ms" not in stats:
+            continue
+        base = baseline.get(case, {}).get("p99_ms", "")
+        print(
+            f"{case:<48} {stats['p50_ms']:>10} {stats['p99_ms']:>10} {stats['throughput_per_s'] or '':>11} {base:>10}"
+        )
+    print(f"\n{'suite memory':<48} {'peak MiB':>10} {'growth MiB':>10} {'base peak':>11}")
+    for case, stats in sorted(results.items()):
+        if "peak_rss_mb" in stats:
+            base = baseline.get(case, {}).get("peak_rss_mb", "")
+            print(f"{case:<48} {stats['peak_rss_mb']:>10} {stats['rss_growth_mb']:>10} {base:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per route")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent clients per route")
+    parser.add_argument("--cold", action="store_true", help="Clear caches before every route request")
+    parser.add_argument("--catalog-sizes", default="10000,100000", help="Synthetic geocoding catalog sizes")
+    parser.add_argument("--geocode-queries", type=int, default=20, help="Lookups per geocoding case")
+    parser.add_argument("--inference-repeats", type=int, default=500, help="Single-row predictions per model")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per batch prediction")
+    parser.add_argument("--vector-sizes", default="10000,100000", help="Synthetic vector corpus sizes")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension for the vector suite")
+    parser.add_argument("--vector-queries", type=int, default=500, help="Queries per vector case")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Stand-in upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="Stand-in latency jitter (±)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of upstream requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="Status code of injected failures")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before failing")
+    parser.add_argument("--output", help="Also write the results JSON to this path")
+    args = parser.parse_args()
+    args.suites = [s for s in args.suites.split(",") if s]
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    print(f"⏱️ Benchmarks: {', '.join(args.suites)} (stand-in latency {args.latency_ms}±{args.jitter_ms} ms)")
+    results = asyncio.run(run_suites(args))
+    baseline = measure.load_baseline(args.baseline)
+    _print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        meta = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "stand_in_latency_ms": args.latency_ms,
+        }
+        measure.save_baseline(args.baseline, {**baseline, **results}, meta)
+        print(f"\n📌 Baseline written to {args.baseline}")
+        return
+
+    regressions = measure.compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+        print("\n".join(f"  {r}" for r in regressions))
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.tolerance:.0%}" if baseline else "\nNo baseline to compare against")
+
+
+if __name__ == "__main__":
+    main()
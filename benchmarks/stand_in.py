@@ -0,0 +1,149 @@
+"""
+Offline Open-Meteo stand-in: an httpx transport that replays the recorded
+responses in benchmarks/fixtures/ for the forecast, air-quality, archive and
+geocoding APIs, with configurable latency and error injection.
+It is installed as the upstream scheduler's transport, so every service call
+goes through the real rate limiter, retries and caches.
+
+Refresh the fixtures from the live API: python -m benchmarks.stand_in --record
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+from app.services import upstream
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+_APIS = {
+    "api.open-meteo.com": "forecast",
+    "air-quality-api.open-meteo.com": "air_quality",
+    "archive-api.open-meteo.com": "archive",
+    "geocoding-api.open-meteo.com": "geocoding",
+}
+
+
+def fixture_name(request: httpx.Request) -> str:
+    """Fixture for a request: the API plus the block it asks for (current / daily / hourly / search)."""
+    api = _APIS.get(request.url.host, request.url.host)
+    if api == "geocoding":
+        return "geocoding_search"
+    kind = next((k for k in ("current", "daily", "hourly") if k in request.url.params), "current")
+    return f"{api}_{kind}"
+
+
+class OpenMeteoStandIn:
+    """Replays fixtures after `latency_ms` ± `jitter_ms`; fails `error_rate` of requests with `error_status`."""
+
+    def __init__(
+        self,
+        latency_ms: float = 20.0,
+        jitter_ms: float = 5.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int = 42,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._rng = random.Random(seed)
+        self._fixtures = {path.stem: path.read_bytes() for path in FIXTURES_DIR.glob("*.json")}
+        self.requests: dict[str, int] = {}
+        self.errors = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        name = fixture_name(request)
+        self.requests[name] = self.requests.get(name, 0) + 1
+        delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            return httpx.Response(self.error_status, json={"error": True, "reason": "injected"})
+        body = self._fixtures.get(name)
+        if body is None:
+            return httpx.Response(400, json={"error": True, "reason": f"no fixture {name}"})
+        return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+    @contextmanager
+    def installed(self, unthrottled: bool = True):
+        """
+        Route all upstream calls here, with fresh scheduler state. By default the
+        rate limit, daily quota and backoff are lifted so they do not dominate the timings.
+        """
+        overrides = (
+            {
+                "UPSTREAM_RATE_PER_SEC": 1e6,
+                "UPSTREAM_BURST": 1_000_000,
+                "UPSTREAM_DAILY_BUDGET": 0,
+                "UPSTREAM_BACKOFF_BASE_MS": 1,
+            }
+            if unthrottled
+            else {}
+        )
+        saved_settings = {key: getattr(upstream.settings, key) for key in overrides}
+        saved_transport, saved_upstreams = upstream._transport, upstream._upstreams
+        for key, value in overrides.items():
+            setattr(upstream.settings, key, value)
+        upstream._transport = httpx.MockTransport(self.handle)
+        upstream._upstreams = {}
+        try:
+            yield self
+        finally:
+            upstream._transport, upstream._upstreams = saved_transport, saved_upstreams
+            for key, value in saved_settings.items():
+                setattr(upstream.settings, key, value)
+
+
+class _RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests to the live API and saves each successful response as its fixture."""
+
+    def __init__(self):
+        self._live = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._live.handle_async_request(request)
+        body = await response.aread()
+        if response.status_code == 200:
+            name = fixture_name(request)
+            (FIXTURES_DIR / f"{name}.json").write_text(json.dumps(json.loads(body), indent=1), encoding="utf-8")
+            print(f"  recorded {name}")
+        return httpx.Response(response.status_code, headers=response.headers, content=body)
+
+
+async def record(lat: float = 51.5085, lon: float = -0.1257):
+    """Call every upstream endpoint the services use (as the services call them) and save the responses."""
+    from app.config import get_settings
+    from app.services import air_quality_service, weather_service
+
+    settings = get_settings()
+    upstream._transport = _RecordingTransport()
+    await weather_service.get_current_weather("London", lat, lon)
+    await weather_service.get_weather_forecast("London", lat, lon)
+    await weather_service.get_weather_history("London", lat, lon)
+    await air_quality_service.get_current_air_quality("London", lat, lon)
+    await air_quality_service.get_aq_forecast("London", lat, lon)
+    await upstream.get(
+        settings.OPEN_METEO_GEOCODING_URL, params={"name": "London", "count": 1, "language": "en", "format": "json"}
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-Meteo stand-in fixtures")
+    parser.add_argument("--record", action="store_true", help="Re-record the fixtures from the live API")
+    args = parser.parse_args()
+    if args.record:
+        print(f"🎙️ Recording Open-Meteo fixtures into {FIXTURES_DIR}")
+        asyncio.run(record())
+    else:
+        print("\n".join(sorted(path.stem for path in FIXTURES_DIR.glob("*.json"))))
+
+
+if __name__ == "__main__":
+    main()
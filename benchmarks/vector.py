@@ -0,0 +1,22 @@
+"""FAISS search latency and batch throughput for the index the current settings would build."""
+
+from app.ml.index_benchmark import synthetic_corpus
+from app.services import vector_service
+from benchmarks import measure
+
+
+def run(sizes: list[int], dim: int, queries: int, k: int = 5) -> dict:
+    results = {}
+    for n in sizes:
+        corpus, held_out = synthetic_corpus(n, dim, queries)
+        spec = vector_service.resolve_index_spec(n, dim)
+        index = vector_service.make_index(spec, corpus)
+        single = iter(list(held_out) * 2)
+        results[f"vector/search[{n}]"] = {
+            **measure.time_sync(lambda: index.search(next(single)[None, :], k), queries - 1),
+            "index": spec["factory"],
+        }
+        results[f"vector/search_batch[{n}]"] = measure.time_sync(
+            lambda: index.search(held_out, k), 5, ops_per_call=len(held_out)
+        )
+    return results
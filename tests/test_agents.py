@@ -0,0 +1,346 @@
+"""Tests for the agent pipeline."""
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.agents import analysis_agent, ingestion_agent, orchestrator, recommendation_agent
+from app.models.schemas import AirQualityCurrent, AQICategory, CityDataPacket, CityInfo, WeatherCurrent
+from app.services import air_quality_service, ml_service, upstream, weather_service
+from app.services.response_cache import ResponseCache
+from tests.test_trainer import _chunk_source, _synthetic_data
+
+
+def _packet(i: int, temperature: float, wind: float, rain: float, aqi: int, pm25: float) -> CityDataPacket:
+    now = datetime.now(timezone.utc)
+    name = f"City{i}"
+    return CityDataPacket(
+        city=CityInfo(name=name, country="Testland", lat=10.0 + i, lon=20.0 + i),
+        weather=WeatherCurrent(
+            city=name,
+            lat=10.0 + i,
+            lon=20.0 + i,
+            temperature_c=temperature,
+            humidity_pct=30 + i % 60,
+            wind_speed_kmh=wind,
+            rain_mm=rain,
+            pressure_hpa=None if i % 3 == 0 else 1000 + i,
+            condition="Clear",
+            timestamp=now,
+        ),
+        air_quality=AirQualityCurrent(
+            city=name,
+            lat=10.0 + i,
+            lon=20.0 + i,
+            aqi=aqi,
+            category=AQICategory.MODERATE,
+            pm2_5=pm25,
+            pm10=pm25 * 1.5,
+            no2=20.0,
+            o3=40.0,
+            dominant_pollutant="pm2_5",
+            timestamp=now,
+        ),
+        ingested_at=now,
+    )
+
+
+def _packets(n: int = 40) -> list[CityDataPacket]:
+    """Cities spread across every threshold used by the insight and scoring rules."""
+    rng = np.random.default_rng(1)
+    return [
+        _packet(
+            i,
+            temperature=round(float(rng.choice([-20, -12, -6, -1, 3, 18, 31, 36, 41]) + rng.uniform(-0.5, 0.5)), 1),
+            wind=round(float(rng.uniform(0, 80)), 1),
+            rain=round(float(rng.choice([0, 0.7, 3, 12])), 1),
+            aqi=int(rng.choice([20, 60, 120, 170, 250, 350])),
+            pm25=round(float(rng.uniform(1, 150)), 1),
+        )
+        for i in range(n)
+    ]
+
+
+def _without_timestamps(value):
+    if isinstance(value, dict):
+        return {k: _without_timestamps(v) for k, v in value.items() if not k.endswith("_at")}
+    if isinstance(value, list):
+        return [_without_timestamps(v) for v in value]
+    return value
+
+
+@pytest.fixture(params=["fallback", "trained"])
+def models(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(ml_service, "_models", {})
+    if request.param == "trained":
+        from app.ml import streaming
+
+        streaming.train_streaming(_chunk_source(_synthetic_data()), str(tmp_path))
+        monkeypatch.setattr(ml_service.settings, "MODELS_DIR", str(tmp_path))
+        ml_service.load_all_models()
+    return request.param
+
+
+def test_batch_analysis_matches_per_city(models):
+    packets = _packets()
+    analyses = analysis_agent.analyze_city_data_batch(packets)
+    reports = recommendation_agent.generate_recommendations_batch(packets, analyses)
+
+    for data, analysis, report in zip(packets, analyses, reports):
+        single = analysis_agent.analyze_city_data(data)
+        assert _without_timestamps(analysis.model_dump()) == _without_timestamps(single.model_dump())
+        single_report = recommendation_agent.generate_recommendations(data, single)
+        assert _without_timestamps(report.model_dump()) == _without_timestamps(single_report.model_dump())
+
+
+async def test_compare_uses_batch_pipeline_and_keeps_failures(monkeypatch):
+    packets = {p.city.name: p for p in _packets(5)}
+
+    async def fake_resolve(city_name: str, deadline=None) -> CityInfo:
+        if city_name not in packets:
+            raise ValueError(f"Could not geocode city: {city_name}")
+        return packets[city_name].city
+
+    async def fake_ingest(city_info: CityInfo, deadline=None) -> CityDataPacket:
+        return packets[city_info.name]
+
+    monkeypatch.setattr(ingestion_agent, "resolve_city", fake_resolve)
+    monkeypatch.setattr(ingestion_agent, "ingest_resolved_city", fake_ingest)
+    monkeypatch.setattr(ml_service, "_models", {})
+    monkeypatch.setattr(
+        analysis_agent, "analyze_city_data", lambda data: pytest.fail("per-city analysis used by compare")
+    )
+
+    comparison = await orchestrator.compare_cities(["City0", "Atlantis", "City3", "City4"])
+    assert [r.city for r in comparison.cities] == ["City0", "City3", "City4"]
+    assert "Failed to analyze: Atlantis" in comparison.summary
+
+
+async def test_repeat_analysis_is_served_from_report_cache(monkeypatch):
+    data = _packets(1)[0]
+    city = data.city
+
+    async def resolve(city_name: str, deadline=None):
+        return city
+
+    async def ingest(city_info, deadline=None):
+        return data
+
+    monkeypatch.setattr(ingestion_agent, "resolve_city", resolve)
+    monkeypatch.setattr(ingestion_agent, "ingest_resolved_city", ingest)
+    monkeypatch.setattr(ml_service, "_models", {})
+    monkeypatch.setattr(ml_service, "_models_loaded", True)
+    monkeypatch.setattr(orchestrator, "_report_cache", {})
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    monkeypatch.setattr(air_quality_service, "_cache", ResponseCache())
+    weather_key = weather_service._current_cache_key(city.lat, city.lon)
+    weather_service._cache.set(weather_key, data.weather)
+    air_quality_service._cache.set(air_quality_service._current_cache_key(city.lat, city.lon), data.air_quality)
+
+    first = await orchestrator.run_city_analysis(city.name)
+    assert await orchestrator.run_city_analysis(city.name) is first
+
+    # Refreshing an input invalidates the report
+    weather_service._cache.set(weather_key, data.weather.model_copy())
+    assert await orchestrator.run_city_analysis(city.name) is not first
+
+    # Expiry follows the earliest input TTL
+    stale_at = time.time() - ml_service.settings.WEATHER_CACHE_TTL
+    weather_service._cache.entries[weather_key] = (stale_at, data.weather)
+    second = await orchestrator.run_city_analysis(city.name)
+    assert await orchestrator.run_city_analysis(city.name) is not second
+
+    stats = orchestrator.get_report_cache_stats()
+    assert stats["hits"] >= 1 and 0 < stats["hit_rate"] < 1
+
+    # The batch (compare) path is served from the same cache
+    weather_service._cache.set(weather_key, data.weather)
+    third = await orchestrator.run_city_analysis(city.name)
+    assert (await orchestrator.run_batch_analysis([city.name]))[0] is third
+
+    # While an upstream saves quota, reports last as long as the stretched input TTLs
+    monkeypatch.setattr(upstream, "cache_ttl", lambda url, ttl: ttl * 4)
+    weather_service._cache.entries[weather_key] = (
+        time.time() - ml_service.settings.WEATHER_CACHE_TTL - 1,
+        data.weather,
+    )
+    fourth = await orchestrator.run_city_analysis(city.name)
+    assert await orchestrator.run_city_analysis(city.name) is fourth
+
+    # Reports built by the fallback models while the trained ones are still loading are not cached
+    monkeypatch.setattr(orchestrator, "_report_cache", {})
+    monkeypatch.setattr(ml_service, "_models_loaded", False)
+    weather_service._cache.set(weather_key, data.weather)
+    warming = await orchestrator.run_city_analysis(city.name)
+    assert await orchestrator.run_city_analysis(city.name) is not warming
+    assert orchestrator._report_cache == {}
+
+
+def test_compare_stream_emits_reports_as_they_finish(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    packets = {p.city.name: p for p in _packets(3)}
+    delays = {"City0": 0.2, "City1": 0.0, "City2": 0.1}
+    monkeypatch.setattr(ml_service, "_models", {})
+
+    async def fake_analysis(city_name: str, deadline=None):
+        await asyncio.sleep(delays.get(city_name, 0))
+        if city_name not in packets:
+            raise ValueError(f"Could not geocode city: {city_name}")
+        data = packets[city_name]
+        analysis = analysis_agent.analyze_city_data(data)
+        return orchestrator._assemble_report(
+            data, analysis, recommendation_agent.generate_recommendations(data, analysis)
+        )
+
+    monkeypatch.setattr(orchestrator, "run_city_analysis", fake_analysis)
+
+    response = TestClient(app).post("/api/v1/agents/compare/stream", json=["City0", "City1", "Atlantis", "City2"])
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [e["event"] for e in events] == ["report", "error", "report", "report", "summary"]
+    assert [e["data"]["city"] for e in events if e["event"] == "report"] == ["City1", "City2", "City0"]
+    summary = events[-1]["data"]
+    assert summary["failed"] == ["Atlantis"]
+    assert summary["summary"].startswith("Compared 3 cities. City0:")
+
+
+async def test_deadline_degrades_slow_inputs(monkeypatch):
+    from app.agents.deadline import Deadline
+
+    data = _packets(1)[0]
+    city = data.city
+    monkeypatch.setattr(ml_service, "_models", {})
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    monkeypatch.setattr(air_quality_service, "_cache", ResponseCache())
+
+    async def fast_weather(**kwargs):
+        return data.weather
+
+    async def slow(**kwargs):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(weather_service, "get_current_weather", fast_weather)
+    monkeypatch.setattr(air_quality_service, "get_current_air_quality", slow)
+
+    # No AQ at all → model estimate, within budget
+    t0 = time.perf_counter()
+    packet = await ingestion_agent.ingest_resolved_city(city, Deadline(300))
+    assert time.perf_counter() - t0 < 1
+    assert packet.degraded["air_quality"].startswith("model estimate (deadline exceeded)")
+    assert packet.air_quality.pm2_5 > 0
+
+    # Expired AQ entry → served stale
+    stale_at = time.time() - 2 * ml_service.settings.AQ_CACHE_TTL
+    air_quality_service._cache.entries[air_quality_service._current_cache_key(city.lat, city.lon)] = (
+        stale_at,
+        data.air_quality,
+    )
+    packet = await ingestion_agent.ingest_resolved_city(city, Deadline(300))
+    assert packet.air_quality is data.air_quality
+    assert packet.degraded["air_quality"].startswith("stale")
+    assert "weather" not in packet.degraded
+
+    # Weather has no fallback → the deadline surfaces
+    monkeypatch.setattr(weather_service, "get_current_weather", slow)
+    with pytest.raises(TimeoutError):
+        await ingestion_agent.ingest_resolved_city(city, Deadline(100))
+
+
+def test_leaderboard_updates_incrementally_on_refresh(monkeypatch):
+    from app.agents import leaderboard
+
+    packets = _packets(6)
+    catalog = {leaderboard._location_key(p.city.lat, p.city.lon): p.city for p in packets}
+    monkeypatch.setattr(leaderboard, "_catalog", catalog)
+    monkeypatch.setattr(leaderboard, "_entries", {})
+    monkeypatch.setattr(leaderboard, "_by_name", {})
+    monkeypatch.setattr(leaderboard, "_counts", [0] * (leaderboard._BUCKETS + 1))
+    monkeypatch.setattr(leaderboard, "_ties", {})
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    monkeypatch.setattr(air_quality_service, "_cache", ResponseCache())
+
+    def refresh(data):
+        lat, lon = data.city.lat, data.city.lon
+        weather_service._cache.set(weather_service._current_cache_key(lat, lon), data.weather)
+        weather_service._notify_refresh(lat, lon)  # AQ not fetched yet → not ranked
+        air_quality_service._cache.set(air_quality_service._current_cache_key(lat, lon), data.air_quality)
+        air_quality_service._notify_refresh(lat, lon)
+
+    for data in packets:
+        refresh(data)
+    weather_service._notify_refresh(0.0, 0.0)  # Not a catalog city
+
+    def score(p):
+        return round(recommendation_agent._calculate_livability_score(p, None), 1)
+
+    expected = sorted(packets, key=lambda p: (-score(p), p.city.name.lower()))
+    top = leaderboard.get_top(3)
+    assert top.ranked == 6 and top.catalog_size == 6
+    assert [e.city for e in top.entries] == [p.city.name for p in expected[:3]]
+
+    # A refresh for the last-ranked city moves only that city
+    worst = expected[-1]
+    better = worst.model_copy(
+        update={
+            "air_quality": worst.air_quality.model_copy(update={"aqi": 10}),
+            "weather": worst.weather.model_copy(update={"temperature_c": 20.0, "rain_mm": 0.0, "wind_speed_kmh": 5.0}),
+        }
+    )
+    refresh(better)
+    assert leaderboard.get_rank(worst.city.name.upper()).rank == 1
+    assert leaderboard.get_rank(worst.city.name).overall_score == 100.0
+    assert leaderboard.get_top(10).ranked == 6
+    assert [e.rank for e in leaderboard.get_top(10).entries] == list(range(1, 7))
+    assert leaderboard.get_rank("Atlantis") is None
+
+    # Cities sharing a name in different countries are ranked separately
+    namesake = worst.model_copy(update={"city": worst.city.model_copy(update={"country": "Elsewhere", "lat": 1.0})})
+    leaderboard.update_city(namesake.city, namesake.weather, namesake.air_quality)
+    assert leaderboard.get_top(10).ranked == 7
+    assert leaderboard.get_rank(worst.city.name, "elsewhere").country == "Elsewhere"
+    assert leaderboard.get_rank(worst.city.name, worst.city.country).rank == 1
+    assert leaderboard.get_rank(worst.city.name).rank == 1
+
+
+def test_analyze_reports_stage_timings(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    data = _packets(1)[0]
+    city = data.city
+
+    async def resolve(city_name: str, deadline=None):
+        return city
+
+    monkeypatch.setattr(ingestion_agent, "resolve_city", resolve)
+    monkeypatch.setattr(ml_service, "_models", {})
+    monkeypatch.setattr(ml_service, "_models_loaded", True)
+    monkeypatch.setattr(orchestrator, "_report_cache", {})
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    monkeypatch.setattr(air_quality_service, "_cache", ResponseCache())
+    weather_service._cache.set(weather_service._current_cache_key(city.lat, city.lon), data.weather)
+    air_quality_service._cache.set(air_quality_service._current_cache_key(city.lat, city.lon), data.air_quality)
+    client = TestClient(app)
+
+    response = client.post(f"/api/v1/agents/analyze/{city.name}?timings=true")
+    assert response.status_code == 200
+    header = response.headers["Server-Timing"]
+    assert "weather;dur=" in header and "report_cache;dur=" in header and header.split(", ")[-1].startswith("total;")
+    timings = response.json()["timings"]
+    assert {"weather", "air_quality", "risk_classifier", "recommendations"} <= set(timings["stages_ms"])
+    assert timings["cache_hits"] == {"report_cache": False, "weather": True, "air_quality": True}
+
+    cached = client.post(f"/api/v1/agents/analyze/{city.name}")
+    assert (
+        "report_cache;dur=" in cached.headers["Server-Timing"] and 'desc="cache hit"' in cached.headers["Server-Timing"]
+    )
+    assert cached.json()["timings"] is None
@@ -1,5 +1,7 @@
 """Tests for API endpoints."""
 
+import time
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
@@ -77,3 +79,106 @@ def test_predict_pollution():
     })
     assert response.status_code == 200
     assert "predicted_pm25" in response.json()
+
+
+def test_metrics_exposition():
+    client.get("/api/v1/cities/search?q=London")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/cities/search",status="200"}' in body
+    assert 'le="+Inf"' in body
+    assert 'cache_hits_total{namespace="weather"}' in body
+
+
+def test_profiling_single_request_and_aggregation(monkeypatch):
+    from app.services import ml_service, profiler
+
+    assert client.get("/api/v1/profiles").status_code == 404  # Off without a token
+    monkeypatch.setattr(profiler.settings, "PROFILING_TOKEN", "s3cret")
+    monkeypatch.setattr(profiler.settings, "PROFILING_INTERVAL_MS", 1.0)
+
+    predict = ml_service.predict_aqi_risk
+
+    def slow_prediction(*args):
+        time.sleep(0.05)
+        return predict(*args)
+
+    monkeypatch.setattr(ml_service, "predict_aqi_risk", slow_prediction)
+    body = {"temperature": 20, "humidity": 50, "rain": 0, "pressure": 1013, "wind_speed": 3, "month": 6, "hour": 12}
+    assert "x-profile-id" not in client.post("/api/v1/predict/aqi-risk", json=body, headers={"X-Profile": "wrong"}).headers
+
+    assert "x-profile-id" not in client.post("/api/v1/predict/aqi-risk?profile=s3cret", json=body).headers
+    profiled = client.post("/api/v1/predict/aqi-risk", json=body, headers={"X-Profile": "s3cret"})
+    profile_id = profiled.headers["x-profile-id"]
+    assert client.get(f"/api/v1/profiles/{profile_id}").status_code == 403
+    report = client.get(f"/api/v1/profiles/{profile_id}", headers={"X-Profile": "s3cret"}).json()
+    assert report["complete"] and report["requests"] == 1 and report["samples"] > 0
+    assert any("slow_prediction" in frame["function"] for frame in report["top"])
+
+    headers = {"X-Profile": "s3cret"}
+    session = client.post("/api/v1/profiles/aggregate?prefix=/api/v1/predict&requests=2", headers=headers).json()
+    for _ in range(3):
+        client.post("/api/v1/predict/aqi-risk", json=body)
+    aggregate = client.get(f"/api/v1/profiles/{session['profile_id']}", headers=headers).json()
+    assert aggregate["complete"] and aggregate["requests"] == 2
+    collapsed = client.get(f"/api/v1/profiles/{session['profile_id']}?format=collapsed", headers=headers).text
+    assert "slow_prediction (tests/test_api.py" in collapsed and collapsed.rstrip().split(" ")[-1].isdigit()
+
+
+def test_readiness_waits_for_background_warm_up(monkeypatch):
+    import threading
+
+    from app.services import warmup
+
+    release = threading.Event()
+    monkeypatch.setattr(warmup, "PHASES", {"models": lambda: release.wait(5), "catalog": lambda: None})
+    monkeypatch.setattr(warmup, "_ready_after_ms", None)
+    with TestClient(app) as live_client:
+        assert live_client.get("/health").status_code == 200  # Live while warming up
+        pending = live_client.get("/ready")
+        assert pending.status_code == 503 and pending.json()["phases"]["models"]["state"] == "running"
+
+        release.set()
+        for _ in range(100):
+            if live_client.get("/ready").status_code == 200:
+                break
+            time.sleep(0.01)
+        startup = live_client.get("/api/v1/status").json()["startup"]
+    assert startup["ready"] and startup["imports_ms"] > 0
+    assert startup["phases"]["models"]["state"] == "done" and startup["phases"]["models"]["ms"] is not None
+
+
+def test_memory_diagnostics_reports_components_and_rss():
+    from app.services import memory, weather_service
+
+    weather_service._cache.entries["memory-test"] = (0.0, "x" * 100_000)
+    try:
+        report = client.get("/api/v1/diagnostics/memory").json()
+    finally:
+        del weather_service._cache.entries["memory-test"]
+    assert report["peak_rss_bytes"] >= report["rss_bytes"] > 0 and report["rss_history"]
+    components = report["components"]
+    assert {"weather_cache", "report_cache", "models", "city_catalog", "faiss_index", "city_docs", "embedder"} <= set(
+        components
+    )
+    assert components["weather_cache"]["bytes"] > 100_000
+    assert report["accounted_bytes"] == sum(c["bytes"] for c in components.values())
+    assert memory.deep_sizeof({"a": [1, 2], "b": [1, 2]}) < memory.deep_sizeof({"a": [1, 2], "b": [3, 4]})
+
+
+def test_model_sizes_follow_reloaded_models(monkeypatch):
+    from sklearn.preprocessing import StandardScaler
+
+    from app.services import ml_service
+
+    monkeypatch.setattr(ml_service, "_models", {"cluster_scaler": StandardScaler().fit([[0.0], [1.0]])})
+    monkeypatch.setattr(ml_service, "_model_bytes", {})
+    small = ml_service.get_memory_stats()["models"]["cluster_scaler"]
+
+    ml_service._models["cluster_scaler"] = StandardScaler().fit([[float(i)] * 200 for i in range(3)])
+    assert ml_service.get_memory_stats()["models"]["cluster_scaler"] > small
+
+    ml_service._models.clear()
+    assert ml_service.get_memory_stats()["entries"] == 0 and ml_service._model_bytes == {}
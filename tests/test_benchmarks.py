@@ -0,0 +1,83 @@
+"""Tests for the offline Open-Meteo stand-in and baseline comparison used by benchmarks/."""
+
+import httpx
+import pytest
+
+from app.services import air_quality_service, geocoding_service, upstream, weather_service
+from app.services.response_cache import ResponseCache
+from benchmarks import load, measure
+from benchmarks.stand_in import OpenMeteoStandIn
+
+
+@pytest.fixture
+def empty_caches(monkeypatch):
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    monkeypatch.setattr(air_quality_service, "_cache", ResponseCache())
+    monkeypatch.setattr(geocoding_service, "_geocode_cache", {})
+
+
+async def test_stand_in_fixtures_parse_through_every_service(empty_caches):
+    stand_in = OpenMeteoStandIn(latency_ms=0, jitter_ms=0)
+    with stand_in.installed():
+        weather = await weather_service.get_current_weather("London", 51.5, -0.12)
+        forecast = await weather_service.get_weather_forecast("London", 51.5, -0.12)
+        history = await weather_service.get_weather_history("London", 51.5, -0.12)
+        aq = await air_quality_service.get_current_air_quality("London", 51.5, -0.12)
+        aq_forecast = await air_quality_service.get_aq_forecast("London", 51.5, -0.12)
+        city = await geocoding_service.geocode_city("Xqzvwk")  # Not in the local catalog
+
+    assert weather.temperature_c == 14.2 and len(forecast.forecast_days) == 7 and len(history.daily_data) == 31
+    assert aq.pm2_5 == 11.6 and len(aq_forecast.forecast_days) == 5
+    assert city.name == "London"
+    assert stand_in.requests == {
+        "forecast_current": 1,
+        "forecast_daily": 1,
+        "archive_daily": 1,
+        "air_quality_current": 1,
+        "air_quality_hourly": 1,
+        "geocoding_search": 1,
+    }
+    assert upstream._transport is None  # Uninstalled afterwards
+
+
+async def test_stand_in_injects_errors(empty_caches, monkeypatch):
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_MAX_RETRIES", 0)
+    stand_in = OpenMeteoStandIn(latency_ms=0, jitter_ms=0, error_rate=1.0, error_status=502)
+    with stand_in.installed(), pytest.raises(httpx.HTTPStatusError):
+        await weather_service.get_current_weather("London", 51.5, -0.12)
+    assert stand_in.errors == 1
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {
+        "a": {"p50_ms": 10.0, "p99_ms": 20.0, "throughput_per_s": 100.0},
+        "b": {"p50_ms": 0.01, "p99_ms": 0.02, "throughput_per_s": 1000.0},
+    }
+    results = {
+        "a": {"p50_ms": 11.0, "p99_ms": 30.0, "throughput_per_s": 70.0},
+        "b": {"p50_ms": 0.03, "p99_ms": 0.04, "throughput_per_s": 900.0},  # Within timer noise
+        "new": {"p50_ms": 1.0, "p99_ms": 2.0, "throughput_per_s": 1.0},
+    }
+    regressions = measure.compare(results, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("a: p99_ms") and "throughput" in regressions[1]
+
+
+def test_load_mix_and_zipf_popularity():
+    assert load.parse_mix("analyze=3,compare") == {"analyze": 3.0, "compare": 1.0}
+    with pytest.raises(ValueError):
+        load.parse_mix("analyse=1")
+
+    pick = load.zipf_picker([f"city{i}" for i in range(100)], exponent=1.1, seed=1)
+    draws = [pick() for _ in range(5000)]
+    assert draws.count("city0") > 5 * draws.count("city9") > 0  # Rank 1 is ~12x as popular as rank 10
+    cities = load._request("compare", pick)[2]
+    assert len(cities) == len(set(cities)) >= 2
+
+
+def test_compare_flags_peak_rss_growth():
+    baseline = {"memory.routes": {"peak_rss_mb": 100.0}, "memory.vector": {"peak_rss_mb": 10.0}}
+    results = {"memory.routes": {"peak_rss_mb": 140.0}, "memory.vector": {"peak_rss_mb": 14.0}}  # +4 MiB is noise
+    assert measure.compare(results, baseline, tolerance=0.25) == [
+        "memory.routes: peak_rss_mb 140.0 > 100.0 (+25% allowed)"
+    ]
@@ -0,0 +1,99 @@
+"""Tests for the background analysis job service."""
+
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from app.agents import analysis_agent, orchestrator, recommendation_agent
+from app.models.schemas import JobStatus
+from app.services import job_service, ml_service
+from tests.test_agents import _packets
+
+
+def _report(city_name: str):
+    data = _packets(1)[0]
+    data.city.name = city_name
+    analysis = analysis_agent.analyze_city_data(data)
+    return orchestrator._assemble_report(data, analysis, recommendation_agent.generate_recommendations(data, analysis))
+
+
+@pytest.fixture
+async def jobs(monkeypatch):
+    monkeypatch.setattr(job_service.settings, "JOB_WORKERS", 2)
+    monkeypatch.setattr(job_service.settings, "JOB_QUEUE_SIZE", 10)
+    monkeypatch.setattr(job_service, "_jobs", OrderedDict())
+    monkeypatch.setattr(job_service, "_workers", [])
+    monkeypatch.setattr(job_service, "_loop", None)
+    yield job_service
+    await job_service.shutdown()
+
+
+async def test_job_runs_on_bounded_pool_with_partial_results(jobs, monkeypatch):
+    running = 0
+    peak = 0
+    release = asyncio.Event()
+
+    async def fake_analysis(city_name: str, deadline=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        try:
+            if city_name != "Fast":
+                await release.wait()
+            if city_name == "Atlantis":
+                raise ValueError(f"Could not geocode city: {city_name}")
+            return _report(city_name)
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(orchestrator, "run_city_analysis", fake_analysis)
+    monkeypatch.setattr(ml_service, "_models", {})
+
+    job = await jobs.submit_job(["Fast", "Lima", "Atlantis", "Oslo", "Delhi"])
+    assert job.status == JobStatus.QUEUED and job.total == 5
+
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+        if jobs.get_job(job.job_id).completed:
+            break
+    partial = jobs.get_job(job.job_id)
+    assert partial.status == JobStatus.RUNNING and partial.completed == 1
+    assert [r.city for r in jobs.get_job_results(job.job_id).reports] == ["Fast"]
+
+    release.set()
+    for _ in range(50):
+        await asyncio.sleep(0.01)
+        if jobs.get_job(job.job_id).status == JobStatus.COMPLETED:
+            break
+    done = jobs.get_job_results(job.job_id)
+    assert done.status == JobStatus.COMPLETED and done.progress == 1
+    assert [r.city for r in done.reports] == ["Fast", "Lima", "Oslo", "Delhi"]
+    assert list(done.errors) == ["Atlantis"]
+    assert peak == 2
+
+
+async def test_submission_rejected_when_queue_is_full(jobs, monkeypatch):
+    async def never_finishes(city_name: str):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(orchestrator, "run_city_analysis", never_finishes)
+    await jobs.submit_job([f"City{i}" for i in range(10)])
+    await asyncio.sleep(0)  # Workers pick up two items
+    with pytest.raises(job_service.QueueFullError):
+        await jobs.submit_job([f"Town{i}" for i in range(5)])
+
+
+async def test_empty_job_is_rejected(jobs, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.services import geocoding_service
+
+    with pytest.raises(ValueError):
+        await jobs.submit_job([])
+    assert len(jobs._jobs) == 0
+
+    monkeypatch.setattr(geocoding_service, "get_all_cities", lambda: [])
+    response = TestClient(app).post("/api/v1/agents/jobs", json={})
+    assert response.status_code == 422
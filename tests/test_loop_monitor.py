@@ -0,0 +1,32 @@
+"""Tests for the event-loop lag monitor."""
+
+import asyncio
+import time
+
+from app.services import loop_monitor, metrics
+
+
+def _hold_the_loop(seconds: float):
+    time.sleep(seconds)  # Synchronous work on the event loop
+
+
+async def test_stall_is_counted_and_its_stack_logged_in_debug(monkeypatch, capsys):
+    monkeypatch.setattr(loop_monitor.settings, "DEBUG", True)
+    monkeypatch.setattr(loop_monitor.settings, "LOOP_MONITOR_INTERVAL_MS", 10)
+    monkeypatch.setattr(loop_monitor.settings, "LOOP_BLOCK_THRESHOLD_MS", 50)
+    stalls_before = metrics.EVENT_LOOP_STALLS._values.get((), 0)
+
+    loop_monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        _hold_the_loop(0.3)
+        await asyncio.sleep(0.05)
+    finally:
+        await loop_monitor.stop()
+
+    stats = loop_monitor.get_stats()
+    assert stats["stalls"] >= 1 and stats["max_lag_ms"] >= 200 and not stats["running"]
+    assert metrics.EVENT_LOOP_STALLS._values[()] > stalls_before
+    assert "event_loop_lag_seconds_bucket" in metrics.render()
+    output = capsys.readouterr().out
+    assert "Event loop blocked" in output and "_hold_the_loop" in output
@@ -0,0 +1,154 @@
+"""Tests for the ML training pipelines."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ml import benchmarking, streaming, trainer
+from app.services import ml_service
+
+
+def _synthetic_data(n: int = 3000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    cities = ["London", "Delhi", "Moscow", "Dubai", "Lima", "Oslo"]
+    wind = rng.uniform(0, 40, n)
+    return pd.DataFrame(
+        {
+            "date": pd.date_range("2024-01-01", periods=n, freq="h").astype(str),
+            "city": rng.choice(cities, n),
+            "temperature": rng.uniform(-10, 40, n),
+            "humidity": rng.uniform(10, 100, n),
+            "rain": rng.exponential(0.5, n),
+            "pressure": rng.normal(1013, 5, n),
+            "wind_speed": wind,
+            "pm10": rng.uniform(5, 150, n),
+            "pm2_5": np.clip(80 - wind * 1.5 + rng.normal(0, 5, n), 1, None),
+            "no2": rng.uniform(5, 80, n),
+            "ozone": rng.uniform(10, 120, n),
+        }
+    )
+
+
+def _chunk_source(df: pd.DataFrame, size: int = 500, fail_after: int | None = None):
+    def _iter():
+        for i, start in enumerate(range(0, len(df), size)):
+            if fail_after is not None and i >= fail_after:
+                raise RuntimeError("interrupted")
+            yield df.iloc[start : start + size]
+
+    return _iter
+
+
+def test_streaming_artifacts_load_in_ml_service(tmp_path, monkeypatch):
+    df = _synthetic_data()
+    metrics = streaming.train_streaming(_chunk_source(df), str(tmp_path), checkpoint_every=2)
+    assert metrics["holdout_rows"] > 0
+    assert not (tmp_path / streaming.CHECKPOINT_FILE).exists()
+
+    monkeypatch.setattr(ml_service.settings, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(ml_service, "_models", {})
+    ml_service.load_all_models()
+    assert all(ml_service.get_models_status().values())
+
+    risk = ml_service.predict_aqi_risk(25, 55, 0, 1013, 10, 6, 14)
+    assert 0 <= risk.confidence <= 1
+    assert ml_service.predict_pollution(25, 55, 0, 1013, 10, 6, 14).predicted_pm25 >= 0
+    assert ml_service.predict_cluster(20, 60, 1.0, 15).cluster_id in ml_service.CLUSTER_INFO
+
+
+def test_streaming_resumes_from_checkpoint(tmp_path):
+    df = _synthetic_data()
+    with pytest.raises(RuntimeError):
+        streaming.train_streaming(_chunk_source(df, fail_after=4), str(tmp_path), checkpoint_every=2)
+    assert (tmp_path / streaming.CHECKPOINT_FILE).exists()
+
+    streaming.train_streaming(_chunk_source(df), str(tmp_path), checkpoint_every=2)
+    assert (tmp_path / "risk_xgboost.joblib").exists()
+    assert not (tmp_path / streaming.CHECKPOINT_FILE).exists()
+
+
+def test_select_best_respects_latency_budget():
+    rows = [
+        {"task": "classification", "name": "big", "accuracy": 0.9, "p99_ms": 12.0},
+        {"task": "classification", "name": "small", "accuracy": 0.8, "p99_ms": 2.0},
+        {"task": "classification", "name": "tiny", "accuracy": 0.7, "p99_ms": 1.0},
+    ]
+    assert benchmarking.select_best(rows, latency_budget_ms=5.0)["name"] == "small"
+    assert benchmarking.select_best(rows, latency_budget_ms=0.5)["name"] == "tiny"
+
+
+def test_benchmark_mode_writes_report(tmp_path, monkeypatch):
+    from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestClassifier, RandomForestRegressor
+
+    monkeypatch.setattr(trainer, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(benchmarking, "SINGLE_ROW_REPEATS", 5)
+    monkeypatch.setattr(
+        trainer,
+        "classifier_candidates",
+        lambda: {"rf_5": RandomForestClassifier(n_estimators=5, random_state=42)},
+    )
+    monkeypatch.setattr(
+        trainer,
+        "regressor_candidates",
+        lambda: {
+            "rf_5": RandomForestRegressor(n_estimators=5, random_state=42),
+            "hgb_10": HistGradientBoostingRegressor(max_iter=10, random_state=42),
+        },
+    )
+    trainer.train_all_models(_synthetic_data(600), benchmark=True, latency_budget_ms=1000)
+
+    report = json.loads((tmp_path / trainer.BENCHMARK_REPORT_FILE).read_text())
+    assert len(report["regression"]["candidates"]) == 2 * len(benchmarking.INPUT_DTYPES)
+    for row in report["classification"]["candidates"]:
+        assert {"p50_ms", "p99_ms", "batch_rows_per_s", "artifact_bytes", "load_memory_bytes"} <= row.keys()
+    assert report["classification"]["selected"]["name"] == "rf_5"
+
+
+def test_streaming_cleans_with_dataset_wide_statistics(monkeypatch):
+    monkeypatch.setattr(streaming, "RESERVOIR_SIZE", 1000)
+    df = _synthetic_data()
+    state = streaming._new_state()
+    for chunk in _chunk_source(df)():
+        streaming._stats_pass_step(state, chunk)
+    streaming._finish_stats(state)
+
+    low, high = state["clip_bounds"]["temperature"]
+    assert low == pytest.approx(df["temperature"].quantile(0.01), abs=1.5)
+    assert high == pytest.approx(df["temperature"].quantile(0.99), abs=1.5)
+    assert state["fill_values"]["humidity"] == pytest.approx(df["humidity"].median(), abs=3)
+
+    # A chunk's own extremes are kept when they fall inside the dataset-wide bounds
+    chunk = df.iloc[:500].copy()
+    chunk["temperature"] = np.linspace(0, 10, len(chunk))
+    prepared = streaming._prepare_chunk(chunk, state)
+    assert prepared["temperature"].min() == 0 and prepared["temperature"].max() == 10
+
+
+def test_learn_pass_shuffles_chunk_order_per_epoch():
+    chunks = [pd.DataFrame({"i": [i]}) for i in range(20)]
+    first = [c["i"][0] for c in streaming._shuffled(iter(chunks), np.random.default_rng([streaming.SEED, 0]))]
+    second = [c["i"][0] for c in streaming._shuffled(iter(chunks), np.random.default_rng([streaming.SEED, 1]))]
+    assert sorted(first) == sorted(second) == list(range(20))
+    assert first != list(range(20)) and first != second
+
+
+def test_benchmark_selection_is_ignored_after_a_later_retrain(tmp_path, monkeypatch):
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+    monkeypatch.setattr(trainer, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(benchmarking, "SINGLE_ROW_REPEATS", 5)
+    monkeypatch.setattr(trainer, "classifier_candidates", lambda: {"rf_5": RandomForestClassifier(n_estimators=5)})
+    monkeypatch.setattr(trainer, "regressor_candidates", lambda: {"rf_5": RandomForestRegressor(n_estimators=5)})
+    monkeypatch.setattr(ml_service.settings, "MODELS_DIR", str(tmp_path))
+    monkeypatch.setattr(ml_service, "_models", {})
+    monkeypatch.setattr(ml_service, "_input_dtypes", {})
+
+    trainer.train_all_models(_synthetic_data(600), benchmark=True, latency_budget_ms=1000)
+    ml_service.load_all_models()
+    assert set(ml_service._input_dtypes) == {"risk_classifier", "pollution_regressor"}
+
+    streaming.train_streaming(_chunk_source(_synthetic_data()), str(tmp_path))
+    ml_service.load_all_models()
+    assert ml_service._input_dtypes == {}
@@ -0,0 +1,281 @@
+"""Tests for the rate-limited, retrying upstream scheduler."""
+
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from app.models.schemas import WeatherCurrent
+from app.services import metrics, upstream, weather_service
+from app.services.response_cache import ResponseCache
+
+URL = "https://api.open-meteo.com/v1/forecast"
+
+
+@pytest.fixture
+def mock_upstream(monkeypatch):
+    """Route upstream calls to a handler; returns the list of requests it received."""
+    calls = []
+    monkeypatch.setattr(upstream, "_upstreams", {})
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_BACKOFF_BASE_MS", 1)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_MAX_RETRIES", 2)
+
+    def install(handler):
+        def record(request):
+            calls.append(request)
+            return handler(request)
+
+        monkeypatch.setattr(upstream, "_transport", httpx.MockTransport(record))
+        return calls
+
+    return install
+
+
+async def test_retries_throttled_and_failing_responses(mock_upstream):
+    responses = iter([httpx.Response(429, headers={"Retry-After": "0"}), httpx.Response(503)])
+    calls = mock_upstream(lambda request: next(responses, httpx.Response(200, json={"ok": True})))
+
+    resp = await upstream.get(URL, params={"latitude": 1})
+    assert resp.json() == {"ok": True}
+    assert len(calls) == 3
+    stats = upstream.get_stats()["api.open-meteo.com"]
+    assert stats["retries"] == 2 and stats["circuit"] == "closed"
+
+
+async def test_client_errors_are_not_retried(mock_upstream):
+    calls = mock_upstream(lambda request: httpx.Response(400))
+    with pytest.raises(httpx.HTTPStatusError):
+        await upstream.get(URL)
+    assert len(calls) == 1
+
+
+async def test_transport_errors_are_retried(mock_upstream):
+    outcomes = iter([httpx.ConnectError("refused"), httpx.ReadTimeout("slow")])
+
+    def handler(request):
+        error = next(outcomes, None)
+        if error is not None:
+            raise error
+        return httpx.Response(200, json={"ok": True})
+
+    calls = mock_upstream(handler)
+    resp = await upstream.get(URL)
+    assert resp.json() == {"ok": True} and len(calls) == 3
+    stats = upstream.get_stats()["api.open-meteo.com"]
+    assert stats["retries"] == 2 and stats["in_flight"] == 0
+
+
+async def test_cancellation_under_a_deadline_releases_the_slot(mock_upstream):
+    async def slow(request):
+        await asyncio.sleep(5)
+        return httpx.Response(200)
+
+    mock_upstream(slow)
+    in_flight_before = metrics.UPSTREAM_IN_FLIGHT._values.get(("api.open-meteo.com",), 0)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(upstream.get(URL), timeout=0.05)
+    stats = upstream.get_stats()["api.open-meteo.com"]
+    assert stats["in_flight"] == 0 and stats["failures"] == 0
+    assert metrics.UPSTREAM_IN_FLIGHT._values[("api.open-meteo.com",)] == in_flight_before
+
+
+async def test_tight_request_deadline_does_not_count_as_upstream_overload(mock_upstream, monkeypatch):
+    from app.agents import ingestion_agent
+    from app.agents.deadline import Deadline
+    from app.models.schemas import CityInfo
+    from app.services import air_quality_service
+
+    async def slow(request):
+        if request.extensions["timeout"]["read"] < 0.5:
+            raise httpx.ReadTimeout("slow")  # What a real transport does with a short timeout
+        await asyncio.sleep(0.5)
+        return httpx.Response(200)
+
+    calls = mock_upstream(slow)
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    monkeypatch.setattr(air_quality_service, "_cache", ResponseCache())
+    city = CityInfo(name="Oslo", country="Norway", lat=59.91, lon=10.75)
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            await ingestion_agent.ingest_resolved_city(city, Deadline(400))
+
+    assert len(calls) == 6  # One weather and one AQ call per request, none retried
+    for stats in upstream.get_stats().values():
+        assert stats["failures"] == 0 and stats["retries"] == 0 and stats["circuit"] == "closed"
+        assert stats["concurrency_limit"] == upstream.settings.UPSTREAM_CONCURRENCY_INITIAL
+
+
+async def test_breaker_opens_and_fails_fast(mock_upstream):
+    calls = mock_upstream(lambda request: httpx.Response(500))
+    with pytest.raises(httpx.HTTPStatusError):
+        await upstream.get(URL)
+    assert len(calls) == 3
+
+    with pytest.raises(upstream.CircuitOpenError):
+        await upstream.get(URL)
+    assert len(calls) == 3
+    assert upstream.get_stats()["api.open-meteo.com"]["circuit"] == "open"
+
+
+async def test_open_circuit_serves_stale_cache(mock_upstream, monkeypatch):
+    mock_upstream(lambda request: httpx.Response(500))
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    stale = WeatherCurrent(
+        city="Oslo",
+        lat=59.91,
+        lon=10.75,
+        temperature_c=4.0,
+        humidity_pct=80.0,
+        wind_speed_kmh=10.0,
+        rain_mm=0.0,
+        condition="Cloudy",
+        timestamp=datetime.now(timezone.utc),
+    )
+    weather_service._cache.entries[weather_service._current_cache_key(59.91, 10.75)] = (time.time() - 3600, stale)
+    _, state = upstream._upstream_for(URL)
+    state.breaker.opened_at = time.monotonic()
+
+    result = await weather_service.get_current_weather("Oslo", 59.91, 10.75)
+    assert result is stale
+
+
+def test_response_cache_keeps_expired_entries_until_lru_eviction(monkeypatch):
+    monkeypatch.setattr(weather_service.settings, "RESPONSE_CACHE_MAX_ENTRIES", 3)
+    monkeypatch.setattr(weather_service.settings, "STALE_CACHE_MAX_AGE_S", 3600)
+    cache = ResponseCache()
+    now = time.time()
+    cache.entries.update({"forecast": (now - 600, "f"), "current": (now - 60, "c"), "old": (now - 7200, "o")})
+
+    assert cache.get("forecast", 300) is None
+    assert cache.get("current", 300) == "c"
+    assert list(cache.entries) == ["forecast", "old", "current"]  # Expired entries stay; a hit is most recent
+    assert cache.stale_or_raise("forecast", RuntimeError()) == "f"
+    with pytest.raises(RuntimeError):
+        cache.stale_or_raise("old", RuntimeError())  # Past STALE_CACHE_MAX_AGE_S
+
+    cache.set("new", 1)
+    assert list(cache.entries) == ["old", "current", "new"]
+    assert cache.stats()["evictions"] == 1 and cache.stats()["hits"] == 1
+
+
+async def test_open_circuit_serves_stale_forecasts(mock_upstream, monkeypatch):
+    from app.models.schemas import AirQualityForecast, WeatherForecast
+    from app.services import air_quality_service
+
+    mock_upstream(lambda request: httpx.Response(500))
+    monkeypatch.setattr(weather_service, "_cache", ResponseCache())
+    monkeypatch.setattr(air_quality_service, "_cache", ResponseCache())
+    now = datetime.now(timezone.utc)
+    weather = WeatherForecast(city="Oslo", lat=59.91, lon=10.75, forecast_days=[], generated_at=now)
+    aq = AirQualityForecast(city="Oslo", lat=59.91, lon=10.75, forecast_days=[], generated_at=now)
+    weather_service._cache.entries["weather_forecast_59.91_10.75_3"] = (time.time() - 7200, weather)
+    air_quality_service._cache.entries["aq_forecast_59.91_10.75_3"] = (time.time() - 7200, aq)
+    for url in (URL, upstream.settings.OPEN_METEO_AQ_URL):
+        upstream._upstream_for(url)[1].breaker.opened_at = time.monotonic()
+
+    assert await weather_service.get_weather_forecast("Oslo", 59.91, 10.75, days=3) is weather
+    assert await air_quality_service.get_aq_forecast("Oslo", 59.91, 10.75, days=3) is aq
+
+
+async def test_interactive_requests_go_before_background(mock_upstream, monkeypatch):
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_RATE_PER_SEC", 50.0)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_BURST", 1)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_INTERACTIVE_RESERVE", 0.0)
+    calls = mock_upstream(lambda request: httpx.Response(200))
+
+    async def background_call(i):
+        with upstream.background("test"):
+            await upstream.get(URL, params={"lane": "background", "i": i})
+
+    await upstream.get(URL, params={"lane": "warmup"})  # Drain the burst
+    background_tasks = [asyncio.create_task(background_call(i)) for i in range(3)]
+    await asyncio.sleep(0)
+    await upstream.get(URL, params={"lane": "interactive"})
+    await asyncio.gather(*background_tasks)
+
+    lanes = [request.url.params["lane"] for request in calls]
+    assert lanes[:2] == ["warmup", "interactive"]
+
+
+async def test_adaptive_limit_caps_in_flight_and_backs_off(mock_upstream, monkeypatch):
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_RATE_PER_SEC", 1000.0)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_BURST", 100)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_CONCURRENCY_INITIAL", 4)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_MAX_RETRIES", 0)
+    in_flight = 0
+    peak = 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.005)
+        in_flight -= 1
+        return httpx.Response(503 if request.url.params.get("fail") else 200)
+
+    mock_upstream(handler)
+    await asyncio.gather(*(upstream.get(URL, params={"i": i}) for i in range(20)))
+    limiter = upstream._upstreams["api.open-meteo.com"].limiter
+    assert limiter.limit > 4  # Healthy responses raised the cap
+    assert 4 <= peak <= int(limiter.limit) < 20
+
+    before = limiter.limit
+    with pytest.raises(httpx.HTTPStatusError):
+        await upstream.get(URL, params={"fail": 1})
+    assert limiter.limit == pytest.approx(before * 0.5)
+    assert limiter.in_flight == 0
+
+
+async def test_probe_cancelled_while_queued_frees_the_half_open_circuit(mock_upstream, monkeypatch):
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_CONCURRENCY_INITIAL", 1)
+    release = asyncio.Event()
+
+    async def handler(request):
+        if request.url.params.get("slow"):
+            await release.wait()
+        return httpx.Response(200)
+
+    mock_upstream(handler)
+    occupant = asyncio.create_task(upstream.get(URL, params={"slow": 1}))  # Holds the only slot
+    await asyncio.sleep(0.01)
+    breaker = upstream._upstreams["api.open-meteo.com"].breaker
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1  # Half-open
+
+    probe = asyncio.create_task(upstream.get(URL))
+    await asyncio.sleep(0.01)  # Marked as the trial request, queued behind the occupant
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    next_trial = asyncio.create_task(upstream.get(URL))  # Not rejected with CircuitOpenError
+    await asyncio.sleep(0.01)
+    release.set()
+    await occupant
+    assert (await next_trial).status_code == 200
+    assert breaker.state == "closed"
+
+
+async def test_quota_pauses_background_then_serves_stale(mock_upstream, monkeypatch):
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_DAILY_BUDGET", 4)
+    monkeypatch.setattr(upstream.settings, "UPSTREAM_QUOTA_SAVING_AT", 0.5)
+    calls = mock_upstream(lambda request: httpx.Response(200))
+
+    upstream.set_caller("route:/api/v1/weather/current/{city}")
+    await upstream.get(URL)
+    with upstream.background("jobs"):
+        await upstream.get(URL)
+        assert upstream.cache_ttl(URL, 300) == 1200  # Saving: TTLs stretch
+        with pytest.raises(upstream.QuotaExhaustedError):
+            await upstream.get(URL)  # Saving: background paused
+    await upstream.get(URL)
+    await upstream.get(URL)
+    with pytest.raises(upstream.QuotaExhaustedError):
+        await upstream.get(URL)  # Exhausted: interactive calls stop too
+
+    quota = upstream.get_stats()["api.open-meteo.com"]["quota"]
+    assert len(calls) == 4
+    assert quota["state"] == "exhausted"
+    assert quota["by_caller"] == {"route:/api/v1/weather/current/{city}": 3, "jobs": 1}
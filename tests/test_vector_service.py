@@ -0,0 +1,288 @@
+"""Tests for the FAISS vector search service."""
+
+import asyncio
+import hashlib
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pytest
+
+from app.services import vector_service
+
+CITIES = [
+    {
+        "name": "London",
+        "country": "United Kingdom",
+        "lat": 51.5,
+        "lon": -0.1,
+        "population": 8982000,
+        "continent": "Europe",
+    },
+    {"name": "Delhi", "country": "India", "lat": 28.6, "lon": 77.2, "population": 32941000, "continent": "Asia"},
+    {
+        "name": "Lima",
+        "country": "Peru",
+        "lat": -12.0,
+        "lon": -77.0,
+        "population": 10719000,
+        "continent": "South America",
+    },
+    {"name": "Oslo", "country": "Norway", "lat": 59.9, "lon": 10.7, "population": 709000, "continent": "Europe"},
+]
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for SentenceTransformer: hashes words into a small vector."""
+
+    dim = 256
+
+    def __init__(self):
+        self.encoded: list[str] = []
+
+    def encode(self, texts, show_progress_bar=False):
+        self.encoded.extend(texts)
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            for word in text.lower().replace(",", " ").replace(".", " ").split():
+                out[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        return out
+
+
+@pytest.fixture
+def fake_embedder(tmp_path, monkeypatch):
+    embedder = FakeEmbedder()
+    monkeypatch.setattr(vector_service.settings, "FAISS_INDEX_PATH", str(tmp_path / "faiss_index"))
+    monkeypatch.setattr(vector_service, "_embedder", embedder)
+    monkeypatch.setattr(vector_service, "_index", None)
+    monkeypatch.setattr(vector_service, "_index_mmapped", False)
+    monkeypatch.setattr(vector_service, "_city_docs", {})
+    monkeypatch.setattr(vector_service, "_doc_ids", {})
+    monkeypatch.setattr(vector_service, "_tombstones", set())
+    monkeypatch.setattr(vector_service, "_next_id", 0)
+    monkeypatch.setattr(vector_service, "_facets", {"continent": {}, "country": {}})
+    monkeypatch.setattr(vector_service, "_by_population", [])
+    monkeypatch.setattr(vector_service, "_text_store", b"")
+    monkeypatch.setattr(vector_service, "_query_cache", vector_service.OrderedDict())
+    return embedder
+
+
+def test_build_and_search(fake_embedder):
+    vector_service.build_index(CITIES)
+    assert vector_service.get_index_size() == len(CITIES)
+    results = vector_service.semantic_search("Delhi India Asia", top_k=2)
+    assert results[0].city == "Delhi"
+
+
+def test_persisted_index_reloads_without_embedding(fake_embedder, monkeypatch):
+    vector_service.build_index(CITIES)
+    monkeypatch.setattr(vector_service, "_embedder", None)
+    monkeypatch.setattr(vector_service, "_get_embedder", lambda: pytest.fail("embedder loaded on warm start"))
+
+    vector_service.build_index(CITIES)
+    assert vector_service.get_index_size() == len(CITIES)
+
+
+def test_only_changed_documents_are_reembedded(fake_embedder):
+    vector_service.build_index(CITIES)
+    fake_embedder.encoded.clear()
+
+    changed = [dict(c) for c in CITIES]
+    changed[3]["population"] = 1_200_000
+    vector_service.build_index(changed)
+
+    assert len(fake_embedder.encoded) == 1
+    assert "Oslo" in fake_embedder.encoded[0]
+
+
+def test_query_embedding_cache_reuses_normalized_queries(fake_embedder):
+    vector_service.build_index(CITIES)
+    fake_embedder.encoded.clear()
+
+    vector_service.semantic_search("Clean air  warm weather")
+    vector_service.semantic_search("clean air warm weather")
+    assert fake_embedder.encoded == ["clean air warm weather"]
+
+
+def test_query_cache_misses_evicting_hits_in_the_same_batch(fake_embedder, monkeypatch):
+    monkeypatch.setattr(vector_service, "_query_cache_evictions", 0)
+    monkeypatch.setattr(vector_service.settings, "QUERY_EMBEDDING_CACHE_SIZE", 2)
+    vector_service._encode_queries(["a", "b"])
+
+    vectors = vector_service._encode_queries(["x", "y", "a", "z"])
+    assert vectors.shape == (4, FakeEmbedder.dim)
+    assert np.array_equal(vectors[2], fake_embedder.encode(["a"])[0])
+    assert len(vector_service._query_cache) == 2
+    assert vector_service._query_cache_evictions == 3
+
+
+def test_batch_search_encodes_once(fake_embedder):
+    vector_service.build_index(CITIES)
+    fake_embedder.encoded.clear()
+
+    queries = ["Delhi India Asia", "Lima Peru", "delhi india asia"]
+    batches = vector_service.semantic_search_batch(queries, top_k=1)
+    assert [b[0].city for b in batches] == ["Delhi", "Lima", "Delhi"]
+    assert len(fake_embedder.encoded) == 2
+
+
+def test_index_spec_falls_back_when_too_small_to_train():
+    assert vector_service.resolve_index_spec(50, 384, "ivf_pq")["type"] == "flat"
+    assert vector_service.resolve_index_spec(5000, 384, "ivf_pq")["type"] == "ivf_flat"
+    spec = vector_service.resolve_index_spec(20000, 384, "ivf_pq")
+    assert spec["type"] == "ivf_pq" and 384 % spec["pq_m"] == 0
+    with pytest.raises(ValueError):
+        vector_service.resolve_index_spec(100, 384, "lsh")
+
+
+def test_index_benchmark_reports_recall():
+    from app.ml import index_benchmark
+
+    rows = index_benchmark.run_benchmark(n=2000, dim=16, k=5, n_queries=50)
+    kinds = {r["index"] for r in rows}
+    assert {"flat", "ivf_flat", "hnsw"} <= kinds
+    assert next(r for r in rows if r["index"] == "flat")["recall@5"] == 1.0
+    assert all(0 <= r["recall@5"] <= 1 for r in rows)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_upsert_update_and_remove_single_documents(fake_embedder, monkeypatch, index_type):
+    monkeypatch.setattr(vector_service.settings, "VECTOR_INDEX_TYPE", index_type)
+    vector_service.build_index(CITIES)
+    fake_embedder.encoded.clear()
+
+    nairobi = {"name": "Nairobi", "country": "Kenya", "lat": -1.3, "lon": 36.8, "population": 4397000}
+
+    def doc_encodings():
+        return [t for t in fake_embedder.encoded if t.startswith("Nairobi is")]
+
+    vector_service.upsert_document(nairobi)
+    assert len(doc_encodings()) == 1
+    assert vector_service.get_index_size() == len(CITIES) + 1
+    assert vector_service.semantic_search("Nairobi Kenya", top_k=1)[0].city == "Nairobi"
+
+    vector_service.upsert_document(nairobi)  # Unchanged → no re-embedding
+    assert len(doc_encodings()) == 1
+
+    vector_service.upsert_document({**nairobi, "population": 5_500_000})
+    assert vector_service.get_index_size() == len(CITIES) + 1
+    assert "major metropolitan area" in vector_service.semantic_search("Nairobi Kenya", top_k=1)[0].summary
+
+    assert vector_service.remove_document("Nairobi", "Kenya")
+    results = vector_service.semantic_search("Nairobi Kenya", top_k=len(CITIES))
+    assert len(results) == len(CITIES)
+    assert "Nairobi" not in {r.city for r in results}
+
+
+async def test_schedule_upsert_runs_in_background(fake_embedder):
+    vector_service.build_index(CITIES)
+    vector_service.schedule_upsert({"name": "Quito", "country": "Ecuador", "lat": -0.2, "lon": -78.5})
+    await asyncio.gather(*vector_service._pending_upserts)
+    assert vector_service.semantic_search("Quito Ecuador", top_k=1)[0].city == "Quito"
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw"])
+def test_filtered_search_returns_exactly_k_matching(fake_embedder, monkeypatch, index_type):
+    monkeypatch.setattr(vector_service.settings, "VECTOR_INDEX_TYPE", index_type)
+    monkeypatch.setattr(vector_service.settings, "VECTOR_IVF_NPROBE", 1)
+    continents = ["Asia", "Europe", "Africa", "South America"]
+    catalog = [
+        {
+            "name": f"City{i}",
+            "country": f"Country{i % 37}",
+            "lat": (i * 7) % 140 - 70,
+            "lon": (i * 13) % 360 - 180,
+            "population": 100_000 * (i % 90),
+            "continent": continents[i % 4],
+        }
+        for i in range(800)
+    ]
+    vector_service.build_index(catalog)
+
+    filters = vector_service.SearchFilters(continent="asia", min_population=5_000_000)
+    results = vector_service.semantic_search("coastal temperate city", top_k=10, filters=filters)
+    assert len(results) == 10
+    allowed = {c["name"] for c in catalog if c["continent"] == "Asia" and c["population"] >= 5_000_000}
+    assert {r.city for r in results} <= allowed
+
+    rare = vector_service.SearchFilters(country="Country3", max_population=1_000_000)
+    expected = {c["name"] for c in catalog if c["country"] == "Country3" and c["population"] <= 1_000_000}
+    results = vector_service.semantic_search("coastal temperate city", top_k=20, filters=rare)
+    assert {r.city for r in results} == expected
+
+    assert (
+        vector_service.semantic_search("anything", filters=vector_service.SearchFilters(continent="Antarctica")) == []
+    )
+
+
+def test_doc_text_is_served_from_mapped_side_file(fake_embedder, monkeypatch):
+    monkeypatch.setattr(vector_service.settings, "VECTOR_QUANTIZATION", "sq8")
+    vector_service.build_index(CITIES)
+
+    assert all("text" not in doc for doc in vector_service._city_docs.values())
+    stats = vector_service.get_store_stats()
+    assert stats["text_heap_bytes"] == 0 and stats["text_mmap_bytes"] > 0
+    assert stats["bytes_per_vector"] == FakeEmbedder.dim  # int8 codes: one byte per dimension
+
+    result = vector_service.semantic_search("Lima Peru", top_k=1)[0]
+    assert result.city == "Lima"
+    assert result.summary.startswith("Lima is a")
+
+
+def test_embedder_loads_once_across_threads(monkeypatch):
+    loads = []
+
+    class SlowModel:
+        def __init__(self, name):
+            loads.append(name)
+            time.sleep(0.05)
+
+    monkeypatch.setitem(sys.modules, "sentence_transformers", types.SimpleNamespace(SentenceTransformer=SlowModel))
+    monkeypatch.setattr(vector_service, "_embedder", None)
+    threads = [threading.Thread(target=vector_service._get_embedder) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and isinstance(vector_service._embedder, SlowModel)
+
+
+def test_query_cache_is_consistent_under_concurrent_searches(fake_embedder, monkeypatch):
+    monkeypatch.setattr(vector_service.settings, "QUERY_EMBEDDING_CACHE_SIZE", 8)
+    monkeypatch.setattr(vector_service, "_query_cache_hits", 0)
+    monkeypatch.setattr(vector_service, "_query_cache_misses", 0)
+    errors = []
+
+    def search(offset):
+        try:
+            for i in range(200):
+                vector_service._encode_queries([f"q{(offset + i) % 20}", f"q{i % 5}"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=search, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = vector_service.get_query_cache_stats()
+    assert errors == [] and stats["entries"] <= 8
+    assert stats["hits"] + stats["misses"] == 8 * 200 * 2
+
+
+async def test_refreshed_city_resyncs_its_document(fake_embedder, monkeypatch):
+    from app.models.schemas import CityInfo
+    from app.services import geocoding_service, weather_service
+
+    vector_service.build_index(CITIES)
+    oslo = CityInfo(**{**CITIES[3], "population": 1_200_000})
+    monkeypatch.setattr(geocoding_service, "_cities_db", [oslo])
+    monkeypatch.setattr(geocoding_service, "_by_location", {geocoding_service._location_key(oslo.lat, oslo.lon): oslo})
+    fake_embedder.encoded.clear()
+
+    weather_service._notify_refresh(oslo.lat, oslo.lon)
+    await asyncio.gather(*vector_service._pending_upserts)
+    assert len(fake_embedder.encoded) == 1
+    assert "large city" in vector_service.semantic_search("Oslo Norway", top_k=1)[0].summary